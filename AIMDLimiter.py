@@ -0,0 +1,128 @@
+import logging
+import threading
+
+# <summary>
+# Adaptive limit on the number of BAM API calls in progress at once (additive increase, multiplicative decrease, like TCP congestion control).
+# The limit grows by one after every `limit` calls that succeed within the latency target, and is halved when a call fails with a
+# transient error or takes longer than the target. At most one decrease happens per `limit` completed calls, so a burst of failures
+# from the same window only counts once. Throughput then settles near what the server can actually sustain.
+# Without a latency target, each API method is judged against its own fastest call, since reads are much faster than writes
+# </summary>
+class AIMDLimiter:
+
+    # Latency below which the service is never considered slow, in seconds. Keeps sub-millisecond jitter from looking like overload
+    latency_floor = 0.05
+
+    # <summary>
+    # Constructor for AIMDLimiter. The limit starts at its maximum
+    # </summary>
+    # <param name="maximum" type="int">
+    # The highest limit, e.g. the number of sessions or connections available
+    # </param>
+    # <param name="minimum" type="int">
+    # The lowest limit (default = 1)
+    # </param>
+    # <param name="latency_target" type="float">
+    # Optional, calls taking longer than this many seconds count as overload. By default it is tolerance times the fastest call of the same method
+    # </param>
+    # <param name="tolerance" type="float">
+    # How many times slower than the fastest call of its method a call may be before it counts as overload, if no latency_target is given (default = 3)
+    # </param>
+    def __init__(self, maximum, minimum=1, latency_target=None, tolerance=3.0):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.latency_target = latency_target
+        self.tolerance = tolerance
+        self.limit = self.maximum
+        self.in_use = 0
+        # Fastest successful call per method, in seconds
+        self.fastest = {}
+        self.logger = logging.getLogger(__name__)
+        self.__successes = 0
+        # Calls to complete before another decrease is allowed
+        self.__cooldown = 0
+        self.__condition = threading.Condition()
+
+    # <summary>
+    # Blocks until a call may start. Every acquire must be followed by a release
+    # </summary>
+    def acquire(self):
+        with self.__condition:
+            while self.in_use >= self.limit:
+                self.__condition.wait()
+            self.in_use += 1
+
+    # <summary>
+    # Ends a call started with acquire and adjusts the limit from its outcome
+    # </summary>
+    # <param name="seconds" type="float">
+    # How long the call took
+    # </param>
+    # <param name="overloaded" type="boolean">
+    # Whether the call failed with a transient error
+    # </param>
+    # <param name="method" type="string">
+    # Optional, the API method called
+    # </param>
+    def release(self, seconds, overloaded=False, method=None):
+        with self.__condition:
+            self.in_use -= 1
+            self.__completed(seconds, overloaded, method)
+            self.__condition.notify_all()
+
+    # <summary>
+    # Adjusts the limit from the outcome of a call that was not started with acquire (e.g. a request queued on AsyncSOAPClient)
+    # </summary>
+    # <param name="seconds" type="float">
+    # How long the call took
+    # </param>
+    # <param name="overloaded" type="boolean">
+    # Whether the call failed with a transient error
+    # </param>
+    # <param name="method" type="string">
+    # Optional, the API method called
+    # </param>
+    def completed(self, seconds, overloaded=False, method=None):
+        with self.__condition:
+            self.__completed(seconds, overloaded, method)
+            self.__condition.notify_all()
+
+    # <summary>
+    # Returns the latency above which calls of a method count as overload
+    # </summary>
+    # <param name="method" type="string">
+    # Optional, the API method called
+    # </param>
+    def target(self, method=None):
+        if self.latency_target:
+            return self.latency_target
+        if not method in self.fastest:
+            return None
+        return self.tolerance * max(self.fastest[method], AIMDLimiter.latency_floor)
+
+    # <summary>
+    # Updates the limit, called with the condition held
+    # </summary>
+    def __completed(self, seconds, overloaded, method):
+        if not overloaded:
+            self.fastest[method] = min(self.fastest.get(method, seconds), seconds)
+        if self.__cooldown:
+            self.__cooldown -= 1
+        target = self.target(method)
+        if overloaded or (target and seconds > target):
+            self.__successes = 0
+            if self.__cooldown or self.limit == self.minimum:
+                return
+            # The calls of the window that was overloaded are still completing, let them drain before judging the new limit
+            self.__cooldown = self.limit
+            self.limit = max(self.minimum, self.limit // 2)
+            self.logger.debug("Backing off to {0} calls at once ({1})".format(self.limit, "transient error" if overloaded else "{:.3f}s call".format(seconds)))
+            return
+        self.__successes += 1
+        if self.__successes >= self.limit and self.limit < self.maximum:
+            self.__successes = 0
+            self.limit += 1
+            self.logger.debug("Allowing {} calls at once".format(self.limit))
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
@@ -0,0 +1,150 @@
+import bisect
+import json
+import logging
+import threading
+
+# <summary>
+# Call counts and latency histograms of the BAM API methods, per method and per import phase.
+# Filled by InstrumentedClient, every BAMClient of an import (including UploadPool sessions) can share one instance
+# </summary>
+class APIStatistics:
+
+    # Upper bounds of the latency histogram buckets, in milliseconds. Slower calls fall in a last, unbounded bucket
+    buckets = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+    # <summary>
+    # Constructor for APIStatistics
+    # </summary>
+    # <param name="slow_call" type="float">
+    # Optional, calls taking at least this many seconds are logged as warnings
+    # </param>
+    def __init__(self, slow_call=None):
+        self.slow_call = slow_call
+        self.phase = "start"
+        self.logger = logging.getLogger(__name__)
+        # (phase, method) -> [calls, errors, total seconds, slowest seconds, histogram counts]
+        self.__methods = {}
+        self.__lock = threading.Lock()
+
+    # <summary>
+    # Attributes the calls made from now on to an import phase
+    # </summary>
+    # <param name="name" type="string">
+    # The name of the phase (e.g. "upload")
+    # </param>
+    def setPhase(self, name):
+        self.phase = name
+
+    # <summary>
+    # Records a finished call
+    # </summary>
+    # <param name="method" type="string">
+    # The API method that was called
+    # </param>
+    # <param name="seconds" type="float">
+    # How long the call took
+    # </param>
+    # <param name="error" type="Exception">
+    # Optional, the error the call failed with
+    # </param>
+    # <param name="args" type="tuple">
+    # Optional, the arguments of the call, only used to describe slow calls
+    # </param>
+    def record(self, method, seconds, error=None, args=None):
+        bucket = bisect.bisect_left(APIStatistics.buckets, seconds * 1000)
+        with self.__lock:
+            entry = self.__methods.get((self.phase, method))
+            if entry is None:
+                entry = [0, 0, 0.0, 0.0, [0] * (len(APIStatistics.buckets) + 1)]
+                self.__methods[(self.phase, method)] = entry
+            entry[0] += 1
+            if error:
+                entry[1] += 1
+            entry[2] += seconds
+            entry[3] = max(entry[3], seconds)
+            entry[4][bucket] += 1
+        if not self.slow_call is None and seconds >= self.slow_call:
+            self.logger.warning("Slow call: {0}({1}) took {2:.3f}s{3}".format(method, ", ".join(repr(arg) for arg in args or []), seconds,
+                                                                           " and failed: {}".format(error) if error else ""))
+
+    # <summary>
+    # Returns the statistics as a dict of {"methods": {method: summary}, "phases": {phase: {method: summary}}}.
+    # A summary holds the calls, errors, total/mean/max seconds, the p50/p95/p99 estimated from the histogram and the histogram itself
+    # </summary>
+    def report(self):
+        with self.__lock:
+            entries = dict((key, [entry[0], entry[1], entry[2], entry[3], list(entry[4])]) for key, entry in self.__methods.items())
+        methods = {}
+        phases = {}
+        for (phase, method), entry in entries.items():
+            phases.setdefault(phase, {})[method] = APIStatistics.summary(entry)
+            total = methods.setdefault(method, [0, 0, 0.0, 0.0, [0] * (len(APIStatistics.buckets) + 1)])
+            total[0] += entry[0]
+            total[1] += entry[1]
+            total[2] += entry[2]
+            total[3] = max(total[3], entry[3])
+            total[4] = [mine + theirs for mine, theirs in zip(total[4], entry[4])]
+        return {"methods": dict((method, APIStatistics.summary(entry)) for method, entry in methods.items()), "phases": phases}
+
+    # <summary>
+    # Writes the report as JSON
+    # </summary>
+    # <param name="path" type="string">
+    # The file to write to
+    # </param>
+    def save(self, path):
+        with open(path, "w") as report_file:
+            json.dump(self.report(), report_file, indent=2, sort_keys=True)
+
+    # <summary>
+    # Returns one line per method, the methods that took the longest in total first
+    # </summary>
+    def lines(self):
+        methods = self.report()["methods"]
+        return ["{0:<20} {1:>7} calls {2:>9.3f}s total {3:>8.2f}ms mean {4:>8.2f}ms p95 {5:>5} errors".format(
+                    method, summary["calls"], summary["seconds"], summary["mean_ms"], summary["p95_ms"], summary["errors"])
+                for method, summary in sorted(methods.items(), key=lambda item: -item[1]["seconds"])]
+
+    # <summary>
+    # Summarizes a [calls, errors, total seconds, slowest seconds, histogram counts] entry
+    # </summary>
+    @staticmethod
+    def summary(entry):
+        calls, errors, seconds, slowest, histogram = entry
+        labels = ["<={}ms".format(bound) for bound in APIStatistics.buckets] + [">{}ms".format(APIStatistics.buckets[-1])]
+        return {
+            "calls": calls,
+            "errors": errors,
+            "seconds": seconds,
+            "mean_ms": seconds / calls * 1000 if calls else 0.0,
+            "max_ms": slowest * 1000,
+            "p50_ms": APIStatistics.percentile(histogram, 0.5, slowest),
+            "p95_ms": APIStatistics.percentile(histogram, 0.95, slowest),
+            "p99_ms": APIStatistics.percentile(histogram, 0.99, slowest),
+            "histogram": dict((label, count) for label, count in zip(labels, histogram) if count),
+        }
+
+    # <summary>
+    # Estimates a percentile as the upper bound of the histogram bucket it falls in, capped by the slowest call
+    # </summary>
+    # <param name="histogram" type="list">
+    # The counts per bucket
+    # </param>
+    # <param name="fraction" type="float">
+    # The percentile as a fraction (e.g. 0.95)
+    # </param>
+    # <param name="slowest" type="float">
+    # The slowest call, in seconds
+    # </param>
+    @staticmethod
+    def percentile(histogram, fraction, slowest):
+        rank = fraction * sum(histogram)
+        seen = 0
+        for bound, count in zip(APIStatistics.buckets, histogram):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, slowest * 1000)
+        return slowest * 1000
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
@@ -2,7 +2,16 @@
 
 import socket
 from ipaddress import ip_address, ip_network
-class Address:
+from IPTopology import IPTopology
+
+# <summary>
+# IPv4 address of a device and the subnet it is a member of.
+# Imports hold one per address of the csv, so it is slotted and keeps the IP and the prefix length of its subnet as ints:
+# the strings returned by IP() and subnet() are rebuilt on every call, and the error callback is only used while constructing
+# </summary>
+class Address(object):
+
+    __slots__ = ("__IP", "__prefix", "__FQDN")
 
     # <summary>
     # Constructor for Address object
@@ -11,39 +20,72 @@ class Address:
     # The IP/FQDN associated with the object
     # </param>
     # <param name="subnet" type="string">
-    # The subnet of which it is a member
+    # The subnet of which it is a member, in CIDR notation
     # </param>
     # <param name="error_callback" type="function">
     # The callback function in the event of errors
     # </param>
-    def __init__(self, IP, subnet, error_callback, FQDN=None):
-        self.error_callback = error_callback
-
-        if not Address.isValidSubnet(subnet):
-            self.error_callback("Subnet '{}' is not valid! Could not create Address object".format(subnet), False)
+    # <param name="validated" type="boolean">
+    # Skips validation of IP and subnet, for addresses that were already validated in bulk (see AddressValidator)
+    # </param>
+    def __init__(self, IP, subnet, error_callback, FQDN=None, validated=False):
+        if not validated and not Address.isValidSubnet(subnet):
+            error_callback("Subnet '{}' is not valid! Could not create Address object".format(subnet), False)
             raise ValueError
-        self.__subnet = subnet
 
-        if not Address.isValidIPv4(IP) or not Address.isMemberOfSubnet(IP, self.__subnet):
-            self.error_callback("IP '{}' is not valid! Could not create Address object.".format(IP), False)
+        if not validated and (not Address.isValidIPv4(IP) or not Address.isMemberOfSubnet(IP, subnet)):
+            error_callback("IP '{}' is not valid! Could not create Address object.".format(IP), False)
             raise ValueError
-        self.__IP = IP
+        self.__IP = IPTopology.toInteger(IP)
+        self.__prefix = int(subnet.rpartition('/')[2])
 
         if FQDN and not Address.isValidFQDN(FQDN):
-            self.error_callback("FQDN {} is not valid! Could not create Address object".format(IP), False)
+            error_callback("FQDN {} is not valid! Could not create Address object".format(IP), False)
         self.__FQDN = FQDN
 
     # <summary>
     # Accessor for IP
     # </summary>
     def IP(self):
-        return self.__IP
+        return IPTopology.toString(self.__IP)
 
     # <summary>
     # Accessor for subnet
     # </summary>
     def subnet(self):
-        return self.__subnet
+        return "{0}/{1}".format(IPTopology.toString(self.__IP & IPTopology.mask(self.__prefix)), self.__prefix)
+
+    # <summary>
+    # Accessor for IP, as an int
+    # </summary>
+    def integer(self):
+        return self.__IP
+
+    # <summary>
+    # Accessor for the prefix length of the subnet
+    # </summary>
+    def prefix(self):
+        return self.__prefix
+
+    # <summary>
+    # Builds an Address from the IP and prefix length returned by integer() and prefix(), without validating them again
+    # </summary>
+    # <param name="IP" type="int">
+    # The IP, as an int
+    # </param>
+    # <param name="prefix" type="int">
+    # The prefix length of the subnet
+    # </param>
+    # <param name="FQDN" type="string">
+    # Optional, the FQDN of the address
+    # </param>
+    @staticmethod
+    def fromInteger(IP, prefix, FQDN=None):
+        address = Address.__new__(Address)
+        address.__IP = IP
+        address.__prefix = prefix
+        address.__FQDN = FQDN
+        return address
 
     # <summary>
     # accessor for FQDN
@@ -0,0 +1,165 @@
+import numpy as np
+
+# <summary>
+# Batch IPv4 validation. Parses whole columns of addresses into uint32 arrays and checks validity and subnet membership
+# with masks, instead of building ipaddress objects for every address like Address does
+# </summary>
+class AddressValidator:
+
+    # Length of the longest dotted quad (255.255.255.255)
+    max_length = 15
+
+    # <summary>
+    # Constructor for AddressValidator
+    # </summary>
+    # <param name="prefix" type="int">
+    # The prefix length of the subnets derived for addresses that have no subnet of their own (default = 24)
+    # </param>
+    def __init__(self, prefix=24):
+        self.prefix = prefix
+
+    # <summary>
+    # Validates a flat list of IPv4 addresses.
+    # Returns [addresses as uint32 array, subnet network addresses as uint32 array, error vector as bool array].
+    # Values of the first two arrays are undefined wherever the error vector is True
+    # </summary>
+    # <param name="addresses" type="list">
+    # The addresses to validate, as strings
+    # </param>
+    # <param name="subnets" type="list">
+    # Optional, the CIDR each address must be a member of (same length as addresses).
+    # If not provided the subnet of each address is its own /prefix network
+    # </param>
+    def validate(self, addresses, subnets=None):
+        IPs, errors = AddressValidator.parse(addresses)
+        if subnets is None:
+            networks = IPs & AddressValidator.mask(self.prefix)
+            return [IPs, networks, errors]
+
+        import pandas as pd
+        split = pd.Series(subnets, dtype=object).astype(str).str.split('/', n=1)
+        networks, network_errors = AddressValidator.parse(split.str.get(0))
+        prefixes = pd.to_numeric(split.str.get(1), errors='coerce')
+        network_errors |= np.isnan(prefixes.values) | (prefixes.values < 0) | (prefixes.values > 32)
+        masks = AddressValidator.mask(np.where(network_errors, 32, prefixes.fillna(32).values).astype(np.uint32))
+        errors |= network_errors | ((IPs & masks) != (networks & masks))
+        return [IPs, networks & masks, errors]
+
+    # <summary>
+    # Validates a column whose cells are lists of addresses (e.g. the IP column of a CSVReader opened with split_columns=['IP']).
+    # Returns [per row error vector as bool array, list holding the subnet CIDR strings of each row].
+    # A row is in error if any of its addresses is invalid, the subnets of such rows are None
+    # </summary>
+    # <param name="column" type="list">
+    # The column to validate
+    # </param>
+    def validateColumn(self, column):
+        column = list(column)
+        counts = np.fromiter((len(cell) for cell in column), dtype=np.int64, count=len(column))
+        flat = [address for cell in column for address in cell]
+        IPs, networks, errors = self.validate(flat)
+
+        # Map every address back to its row and flag the row if any of its addresses failed
+        rows = np.repeat(np.arange(len(column)), counts)
+        row_errors = np.bincount(rows[errors], minlength=len(column)) > 0
+        row_errors |= counts == 0
+
+        subnets = AddressValidator.toStrings(networks, self.prefix)
+        if (counts == 1).all():
+            # Common case of one address per row, no slicing needed
+            row_subnets = [[subnet] for subnet in subnets]
+        else:
+            row_subnets = []
+            offset = 0
+            for count in counts.tolist():
+                row_subnets.append(subnets[offset:offset + count])
+                offset += count
+        for idx in np.flatnonzero(row_errors).tolist():
+            row_subnets[idx] = None
+        return [row_errors, row_subnets]
+
+    # <summary>
+    # Parses dotted quad strings into a uint32 array.
+    # The strings are laid out as a fixed width byte matrix and scanned one character column at a time, each step covering every address.
+    # Returns [addresses as uint32 array, error vector as bool array]
+    # </summary>
+    # <param name="addresses" type="list">
+    # The addresses to parse
+    # </param>
+    @staticmethod
+    def parse(addresses):
+        width = AddressValidator.max_length + 1
+        try:
+            characters = np.array(addresses, dtype='S{}'.format(width))
+        except (UnicodeError, TypeError, ValueError):
+            characters = np.array([AddressValidator.__ascii(address) for address in addresses], dtype='S{}'.format(width))
+        characters = characters.reshape(-1).view(np.uint8).reshape(-1, width)
+
+        count = characters.shape[0]
+        octets = np.zeros((count, 4), dtype=np.uint32)
+        value = np.zeros(count, dtype=np.uint32)
+        digits = np.zeros(count, dtype=np.uint32)
+        octet = np.zeros(count, dtype=np.int64)
+        # Anything longer than max_length spills into the last column
+        errors = characters[:, -1] != 0
+        rows = np.arange(count)
+        for column in characters.T:
+            is_digit = (column >= 48) & (column <= 57)
+            is_dot = column == 46
+            errors |= ~(is_digit | is_dot | (column == 0))
+            value = np.where(is_digit, value * 10 + (column - 48), value)
+            digits += is_digit
+            # A dot closes the current octet
+            errors |= is_dot & ((digits == 0) | (digits > 3) | (octet >= 3))
+            closing = is_dot & (octet < 3)
+            octets[rows[closing], octet[closing]] = value[closing]
+            value[is_dot] = 0
+            digits[is_dot] = 0
+            octet += is_dot
+        errors |= (octet != 3) | (digits == 0) | (digits > 3)
+        octets[:, 3] = value
+        errors |= (octets > 255).any(axis=1)
+        IPs = (octets[:, 0] << 24) | (octets[:, 1] << 16) | (octets[:, 2] << 8) | octets[:, 3]
+        return [IPs.astype(np.uint32), errors]
+
+    # <summary>
+    # Formats a uint32 array of network addresses as a list of CIDR strings.
+    # Each distinct network is formatted once and its string shared by every address in it
+    # </summary>
+    # <param name="networks" type="numpy.ndarray">
+    # The network addresses
+    # </param>
+    # <param name="prefix" type="int">
+    # The prefix length appended to every network
+    # </param>
+    @staticmethod
+    def toStrings(networks, prefix):
+        if not len(networks):
+            return []
+        unique, inverse = np.unique(networks, return_inverse=True)
+        strings = np.array(["{0}.{1}.{2}.{3}/{4}".format(network >> 24, (network >> 16) & 255, (network >> 8) & 255, network & 255, prefix)
+                            for network in unique.tolist()], dtype=object)
+        return strings[inverse].tolist()
+
+    # <summary>
+    # Returns the address as an ascii byte string, non ascii characters are replaced (and so fail validation)
+    # </summary>
+    @staticmethod
+    def __ascii(address):
+        if isinstance(address, unicode):
+            return address.encode('ascii', 'replace')
+        return str(address)
+
+    # <summary>
+    # Returns the netmask of a prefix length (or an array of them) as uint32
+    # </summary>
+    # <param name="prefix" type="int">
+    # The prefix length (0-32)
+    # </param>
+    @staticmethod
+    def mask(prefix):
+        prefix = np.asarray(prefix, dtype=np.uint64)
+        return ((np.uint64(0xFFFFFFFF) << (np.uint64(32) - prefix)) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
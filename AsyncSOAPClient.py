@@ -0,0 +1,287 @@
+from SOAPConnection import SOAPConnection
+from SOAPFault import SOAPFault
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+import asyncore
+import collections
+import re
+
+# <summary>
+# Event driven SOAP client for the BAM API. Builds envelopes by hand and runs them over a bounded number of non-blocking
+# keep-alive connections (asyncore), so thousands of requests can be queued while only `concurrency` are on the wire.
+# The API methods can also be called like the suds service proxy (e.g. client.getEntityByName(0, name, "DeviceType")),
+# in which case they block until their response arrives
+# </summary>
+class AsyncSOAPClient:
+
+    namespace = "http://api.proteus.bluecatnetworks.com"
+    envelope_namespace = "http://schemas.xmlsoap.org/soap/envelope/"
+
+    # Parameter names of the API methods, in call order
+    parameters = {
+        "login": ["username", "password"],
+        "logout": [],
+        "getSystemInfo": [],
+        "getEntities": ["parentId", "type", "start", "count"],
+        "getEntityById": ["id"],
+        "getEntityByName": ["parentId", "name", "type"],
+        "getIPRangedByIP": ["containerId", "type", "address"],
+        "addDevice": ["configurationId", "name", "deviceTypeId", "deviceSubtypeId", "ip4Addresses", "ip6Addresses", "properties"],
+        "addDeviceType": ["name", "properties"],
+        "addDeviceSubtype": ["parentId", "name", "properties"],
+        "addIP4BlockByCIDR": ["parentId", "CIDR", "properties"],
+        "addIP4Network": ["blockId", "CIDR", "properties"],
+    }
+
+    # <summary>
+    # Constructor for AsyncSOAPClient. No connection is opened until the first request
+    # </summary>
+    # <param name="address" type="string">
+    # Address of BAM server, optionally with a port (e.g. 127.0.0.1:8080)
+    # </param>
+    # <param name="concurrency" type="int">
+    # The maximum number of connections, and so of requests on the wire at once (default = 16)
+    # </param>
+    # <param name="path" type="string">
+    # The path of the SOAP endpoint (default = /Services/API)
+    # </param>
+    def __init__(self, address, concurrency=16, path="/Services/API"):
+        if ':' in address:
+            self.host, port = address.rsplit(':', 1)
+            self.port = int(port)
+        else:
+            self.host, self.port = address, 80
+        self.concurrency = concurrency
+        self.path = path
+        self.cookie = None
+        self.in_flight = 0
+        self.__map = {}
+        self.__queue = collections.deque()
+        self.__idle = []
+        self.__connections = []
+
+    # <summary>
+    # Queues a request. callback(result, error) is called from poll/run once the response has arrived,
+    # error is None on success
+    # </summary>
+    # <param name="method" type="string">
+    # The API method to call
+    # </param>
+    # <param name="args" type="list">
+    # The arguments of the method, in the order given by parameters
+    # </param>
+    # <param name="callback" type="function" args="object, Exception">
+    # Called with the decoded result or the error
+    # </param>
+    def request(self, method, args, callback):
+        # [method, envelope, callback, attempts]
+        self.__queue.append([method, AsyncSOAPClient.envelope(method, args), callback, 0])
+        self.__dispatch()
+
+    # <summary>
+    # Returns the number of requests that are queued or on the wire
+    # </summary>
+    def pending(self):
+        return len(self.__queue) + self.in_flight
+
+    # <summary>
+    # Runs the event loop once, delivering any responses that have arrived
+    # </summary>
+    # <param name="timeout" type="float">
+    # How long to wait for network activity, in seconds
+    # </param>
+    def poll(self, timeout=0.05):
+        if self.__map:
+            asyncore.loop(timeout=timeout, count=1, map=self.__map)
+
+    # <summary>
+    # Runs the event loop until every queued request has been answered
+    # </summary>
+    def run(self):
+        while self.pending():
+            self.poll()
+
+    # <summary>
+    # Closes every connection. Requests still queued are dropped
+    # </summary>
+    def close(self):
+        self.__queue.clear()
+        for connection in list(self.__connections):
+            connection.request = None
+            connection.close()
+        self.__connections = []
+        self.__idle = []
+        self.in_flight = 0
+
+    # <summary>
+    # Calls an API method and blocks until its response has arrived. Raises SOAPFault on faults
+    # </summary>
+    # <param name="method" type="string">
+    # The API method to call
+    # </param>
+    def call(self, method, *args):
+        outcome = []
+        self.request(method, args, lambda result, error: outcome.append([result, error]))
+        while not outcome:
+            self.poll()
+        result, error = outcome[0]
+        if error:
+            raise error
+        return result
+
+    # <summary>
+    # Makes the API methods callable like the suds service proxy, e.g. client.addDeviceType("Router", None)
+    # </summary>
+    def __getattr__(self, name):
+        if name in AsyncSOAPClient.parameters:
+            return lambda *args: self.call(name, *args)
+        raise AttributeError(name)
+
+    # <summary>
+    # Called by a connection once a whole response has been received
+    # </summary>
+    def responseReceived(self, connection, request, status, headers, body):
+        self.in_flight -= 1
+        method, envelope, callback, attempts = request
+        for cookie in headers.get("set-cookie", []):
+            self.cookie = cookie.split(";", 1)[0]
+        if "close" in ",".join(headers.get("connection", [])).lower():
+            self.__drop(connection)
+            connection.close()
+        else:
+            self.__idle.append(connection)
+        try:
+            result, error = AsyncSOAPClient.decode(body), None
+        except SOAPFault, e:
+            result, error = None, e
+        except Exception, e:
+            result, error = None, SOAPFault("Invalid response to {0} (HTTP {1}): {2}".format(method, status, e))
+        callback(result, error)
+        self.__dispatch()
+
+    # <summary>
+    # Called by a connection when it is closed or fails. A request that was on it is retried once on another connection
+    # (idle keep-alive connections may be closed by the server just as a request is sent), then fails with the error
+    # </summary>
+    def connectionClosed(self, connection, error=None):
+        self.__drop(connection)
+        if connection.request:
+            request = connection.request
+            connection.request = None
+            self.in_flight -= 1
+            if request[3] < 1:
+                request[3] += 1
+                self.__queue.appendleft(request)
+            else:
+                request[2](None, error or SOAPFault("Connection closed by server during {}".format(request[0])))
+        self.__dispatch()
+
+    # <summary>
+    # Forgets a connection
+    # </summary>
+    def __drop(self, connection):
+        if connection in self.__idle:
+            self.__idle.remove(connection)
+        if connection in self.__connections:
+            self.__connections.remove(connection)
+
+    # <summary>
+    # Hands queued requests to idle connections, opening new ones while below the concurrency limit
+    # </summary>
+    def __dispatch(self):
+        while self.__queue:
+            if self.__idle:
+                connection = self.__idle.pop()
+            elif len(self.__connections) < self.concurrency:
+                connection = SOAPConnection(self, self.host, self.port, self.__map)
+                self.__connections.append(connection)
+            else:
+                return
+            self.in_flight += 1
+            connection.sendRequest(self.__queue.popleft(), self.path, self.cookie)
+
+    # <summary>
+    # Builds the SOAP envelope for a method call. None arguments are left out
+    # </summary>
+    # <param name="method" type="string">
+    # The API method to call
+    # </param>
+    # <param name="args" type="list">
+    # The arguments of the method
+    # </param>
+    @staticmethod
+    def envelope(method, args):
+        parts = []
+        for name, value in zip(AsyncSOAPClient.parameters[method], args):
+            if value is None:
+                continue
+            if isinstance(value, unicode):
+                value = value.encode("utf-8")
+            parts.append("<{0}>{1}</{0}>".format(name, escape(str(value))))
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<soapenv:Envelope xmlns:soapenv="{0}" xmlns:api="{1}"><soapenv:Body>'
+                '<api:{2}>{3}</api:{2}>'
+                '</soapenv:Body></soapenv:Envelope>').format(AsyncSOAPClient.envelope_namespace, AsyncSOAPClient.namespace, method, "".join(parts))
+
+    # <summary>
+    # Decodes a SOAP response. Entities become dicts, numbers become longs and entity arrays are shaped like the suds
+    # APIEntityArray (result[0] is the list of entities, empty arrays have nothing to index). Raises SOAPFault on faults
+    # </summary>
+    # <param name="body" type="string">
+    # The body of the HTTP response
+    # </param>
+    @staticmethod
+    def decode(body):
+        root = ElementTree.fromstring(body)
+        response = None
+        for element in root.iter():
+            if AsyncSOAPClient.localName(element.tag) == "Body":
+                response = list(element)[0] if len(element) else None
+                break
+        if response is None:
+            return None
+        if AsyncSOAPClient.localName(response.tag) == "Fault":
+            raise SOAPFault(response.findtext("faultstring") or "Unknown fault")
+        returned = None
+        for element in response:
+            if AsyncSOAPClient.localName(element.tag) == "return":
+                returned = element
+        if returned is None:
+            return None
+        if not len(returned):
+            return AsyncSOAPClient.scalar(returned.text)
+        if AsyncSOAPClient.localName(returned[0].tag) == "item":
+            return [[AsyncSOAPClient.entity(item) for item in returned]]
+        return AsyncSOAPClient.entity(returned)
+
+    # <summary>
+    # Decodes an APIEntity element into a dict
+    # </summary>
+    @staticmethod
+    def entity(element):
+        entity = {'id': 0, 'name': None, 'type': None, 'properties': None}
+        for field in element:
+            entity[AsyncSOAPClient.localName(field.tag)] = field.text
+        entity['id'] = long(entity['id'] or 0)
+        return entity
+
+    # <summary>
+    # Decodes a scalar return value, numbers become longs
+    # </summary>
+    @staticmethod
+    def scalar(text):
+        if text is None:
+            return None
+        if re.match(r'^-?\d+$', text):
+            return long(text)
+        return text
+
+    # <summary>
+    # Strips the namespace from an ElementTree tag
+    # </summary>
+    @staticmethod
+    def localName(tag):
+        return tag.rsplit('}', 1)[-1]
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
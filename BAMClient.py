@@ -2,8 +2,15 @@
 
 from CSVReader import CSVReader
 from Address import Address
-from suds.client import Client
+from AsyncSOAPClient import AsyncSOAPClient
+from IDCache import IDCache
+from InstrumentedClient import InstrumentedClient
+from IPTopology import IPTopology
+from RetryingClient import RetryingClient
+from WSDLCache import WSDLCache
+import Queue
 import logging
+import threading
 import coloredlogs
 
 # Prevents flooding of output from the suds client
@@ -20,6 +27,14 @@ class BAMClient:
     default_username = "admin"
     default_password = "admin"
     default_configuration = "Test"
+    # Number of entities requested per getEntities call when paging through the configuration
+    page_size = 1000
+    # Fragments of the fault messages the BAM service returns when an entity being added already exists
+    duplicate_markers = ["already exists", "duplicate"]
+    # Fragments of the fault messages the BAM service returns when a block or network being added overlaps an existing one
+    overlap_markers = ["overlap"]
+    # Fragments of the fault messages the BAM service returns when a call refers to an entity that does not exist
+    missing_markers = ["not found", "does not exist", "not in a network"]
 
     # <summary>
     # Constructor for BAM
@@ -36,13 +51,60 @@ class BAMClient:
     # <param name="callback" type="function" args="string, Boolean">
     # Callback function for error reporting
     # </param>
-    def __init__(self, address, user, password, callback=None):
+    # <param name="backend" type="string">
+    # The SOAP backend to use, either "suds" (blocking, default) or "async" (AsyncSOAPClient, see addDevices)
+    # </param>
+    # <param name="concurrency" type="int">
+    # The maximum number of requests on the wire at once with the async backend (default = 16)
+    # </param>
+    # <param name="wsdl" type="string">
+    # Optional, path of a local copy of the API WSDL, so it is not downloaded from the server (see WSDLCache)
+    # </param>
+    # <param name="id_cache" type="IDCache">
+    # Optional, persistent cache the IDs of the configuration, device types, subtypes, blocks and networks are read from and stored in
+    # </param>
+    # <param name="journal" type="ImportJournal">
+    # Optional, journal the committed devices, blocks and networks are recorded in. Entities it already holds are not sent to the server again
+    # </param>
+    # <param name="statistics" type="APIStatistics">
+    # Optional, records the count and latency of every API call made through this client (see InstrumentedClient)
+    # </param>
+    # <param name="retry_policy" type="RetryPolicy">
+    # Optional, retries the calls that fail with transient errors (see RetryingClient)
+    # </param>
+    # <param name="limiter" type="AIMDLimiter">
+    # Optional, adapts the number of calls in progress at once to the load of the service, can be shared by several clients (see RetryingClient)
+    # </param>
+    def __init__(self, address, user, password, callback=None, backend="suds", concurrency=16, wsdl=None, id_cache=None, journal=None, statistics=None, retry_policy=None, limiter=None):
         self.callback = callback
         self.logger = logging.getLogger(__name__)
+        self.backend = backend
+        self.configuration_id = None
+        self.configuration_name = None
+        self.id_cache = id_cache
+        self.journal = journal
+        # Whether the ID cache has been invalidated after one of its IDs turned out to be stale
+        self.__revalidated = False
+        # The device type tree of the server, fetched once cached device type IDs have turned out to be stale
+        self.__type_tree = None
+        # Local index of blocks and networks, only used once prefetchTopology has been called
+        self.topology = None
+        # Device name -> entity of every device in the configuration, only used once prefetchDevices has been called
+        self.device_index = None
+        # (entity type, CIDR) -> ID, or list of callbacks waiting on the lookup/creation in flight. Used by the async backend
+        self.__ranges = {}
 
         try:
             if Address.validate(address):
-                self.client = Client(url="http://" + address + "/Services/API?wsdl", faults=True).service
+                if backend == "async":
+                    self.client = AsyncSOAPClient(address, concurrency)
+                else:
+                    self.client = WSDLCache().client(address, wsdl).service
+                if statistics:
+                    self.client = InstrumentedClient(self.client, statistics)
+                if retry_policy or limiter:
+                    # Outside the instrumentation, so that every attempt of a retried call is recorded
+                    self.client = RetryingClient(self.client, retry_policy, limiter)
                 self.client.login(user, password)
             else:
                 self.callback("Invalid Address supplied", True)
@@ -53,19 +115,37 @@ class BAMClient:
     # <summary>
     # Tests to verify validity of BAM configuration name.
     # If it is valid, sets the current active configuration to the one provided.
-    # If not valid, sends a critical failure to callback
+    # If not valid, sends a critical failure to callback.
+    # A cached configuration ID is checked once, since the configuration may have been recreated or the server restored since it was cached
     # </summary>
     # <param name="name" type="string">
     # the name of the BAM configuration to test/set
     # </param>
     def setConfiguration(self, name=None):
+        self.configuration_name = name
+        if self.id_cache:
+            self.id_cache.setConfiguration(name)
+            cached = self.id_cache.get("Configuration", name, "")
+            if cached:
+                try:
+                    entity = self.client.getEntityById(cached)
+                except Exception, e:
+                    self.logger.debug("Could not check cached configuration ID {0}: {1}".format(cached, e))
+                    entity = None
+                if entity and entity['id'] == cached and entity['type'] == "Configuration" and entity['name'] == name:
+                    self.configuration_id = cached
+                    return self.configuration_id
+                # Every other cached ID of the server is likely stale too
+                self.logger.warning("Cached configuration ID {} no longer exists on the BAM service, invalidating the ID cache".format(cached))
+                self.__revalidated = True
+                self.id_cache.invalidate()
         configurations = self.getConfigurations()
-        configuration_id = None
         for configuration in configurations:
             if configuration["name"] == name:
                 self.configuration_id = configuration["id"]
         if not self.configuration_id:
             self.callback("Configuration %s not found on BAM service" % name, True)
+        self.__cache("Configuration", name, self.configuration_id, "")
         return self.configuration_id
 
     # <summary>
@@ -78,8 +158,8 @@ class BAMClient:
             if not configurations:
                 self.callback("No configurations present on the BAM service.", True)
             return configurations
-        except:
-            self.callback("Could not retrieve configurations from BAM service.", True)
+        except Exception, e:
+            self.callback("Could not retrieve configurations from BAM service: {}".format(e), True)
 
     # <summary>
     # Dumps some basic configuration info from the BAM server
@@ -96,16 +176,22 @@ class BAMClient:
     # <param name="name" type="string">
     # The name of the new device type to be added
     def addDeviceType(self, name=None):
+        if name == None or str(name) == 'nan':
+            name = "Not Listed"
+        cached = self.cachedDeviceType(name.strip())
+        if cached:
+            return [cached, name.strip()]
         try:
-            if name == None or str(name) == 'nan':
-                name = "Not Listed"
-            return [self.client.addDeviceType(name.strip()), name.strip()]
-        except:
+            device_type = [self.client.addDeviceType(name.strip()), name.strip()]
+        except Exception, e:
             device = self.client.getEntityByName(0, name.strip(), "DeviceType")
-            if device:
-                self.logger.debug("Server says: Device type {0} already exists with ID {1}".format(name.strip(), device["id"]))
-                return [device["id"], name.strip()]
-            self.callback("Error adding device type %s" % name, False)
+            if not device or not device["id"]:
+                self.callback("Error adding device type {0}: {1}".format(name, e), False)
+                return None
+            self.logger.debug("Server says: Device type {0} already exists with ID {1}".format(name.strip(), device["id"]))
+            device_type = [device["id"], name.strip()]
+        self.__cache("DeviceType", device_type[1], device_type[0], "")
+        return device_type
 
     # <summary>
     # Adds a new Device subtype to the BAM service.
@@ -117,28 +203,85 @@ class BAMClient:
     # The name of the new device subtype to be added
     # </param>
     def addDeviceSubtype(self, device_id, name=None):
+        if name == None or str(name) == "nan":
+            name = "Not Listed"
+        cached = self.cachedDeviceSubtype(device_id, name.strip())
+        if cached:
+            return [cached, name.strip()]
         try:
-            if name == None or str(name) == "nan":
-                name = "Not Listed"
-            return [self.client.addDeviceSubtype(device_id, name.strip(), None), name.strip()]
-        except:
+            device_subtype = [self.client.addDeviceSubtype(device_id, name.strip(), None), name.strip()]
+        except Exception, e:
             device = self.client.getEntityByName(device_id, name.strip(), "DeviceSubtype")
-            if device:
-                self.logger.debug("Device subtype {0} already exists with ID {1} and parent ID {2}".format(name.strip(), device["id"], device_id))
-                return [device["id"], name.strip()]
-            self.callback("Error adding device type %s" % name.strip(), False)
+            if not device or not device["id"]:
+                self.callback("Error adding device subtype {0}: {1}".format(name.strip(), e), False)
+                return None
+            self.logger.debug("Device subtype {0} already exists with ID {1} and parent ID {2}".format(name.strip(), device["id"], device_id))
+            device_subtype = [device["id"], name.strip()]
+        self.__cache("DeviceSubtype", BAMClient.subtypeKey(device_id, device_subtype[1]), device_subtype[0], "")
+        return device_subtype
+
+    # <summary>
+    # Returns the cached ID of a device type, or None
+    # </summary>
+    # <param name="name" type="string">
+    # The name of the device type
+    # </param>
+    def cachedDeviceType(self, name):
+        if self.id_cache:
+            return self.id_cache.get("DeviceType", name, "")
+
+    # <summary>
+    # Returns the cached ID of a device subtype, or None
+    # </summary>
+    # <param name="device_id" type="int">
+    # The ID of the parent device type
+    # </param>
+    # <param name="name" type="string">
+    # The name of the device subtype
+    # </param>
+    def cachedDeviceSubtype(self, device_id, name):
+        if self.id_cache:
+            return self.id_cache.get("DeviceSubtype", BAMClient.subtypeKey(device_id, name), "")
 
     # <summary>
     # Gets a list of device types on the BAM service
     # </summary>
     def getDeviceTypes(self):
-        return self.client.getEntities(0, "DeviceType", 0, 5000)
+        return list(self.getAllEntities(0, "DeviceType"))
+
+    # <summary>
+    # Gets a list of the device subtypes of a device type on the BAM service
+    # </summary>
+    # <param name="device_id" type="int">
+    # The ID of the parent device type
+    # </param>
+    def getDeviceSubtypes(self, device_id):
+        return list(self.getAllEntities(device_id, "DeviceSubtype"))
 
     # <summary>
-    # Gets a list of device subtypes on the BAM service
+    # Fetches the device types on the BAM service along with their subtypes, and stores their IDs in the ID cache.
+    # Returns a dict of {device type name: [device type ID, {subtype name: subtype ID}]}
     # </summary>
-    def getDeviceSubtypes(self):
-        return self.client.getEntities(0, "DeviceSubtype", 0, 5000)
+    # <param name="names" type="iterable">
+    # Optional, only fetch the subtypes of the device types with these names
+    # </param>
+    def getDeviceTypeTree(self, names=None):
+        if not names is None:
+            names = set(names)
+        if self.id_cache:
+            # The fetched tree replaces whatever was cached
+            self.id_cache.forget("DeviceType", None, "")
+            self.id_cache.forget("DeviceSubtype", None, "")
+        tree = {}
+        for device_type in self.getDeviceTypes():
+            if not names is None and not device_type['name'] in names:
+                continue
+            subtypes = dict((subtype['name'], subtype['id']) for subtype in self.getDeviceSubtypes(device_type['id']))
+            tree[device_type['name']] = [device_type['id'], subtypes]
+            self.__cache("DeviceType", device_type['name'], device_type['id'], "")
+            for subtype_name, subtype_id in subtypes.items():
+                self.__cache("DeviceSubtype", BAMClient.subtypeKey(device_type['id'], subtype_name), subtype_id, "")
+        return tree
 
     # <summary>
     # Adds a new Device entity to the BAM service based on a local Device instance
@@ -148,24 +291,232 @@ class BAMClient:
     # </param name="device" type="Device">
     # The device object to add to the server
     # </param>
-    def addDevice(self, device):
+    # <param name="create_networks" type="boolean">
+    # Whether to create the networks of the device's addresses first. False once ImportPlanner has created them
+    # </param>
+    def addDevice(self, device, create_networks=True):
+        journaled = self.__journaled("Device", device.name())
+        if journaled:
+            return journaled
         device_entity = self.getDevice(device.name())
         if not device_entity['id'] == 0:
             self.logger.warning("Device {0} already exists with ID {1}. Skipping...".format(device.name(), device_entity['id']))
+            self.__commit_device(device, device_entity['id'], True)
             return device_entity
         try:
+            return self.__add_device(device, create_networks)
+        except Exception, e:
+            if self.__stale(e):
+                # The networks or device type of the device were cached but are gone, look them up or create them again
+                try:
+                    self.__resolve_device_type(device)
+                    return self.__add_device(device, True)
+                except Exception, retry_error:
+                    e = retry_error
+            self.callback("Error creating device: {}".format(e), False)
+
+    # <summary>
+    # Adds a device, raising the fault of the BAM service if it fails
+    # </summary>
+    def __add_device(self, device, create_networks):
+        if create_networks:
             for address in device.addresses():
                 self.addNetwork(address.IP())
-            
 
-            return self.client.addDevice(self.configuration_id,
+        try:
+            device_id = self.client.addDevice(self.configuration_id,
                                   device.name(), 
                                   device.device_type().id(), 
                                   device.device_subtype().id(), 
                                   ','.join([i.IP() for i in device.addresses()]),
                                   None, None)    
         except Exception, e:
-            self.callback("Error creating device: {}".format(e), False)
+            # A retried attempt whose first try timed out after all, or another session, may have added it already
+            if not BAMClient.isDuplicateFault(e):
+                raise
+            device_id = self.client.getEntityByName(self.configuration_id, device.name(), "Device")['id']
+            if not device_id:
+                raise
+        self.__commit_device(device, device_id)
+        return device_id
+
+    # <summary>
+    # Adds every device to the BAM service.
+    # With the async backend the devices are pipelined: each device's existence check, network and block creation and
+    # addDevice call are chained requests, and many devices are in progress at once while at most `concurrency` requests are on the wire.
+    # A /24 needed by several devices is looked up or created only once
+    # </summary>
+    # <param name="devices" type="iterable">
+    # The Device objects to add, can be a generator
+    # </param>
+    # <param name="create_networks" type="boolean">
+    # Whether to create the networks of the devices' addresses. False once ImportPlanner has created them
+    # </param>
+    def addDevices(self, devices, create_networks=True):
+        if not self.backend == "async":
+            for device in devices:
+                self.addDevice(device, create_networks)
+            return
+        window = self.client.concurrency * 4
+        active = [0]
+        def finished():
+            active[0] -= 1
+        for device in devices:
+            while active[0] >= window:
+                self.client.poll()
+            active[0] += 1
+            self.__upload_device(device, finished, create_networks)
+        self.client.run()
+
+    # <summary>
+    # Starts the request chain adding one device with the async backend. done() is called once the device is finished with
+    # </summary>
+    def __upload_device(self, device, done, create_networks):
+        def checked(entity, error):
+            if error:
+                return self.__device_failed(error, done)
+            if not entity['id'] == 0:
+                self.logger.warning("Device {0} already exists with ID {1}. Skipping...".format(device.name(), entity['id']))
+                self.__commit_device(device, entity['id'], True)
+                return done()
+            if create_networks:
+                self.__upload_networks(device, done)
+            else:
+                self.__send_device(device, done)
+        if self.__journaled("Device", device.name()):
+            return done()
+        if not self.device_index is None:
+            return checked(self.getDevice(device.name()), None)
+        self.client.request("getEntityByName", [self.configuration_id, device.name(), "Device"], checked)
+
+    # <summary>
+    # Ensures the networks of every address of the device exist, then adds the device itself
+    # </summary>
+    def __upload_networks(self, device, done, retried=False):
+        networks = {}
+        for address in device.addresses():
+            networks.setdefault(address.IP().rsplit('.', 1)[0], address.IP())
+        remaining = [len(networks)]
+        failed = []
+        def network_ready(entity_id, error):
+            if error:
+                failed.append(error)
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+            if failed:
+                return self.__device_failed(failed[0], done)
+            self.__send_device(device, done, retried)
+        for IP in networks.values():
+            self.__ensure_range("IP4Network", IP, network_ready)
+
+    # <summary>
+    # Sends the addDevice request of a device whose networks exist.
+    # If they turn out to be gone because they came from a stale cache, they are looked up or created again once
+    # </summary>
+    def __send_device(self, device, done, retried=False):
+        def added(entity_id, error):
+            if error and not retried and self.__stale(error):
+                try:
+                    self.__resolve_device_type(device)
+                except Exception, e:
+                    return self.__device_failed(e, done)
+                return self.__upload_networks(device, done, True)
+            if error and BAMClient.isDuplicateFault(error):
+                # A retried attempt whose first try timed out after all, or another session, may have added it already
+                return self.client.request("getEntityByName", [self.configuration_id, device.name(), "Device"],
+                                           lambda entity, lookup_error: added(entity and entity['id'], lookup_error or (None if entity and entity['id'] else error)))
+            if error:
+                return self.__device_failed(error, done)
+            self.__commit_device(device, entity_id)
+            done()
+        self.client.request("addDevice", [self.configuration_id,
+                                          device.name(),
+                                          device.device_type().id(),
+                                          device.device_subtype().id(),
+                                          ','.join([i.IP() for i in device.addresses()]),
+                                          None, None], added)
+
+    # <summary>
+    # Reports a device that could not be added with the async backend
+    # </summary>
+    def __device_failed(self, error, done):
+        self.callback("Error creating device: {}".format(error), False)
+        done()
+
+    # <summary>
+    # Calls ready(ID, error) once the block or network holding the IP is known to exist, looking it up or creating it if needed.
+    # Concurrent callers for the same /24 wait on the first caller's requests
+    # </summary>
+    def __ensure_range(self, entity_type, IP, ready):
+        CIDR = IP.rsplit('.', 1)[0] + '.0/24'
+        key = (entity_type, CIDR)
+        state = self.__ranges.get(key)
+        if isinstance(state, list):
+            state.append(ready)
+            return
+        if state:
+            return ready(state, None)
+        self.__ranges[key] = [ready]
+
+        if self.topology:
+            if entity_type == "IP4Block":
+                found = self.topology.getBlock(IP)
+            else:
+                found = self.topology.getNetwork(IP)
+            if found['id']:
+                return self.__resolve_range(key, found['id'], None)
+            return self.__create_range(entity_type, IP, CIDR, key)
+        cached = self.__known_range(entity_type, IP)
+        if cached:
+            return self.__resolve_range(key, cached['id'], None)
+
+        def looked_up(entity, error):
+            if error:
+                return self.__resolve_range(key, None, error)
+            if entity['id']:
+                self.__remember_range(entity_type, IP, entity['id'])
+                return self.__resolve_range(key, entity['id'], None)
+            self.__create_range(entity_type, IP, CIDR, key)
+        self.client.request("getIPRangedByIP", [self.configuration_id, entity_type, IP], looked_up)
+
+    # <summary>
+    # Creates the /24 block or network for __ensure_range. A network first ensures its block exists
+    # </summary>
+    def __create_range(self, entity_type, IP, CIDR, key, retried=False):
+        def created(entity_id, error):
+            if error and entity_type == "IP4Network" and not retried and self.__stale(error):
+                # The block came from a stale cache entry
+                return self.__create_range(entity_type, IP, CIDR, key, True)
+            if error and (BAMClient.isDuplicateFault(error) or (entity_type == "IP4Network" and BAMClient.isOverlapFault(error))):
+                # Created by someone else in the meantime, which is as good as creating it ourselves
+                return self.client.request("getIPRangedByIP", [self.configuration_id, entity_type, IP],
+                                           lambda entity, error: self.__resolve_range(key, entity and entity['id'], error))
+            if not error:
+                self.logger.debug("Added {0} {1} with ID {2}".format(entity_type, CIDR, entity_id))
+                if self.topology:
+                    self.topology.addCIDR(entity_type, CIDR, entity_id)
+                self.__remember_range(entity_type, IP, entity_id)
+            self.__resolve_range(key, entity_id, error)
+
+        if entity_type == "IP4Block":
+            return self.client.request("addIP4BlockByCIDR", [self.configuration_id, CIDR, None], created)
+        def block_ready(block_id, error):
+            if error:
+                return self.__resolve_range(key, None, error)
+            self.client.request("addIP4Network", [block_id, CIDR, None], created)
+        self.__ensure_range("IP4Block", IP, block_ready)
+
+    # <summary>
+    # Records the outcome of a range lookup or creation and wakes up everyone waiting on it.
+    # Failures are forgotten, so that later devices try again
+    # </summary>
+    def __resolve_range(self, key, entity_id, error):
+        waiting = self.__ranges.pop(key, [])
+        if not error:
+            self.__ranges[key] = entity_id
+        for ready in waiting:
+            ready(entity_id, error)
 
     # <summary>
     # Returns a device with the provided device object's name if one exists on the BAM service
@@ -174,7 +525,41 @@ class BAMClient:
     # The device name to query the server for
     # </param>
     def getDevice(self, name):
+        if not self.device_index is None:
+            return self.device_index.get(name) or {'id': 0, 'name': None, 'type': None, 'properties': None}
         return self.client.getEntityByName(self.configuration_id, name, "Device")
+
+    # <summary>
+    # Loads every Device of the active configuration into a local name index, using page_size entities per getEntities call.
+    # Afterwards getDevice is answered locally and addDevice only calls the server to create devices.
+    # Only use this if this client is the only one creating devices in the configuration while it runs
+    # </summary>
+    def prefetchDevices(self):
+        device_index = {}
+        for entity in self.getAllEntities(self.configuration_id, "Device"):
+            device_index[entity['name']] = entity
+        self.logger.debug("Prefetched {} devices".format(len(device_index)))
+        self.device_index = device_index
+        return device_index
+
+    # <summary>
+    # Records a device known to exist on the server in the journal, and adds it to the device index if one is loaded.
+    # Devices that already existed are also journaled as skipped, since their addresses and type were not sent (see ImportDelta.save)
+    # </summary>
+    def __commit_device(self, device, device_id, skipped=False):
+        if not self.device_index is None:
+            self.device_index[device.name()] = {'id': device_id, 'name': device.name(), 'type': "Device", 'properties': None}
+        if self.journal:
+            self.journal.record("Device", device.name(), device_id)
+            if skipped:
+                self.journal.record("SkippedDevice", device.name(), device_id)
+
+    # <summary>
+    # Returns the journaled ID of a committed entity, or None
+    # </summary>
+    def __journaled(self, kind, key):
+        if self.journal:
+            return self.journal.get(kind, key)
     
     # <summary>
     # Creates a new network entity and adds it to the network block with the same CIDR
@@ -184,23 +569,51 @@ class BAMClient:
     # <param name="IP" type="string">
     # An IP contained in the network
     # </param>
+    # <param name="block_id" type="int">
+    # Optional, the ID of the block to create the network in, if already known (see ImportPlanner)
+    # </param>
     # <todo priority="moderate">
     # Allow creation of networks with different CIDR notations.
     # </todo>
-    def addNetwork(self, IP):
+    def addNetwork(self, IP, block_id=None):
         network_entity = self.getNetwork(IP)
         if not network_entity['id'] == 0:
             self.logger.debug("Network for IP {0} already exists with ID {1}".format(IP, network_entity['id']))
             return network_entity
         
-        block_id = self.getBlock(IP)['id']
+        if not block_id:
+            block_id = self.getBlock(IP)['id']
         if block_id == 0:
             self.logger.debug("No block entity found for IP {0}. Creating it now.".format(IP))
-            block_id = self.addBlock(IP)
+            block_id = BAMClient.entityId(self.addBlock(IP))
 
         CIDR = IP.rsplit('.', 1)[0] + '.0/24'
         self.logger.debug("Adding a new network for CIDR {0}".format(CIDR))
-        return self.client.addIP4Network(block_id, CIDR, None)        
+        try:
+            network_id = self.__create_network(block_id, IP, CIDR)
+        except Exception, e:
+            if not self.__stale(e):
+                raise
+            # The block came from a stale cache entry, look it up or create it again
+            network_id = self.__create_network(BAMClient.entityId(self.addBlock(IP)), IP, CIDR)
+        if self.topology:
+            self.topology.addCIDR("IP4Network", CIDR, network_id)
+        self.__remember_range("IP4Network", IP, network_id)
+        return network_id
+
+    # <summary>
+    # Creates a network in a block. A duplicate fault counts as success
+    # </summary>
+    def __create_network(self, block_id, IP, CIDR):
+        try:
+            return self.client.addIP4Network(block_id, CIDR, None)
+        except Exception, e:
+            # Another session may have created the same network in the meantime, which is as good as creating it ourselves
+            if not BAMClient.isDuplicateFault(e) and not BAMClient.isOverlapFault(e):
+                raise
+            network_id = self.client.getIPRangedByIP(self.configuration_id, "IP4Network", IP)['id']
+            self.logger.debug("Network {0} was created concurrently with ID {1}".format(CIDR, network_id))
+            return network_id
 
     # <summary>
     # Queries the server for a Network based on an IP contained within it
@@ -209,28 +622,59 @@ class BAMClient:
     # The IP contained within the network to query for
     # </param>
     def getNetwork(self, IP):
-        network_entity = self.client.getIPRangedByIP(self.configuration_id, "IP4Network", IP)
+        if self.topology:
+            network_entity = self.topology.getNetwork(IP)
+        else:
+            network_entity = self.__known_range("IP4Network", IP)
+        if not network_entity:
+            network_entity = self.client.getIPRangedByIP(self.configuration_id, "IP4Network", IP)
+            self.__remember_range("IP4Network", IP, network_entity['id'])
         if network_entity['id'] == 0:
             self.logger.debug('No network entity found for CIDR {0}'.format(IP))
         return network_entity
 
     # <summary>
     # Adds a new network block entity, if one does not already exist
-    # Currently only creates blocks with the CIDR /24 of the IP provided
+    # Creates the block with the CIDR /24 of the IP provided, see addBlockByCIDR for other CIDRs
     # </summary>
     # <param name="IP" type="string">
     # The IP contained within the block to create
     # </param>
-    # <todo priority="moderate">
-    # Allow creation of blocks by CIDR notation (not just /24)
-    # </todo>
     def addBlock(self, IP):
         block_entity = self.getBlock(IP)
         if not block_entity['id'] == 0:
             return block_entity
 
-        CIDR = IP.rsplit('.', 1)[0] + '.0/24'
-        return self.client.addIP4BlockByCIDR(self.configuration_id, CIDR, None)
+        return self.addBlockByCIDR(IP.rsplit('.', 1)[0] + '.0/24', [IP])
+
+    # <summary>
+    # Creates a network block of any CIDR, e.g. a supernet holding several of the networks to create (see ImportPlanner.supernets).
+    # A duplicate fault counts as success if a block of exactly that CIDR exists, a block overlapping an existing one raises the fault.
+    # The block is remembered as the block of every IP provided
+    # </summary>
+    # <param name="CIDR" type="string">
+    # The CIDR of the block to create (e.g. 10.0.0.0/22)
+    # </param>
+    # <param name="IPs" type="list">
+    # IPs contained within the block, one per network that will be created in it
+    # </param>
+    def addBlockByCIDR(self, CIDR, IPs):
+        try:
+            block_id = self.client.addIP4BlockByCIDR(self.configuration_id, CIDR, None)
+        except Exception, e:
+            if not BAMClient.isDuplicateFault(e):
+                raise
+            block_entity = self.client.getIPRangedByIP(self.configuration_id, "IP4Block", IPs[0])
+            CIDR_found = IPTopology.parseProperties(block_entity['properties']).get('CIDR')
+            if not block_entity['id'] or not CIDR_found or not IPTopology.parseCIDR(CIDR_found) == IPTopology.parseCIDR(CIDR):
+                raise
+            block_id = block_entity['id']
+            self.logger.debug("Block {0} was created concurrently with ID {1}".format(CIDR, block_id))
+        if self.topology:
+            self.topology.addCIDR("IP4Block", CIDR, block_id)
+        for IP in IPs:
+            self.__remember_range("IP4Block", IP, block_id)
+        return block_id
 
     # <summary>
     # Queries the server for a network block based on an IP contained within it
@@ -239,7 +683,245 @@ class BAMClient:
     # The IP contained within the block to check for
     # </param>
     def getBlock(self, IP):
-        return self.client.getIPRangedByIP(self.configuration_id, "IP4Block", IP)
+        if self.topology:
+            return self.topology.getBlock(IP)
+        block_entity = self.__known_range("IP4Block", IP)
+        if not block_entity:
+            block_entity = self.client.getIPRangedByIP(self.configuration_id, "IP4Block", IP)
+            self.__remember_range("IP4Block", IP, block_entity['id'])
+        return block_entity
+
+    # <summary>
+    # Returns the block or network holding the IP from the journal or the ID cache, or None. Ranges are kept by the /24 of the IP,
+    # like the blocks and networks this client creates
+    # </summary>
+    def __known_range(self, entity_type, IP):
+        CIDR = IP.rsplit('.', 1)[0] + '.0/24'
+        entity_id = self.__journaled(entity_type, CIDR)
+        if not entity_id and self.id_cache:
+            entity_id = self.id_cache.get(entity_type, CIDR)
+        if entity_id:
+            return {'id': entity_id, 'name': None, 'type': entity_type, 'properties': None}
+
+    # <summary>
+    # Records the block or network holding the IP in the journal and the ID cache. Lookups that found nothing are not recorded
+    # </summary>
+    def __remember_range(self, entity_type, IP, entity_id):
+        if entity_id:
+            CIDR = IP.rsplit('.', 1)[0] + '.0/24'
+            self.__cache(entity_type, CIDR, entity_id)
+            if self.journal:
+                self.journal.record(entity_type, CIDR, entity_id)
+
+    # <summary>
+    # Stores an ID in the ID cache, if there is one
+    # </summary>
+    def __cache(self, kind, key, entity_id, configuration=None):
+        if self.id_cache and entity_id:
+            self.id_cache.put(kind, key, entity_id, configuration)
+
+    # <summary>
+    # Checks whether a failed call referred to an entity that does not exist, which means an ID read from the ID cache was stale.
+    # The first time, every cached ID of the server is dropped and the ranges looked up so far are forgotten, so that they are looked up again.
+    # Returns True if the call should be retried
+    # </summary>
+    # <param name="error" type="Exception">
+    # The error raised by the call
+    # </param>
+    def __stale(self, error):
+        if not self.id_cache or not BAMClient.isMissingFault(error):
+            return False
+        if not self.__revalidated:
+            self.__revalidated = True
+            self.logger.warning("A cached ID no longer exists on the BAM service, invalidating the ID cache")
+            self.id_cache.invalidate()
+            self.__ranges = dict(item for item in self.__ranges.items() if isinstance(item[1], list))
+        return True
+
+    # <summary>
+    # Looks up the IDs of the type and subtype of a device again, after a call failed on stale cached IDs. Missing ones are created.
+    # The DeviceType and DeviceSubtype are updated in place, so every other device sharing them (see App.id_list) gets the new IDs too.
+    # The device type tree is fetched at most once per client
+    # </summary>
+    # <param name="device" type="Device">
+    # The device whose addDevice call failed
+    # </param>
+    def __resolve_device_type(self, device):
+        if self.__type_tree is None:
+            self.__type_tree = self.getDeviceTypeTree()
+        device_type = device.device_type()
+        device_subtype = device.device_subtype()
+        type_id, subtype_ids = self.__type_tree.get(device_type.name(), [None, {}])
+        if not type_id:
+            type_id = (self.addDeviceType(device_type.name()) or [0])[0]
+        subtype_id = subtype_ids.get(device_subtype.name())
+        if not subtype_id:
+            subtype_id = (self.addDeviceSubtype(type_id, device_subtype.name()) or [0])[0]
+        if not device_type.id() == type_id or not device_subtype.id() == subtype_id:
+            self.logger.debug("Device type {0}/{1} now has IDs {2}/{3}".format(device_type.name(), device_subtype.name(), type_id, subtype_id))
+        device_type.setId(type_id)
+        device_subtype.setId(subtype_id, type_id)
+
+    # <summary>
+    # Loads every IP4Block and IP4Network of the active configuration into a local IPTopology index.
+    # Afterwards getBlock and getNetwork are answered locally, and blocks and networks created by this client are added to the index.
+    # Only use this if this client is the only one creating blocks and networks in the configuration while it runs
+    # </summary>
+    def prefetchTopology(self):
+        topology = IPTopology()
+        # Blocks can be nested inside other blocks, networks live inside blocks
+        parents = [self.configuration_id]
+        while parents:
+            parent_id = parents.pop()
+            for block in self.getAllEntities(parent_id, "IP4Block"):
+                topology.add(block)
+                parents.append(block['id'])
+            if not parent_id == self.configuration_id:
+                for network in self.getAllEntities(parent_id, "IP4Network"):
+                    topology.add(network)
+        self.logger.debug("Prefetched {0} blocks and {1} networks".format(topology.count("IP4Block"), topology.count("IP4Network")))
+        self.topology = topology
+        return topology
+
+    # <summary>
+    # Generator of every child entity of the provided type under a parent, fetched page_size entities per getEntities call
+    # </summary>
+    # <param name="parent_id" type="int">
+    # The ID of the parent entity
+    # </param>
+    # <param name="entity_type" type="string">
+    # The type of child entities to fetch (e.g. "IP4Block")
+    # </param>
+    def getAllEntities(self, parent_id, entity_type):
+        start = 0
+        while True:
+            page = BAMClient.entityList(self.client.getEntities(parent_id, entity_type, start, self.page_size))
+            for entity in page:
+                yield entity
+            if len(page) < self.page_size:
+                return
+            start += self.page_size
+
+    # <summary>
+    # Generator of the pages of child entities of the provided type under a parent, like getAllEntities, but the next page is
+    # fetched by a background thread while the caller works on the current one. At most two pages are held at any time.
+    # The client must not be used for anything else until the generator is exhausted or closed
+    # </summary>
+    # <param name="parent_id" type="int">
+    # The ID of the parent entity
+    # </param>
+    # <param name="entity_type" type="string">
+    # The type of child entities to fetch (e.g. "Device")
+    # </param>
+    def streamPages(self, parent_id, entity_type):
+        pages = Queue.Queue(maxsize=1)
+        stopped = threading.Event()
+        def fetch():
+            start = 0
+            while not stopped.is_set():
+                try:
+                    page = BAMClient.entityList(self.client.getEntities(parent_id, entity_type, start, self.page_size))
+                except Exception, e:
+                    pages.put([None, e])
+                    return
+                pages.put([page, None])
+                if len(page) < self.page_size:
+                    return
+                start += self.page_size
+        fetcher = threading.Thread(target=fetch)
+        fetcher.daemon = True
+        fetcher.start()
+        try:
+            while True:
+                page, error = pages.get()
+                if error:
+                    raise error
+                if page:
+                    yield page
+                if len(page) < self.page_size:
+                    return
+        finally:
+            # Unblock the fetcher if the caller stopped early, then wait for its call to finish before handing the client back
+            stopped.set()
+            while fetcher.is_alive():
+                try:
+                    pages.get(timeout=0.05)
+                except Queue.Empty:
+                    pass
+            fetcher.join()
+
+    # <summary>
+    # Returns True if the exception is a fault raised because the entity being added already exists
+    # </summary>
+    # <param name="error" type="Exception">
+    # The exception raised by the service
+    # </param>
+    @staticmethod
+    def isDuplicateFault(error):
+        message = str(error).lower()
+        for marker in BAMClient.duplicate_markers:
+            if marker in message:
+                return True
+        return False
+
+    # <summary>
+    # Returns True if the exception is a fault raised because the block or network being added overlaps an existing one.
+    # For a network this usually means another session created it first, for a block that the CIDR conflicts with an existing block
+    # </summary>
+    # <param name="error" type="Exception">
+    # The exception raised by the service
+    # </param>
+    @staticmethod
+    def isOverlapFault(error):
+        message = str(error).lower()
+        for marker in BAMClient.overlap_markers:
+            if marker in message:
+                return True
+        return False
+
+    # <summary>
+    # Returns True if the exception is a fault raised because the call refers to an entity that does not exist
+    # </summary>
+    # <param name="error" type="Exception">
+    # The exception raised by the service
+    # </param>
+    @staticmethod
+    def isMissingFault(error):
+        message = str(error).lower()
+        for marker in BAMClient.missing_markers:
+            if marker in message:
+                return True
+        return False
+
+    # <summary>
+    # Returns the ID of the result of addBlock/addNetwork, which is either the existing entity or the new ID
+    # </summary>
+    @staticmethod
+    def entityId(result):
+        try:
+            return result['id']
+        except (TypeError, KeyError, IndexError):
+            return result
+
+    # <summary>
+    # Returns the ID cache key of a device subtype
+    # </summary>
+    @staticmethod
+    def subtypeKey(device_id, name):
+        return "{0}/{1}".format(device_id, name)
+
+    # <summary>
+    # Returns the list of entities held by an APIEntityArray returned by the service. Empty arrays carry no list at all
+    # </summary>
+    # <param name="result" type="APIEntityArray">
+    # The array returned by the service
+    # </param>
+    @staticmethod
+    def entityList(result):
+        try:
+            return result[0]
+        except (IndexError, TypeError, AttributeError):
+            return []
 
     #def addTag(self, name):
 
@@ -0,0 +1,443 @@
+from BAMStandInHandler import BAMStandInHandler
+from IPTopology import IPTopology
+from SOAPFault import SOAPFault
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+import BaseHTTPServer
+import SocketServer
+import random
+import threading
+import time
+import uuid
+
+# <summary>
+# Local stand-in for the Bluecat Address Manager API, for testing and benchmarking without a BAM appliance.
+# Speaks SOAP over HTTP like the real service, serves a WSDL for suds at /Services/API?wsdl and keeps configurations, blocks,
+# networks, device types and devices in memory. Calls can be slowed down and made to fail at random to measure how clients cope
+# </summary>
+class BAMStandIn(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    namespace = "http://api.proteus.bluecatnetworks.com"
+    envelope_namespace = "http://schemas.xmlsoap.org/soap/envelope/"
+    instance_namespace = "http://www.w3.org/2001/XMLSchema-instance"
+    daemon_threads = True
+    allow_reuse_address = True
+
+    # Parameters of every method that hold IDs, converted to long before dispatch
+    id_parameters = ["parentId", "containerId", "configurationId", "blockId", "deviceTypeId", "deviceSubtypeId", "id", "start", "count"]
+    # Schema types of the parameters, string unless listed
+    parameter_types = {"start": "xsd:int", "count": "xsd:int"}
+    # [parameter names in call order, schema type of the return value or None] of every API method served
+    signatures = {
+        "login": [["username", "password"], None],
+        "logout": [[], None],
+        "getSystemInfo": [[], "xsd:string"],
+        "getEntities": [["parentId", "type", "start", "count"], "tns:APIEntityArray"],
+        "getEntityById": [["id"], "tns:APIEntity"],
+        "getEntityByName": [["parentId", "name", "type"], "tns:APIEntity"],
+        "getIPRangedByIP": [["containerId", "type", "address"], "tns:APIEntity"],
+        "addDevice": [["configurationId", "name", "deviceTypeId", "deviceSubtypeId", "ip4Addresses", "ip6Addresses", "properties"], "xsd:long"],
+        "addDeviceType": [["name", "properties"], "xsd:long"],
+        "addDeviceSubtype": [["parentId", "name", "properties"], "xsd:long"],
+        "addIP4BlockByCIDR": [["parentId", "CIDR", "properties"], "xsd:long"],
+        "addIP4Network": [["blockId", "CIDR", "properties"], "xsd:long"],
+    }
+    # Fault string of the errors injected by error_rate
+    injected_fault = "Service temporarily unavailable"
+
+    # <summary>
+    # Constructor for BAMStandIn. The server listens right away but only serves requests once started
+    # </summary>
+    # <param name="port" type="int">
+    # The port to listen on, 0 picks a free one (default = 0)
+    # </param>
+    # <param name="configurations" type="list">
+    # Names of the configurations to create (default = ["Test"], like BAMClient.default_configuration)
+    # </param>
+    # <param name="username" type="string">
+    # The username accepted by login
+    # </param>
+    # <param name="password" type="string">
+    # The password accepted by login
+    # </param>
+    # <param name="latency" type="float">
+    # Seconds every call waits before it is answered, or a dict of seconds by method name (default = 0)
+    # </param>
+    # <param name="error_rate" type="float">
+    # Chance between 0 and 1 that a call fails with injected_fault instead of running, or a dict of chances by method name (default = 0)
+    # </param>
+    # <param name="seed" type="int">
+    # Optional, seed of the random choices of error_rate, so that runs fail on the same calls
+    # </param>
+    def __init__(self, port=0, configurations=None, username="admin", password="admin", latency=0, error_rate=0, seed=None):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", port), BAMStandInHandler)
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.error_rate = error_rate
+        # Number of calls received per API method
+        self.calls = {}
+        # Number of injected errors per API method
+        self.injected = {}
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__sessions = set()
+        self.__entities = {}
+        self.__children = {}
+        self.__parents = {}
+        self.__names = {}
+        self.__topologies = {}
+        self.__next_id = 1
+        self.__thread = None
+        self.__methods = {
+            "login": self.__login,
+            "logout": self.__logout,
+            "getSystemInfo": self.__getSystemInfo,
+            "getEntities": self.__getEntities,
+            "getEntityById": self.__getEntityById,
+            "getEntityByName": self.__getEntityByName,
+            "getIPRangedByIP": self.__getIPRangedByIP,
+            "addDevice": self.__addDevice,
+            "addDeviceType": self.__addDeviceType,
+            "addDeviceSubtype": self.__addDeviceSubtype,
+            "addIP4BlockByCIDR": self.__addIP4BlockByCIDR,
+            "addIP4Network": self.__addIP4Network,
+        }
+        for name in configurations or ["Test"]:
+            configuration = self.__add(0, "Configuration", name, "")
+            self.__topologies[configuration['id']] = IPTopology()
+
+    # <summary>
+    # Serves requests from a background thread. Returns the address to give to BAMClient (e.g. 127.0.0.1:8080)
+    # </summary>
+    def start(self):
+        self.__thread = threading.Thread(target=self.serve_forever)
+        self.__thread.daemon = True
+        self.__thread.start()
+        return self.address()
+
+    # <summary>
+    # Stops serving and closes the listening socket
+    # </summary>
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    # <summary>
+    # Returns the host:port the stand-in listens on
+    # </summary>
+    def address(self):
+        return "{0}:{1}".format(*self.server_address)
+
+    # <summary>
+    # Returns the entities of a type held by the stand-in, e.g. to check what an import created
+    # </summary>
+    # <param name="entity_type" type="string">
+    # The type of entities to return (e.g. "Device")
+    # </param>
+    def entities(self, entity_type):
+        with self.__lock:
+            return [dict(entity) for entity in self.__entities.values() if entity['type'] == entity_type]
+
+    # <summary>
+    # Handles the body of a SOAP request. Returns [HTTP status, response body, cookie to set or None]
+    # </summary>
+    # <param name="body" type="string">
+    # The SOAP envelope of the request
+    # </param>
+    # <param name="cookie" type="string">
+    # The Cookie header of the request
+    # </param>
+    def respond(self, body, cookie):
+        method = None
+        try:
+            method, args = BAMStandIn.parseRequest(body)
+            # Every call waits on its own, like on a server handling requests in parallel
+            delay = BAMStandIn.setting(self.latency, method)
+            if delay:
+                time.sleep(delay)
+            with self.__lock:
+                self.calls[method] = self.calls.get(method, 0) + 1
+                if not method in self.__methods:
+                    raise SOAPFault("Unknown method {}".format(method))
+                if self.__random.random() < BAMStandIn.setting(self.error_rate, method):
+                    self.injected[method] = self.injected.get(method, 0) + 1
+                    raise SOAPFault(BAMStandIn.injected_fault)
+                session = BAMStandIn.session(cookie)
+                if not method == "login" and not session in self.__sessions:
+                    raise SOAPFault("Not logged in")
+                if method == "login":
+                    result = self.__login(args)
+                    return [200, BAMStandIn.response(method, None), result]
+                return [200, BAMStandIn.response(method, self.__methods[method](args)), None]
+        except SOAPFault, e:
+            return [500, BAMStandIn.fault(str(e)), None]
+        except Exception, e:
+            return [500, BAMStandIn.fault("Internal error in {0}: {1}".format(method, e)), None]
+
+    # <summary>
+    # Returns the WSDL describing the API methods served, for suds
+    # </summary>
+    def wsdl(self):
+        return BAMStandIn.document("http://{0}/Services/API".format(self.address()))
+
+    def __login(self, args):
+        if not args.get("username") == self.username or not args.get("password") == self.password:
+            raise SOAPFault("Invalid username or password")
+        session = uuid.uuid4().hex
+        self.__sessions.add(session)
+        return "JSESSIONID={}".format(session)
+
+    def __logout(self, args):
+        return None
+
+    def __getSystemInfo(self, args):
+        return "hostName=bam-stand-in|version=stand-in|"
+
+    def __getEntities(self, args):
+        children = self.__children.get((args["parentId"], args["type"]), [])
+        return [self.__entities[i] for i in children[args["start"]:args["start"] + args["count"]]]
+
+    def __getEntityById(self, args):
+        return self.__entities.get(args["id"], BAMStandIn.empty())
+
+    def __getEntityByName(self, args):
+        entity_id = self.__names.get((args["parentId"], args["type"], args.get("name")))
+        return self.__entities[entity_id] if entity_id else BAMStandIn.empty()
+
+    def __getIPRangedByIP(self, args):
+        topology = self.__topology(args["containerId"])
+        if args["type"] == "IP4Block":
+            found = topology.getBlock(args["address"])
+        elif args["type"] == "IP4Network":
+            found = topology.getNetwork(args["address"])
+        else:
+            raise SOAPFault("Unsupported type {}".format(args["type"]))
+        return self.__entities[found['id']] if found['id'] else BAMStandIn.empty()
+
+    def __addDevice(self, args):
+        configuration_id = args["configurationId"]
+        topology = self.__topology(configuration_id)
+        for entity_id in [args.get("deviceTypeId"), args.get("deviceSubtypeId")]:
+            if entity_id and not entity_id in self.__entities:
+                raise SOAPFault("Object was not found: {}".format(entity_id))
+        addresses = [IP.strip() for IP in (args.get("ip4Addresses") or "").split(',') if IP.strip()]
+        for IP in addresses:
+            if topology.getNetwork(IP)['id'] == 0:
+                raise SOAPFault("IP address {} is not in a network".format(IP))
+        properties = "deviceTypeId={0}|deviceSubtypeId={1}|ip4Addresses={2}|".format(args.get("deviceTypeId") or 0, args.get("deviceSubtypeId") or 0, ','.join(addresses))
+        return self.__add(configuration_id, "Device", args.get("name"), properties)['id']
+
+    def __addDeviceType(self, args):
+        return self.__add(0, "DeviceType", args.get("name"), args.get("properties") or "")['id']
+
+    def __addDeviceSubtype(self, args):
+        parent = self.__entities.get(args["parentId"])
+        if not parent or not parent['type'] == "DeviceType":
+            raise SOAPFault("Object was not found: {}".format(args["parentId"]))
+        return self.__add(args["parentId"], "DeviceSubtype", args.get("name"), args.get("properties") or "")['id']
+
+    def __addIP4BlockByCIDR(self, args):
+        return self.__addRange(args["parentId"], "IP4Block", args["CIDR"])
+
+    def __addIP4Network(self, args):
+        parent = self.__entities.get(args["blockId"])
+        if not parent or not parent['type'] == "IP4Block":
+            raise SOAPFault("Object was not found: {}".format(args["blockId"]))
+        return self.__addRange(args["blockId"], "IP4Network", args["CIDR"])
+
+    # <summary>
+    # Creates a block or network under a configuration or block, after checking it fits its parent and is not a duplicate
+    # </summary>
+    def __addRange(self, parent_id, entity_type, CIDR):
+        topology = self.__topology(parent_id)
+        network, prefix = IPTopology.parseCIDR(CIDR)
+        CIDR = "{0}/{1}".format(IPTopology.toString(network), prefix)
+        parent = self.__entities[parent_id]
+        if parent['type'] == "IP4Block":
+            parent_network, parent_prefix = IPTopology.parseCIDR(IPTopology.parseProperties(parent['properties'])['CIDR'])
+            if prefix < parent_prefix or not network & IPTopology.mask(parent_prefix) == parent_network:
+                raise SOAPFault("{0} does not fit in parent block {1}".format(CIDR, parent_id))
+        for child_id in self.__children.get((parent_id, entity_type), []):
+            child_CIDR = IPTopology.parseProperties(self.__entities[child_id]['properties'])['CIDR']
+            if child_CIDR == CIDR:
+                raise SOAPFault("Duplicate of another item: {}".format(CIDR))
+            child_network, child_prefix = IPTopology.parseCIDR(child_CIDR)
+            if entity_type == "IP4Block" and network & IPTopology.mask(min(prefix, child_prefix)) == child_network & IPTopology.mask(min(prefix, child_prefix)):
+                raise SOAPFault("{0} overlaps with an existing block {1}".format(CIDR, child_CIDR))
+        if entity_type == "IP4Network" and not topology.getNetwork(IPTopology.toString(network))['id'] == 0:
+            raise SOAPFault("{} overlaps with an existing network".format(CIDR))
+        entity = self.__add(parent_id, entity_type, None, "CIDR={}|".format(CIDR))
+        topology.add(entity)
+        return entity['id']
+
+    # <summary>
+    # Stores a new entity. Named entities must be unique per parent and type
+    # </summary>
+    def __add(self, parent_id, entity_type, name, properties):
+        if name and (parent_id, entity_type, name) in self.__names:
+            raise SOAPFault("Duplicate of another item: {}".format(name))
+        entity = {'id': self.__next_id, 'name': name, 'type': entity_type, 'properties': properties}
+        self.__next_id += 1
+        self.__entities[entity['id']] = entity
+        self.__parents[entity['id']] = parent_id
+        self.__children.setdefault((parent_id, entity_type), []).append(entity['id'])
+        if name:
+            self.__names[(parent_id, entity_type, name)] = entity['id']
+        return entity
+
+    # <summary>
+    # Returns the IPTopology of the configuration an entity belongs to
+    # </summary>
+    def __topology(self, entity_id):
+        while entity_id and not entity_id in self.__topologies:
+            entity_id = self.__parents.get(entity_id)
+        if not entity_id:
+            raise SOAPFault("Object was not found")
+        return self.__topologies[entity_id]
+
+    # <summary>
+    # Returns the value of a latency or error_rate setting for a method
+    # </summary>
+    # <param name="value" type="object">
+    # A number applying to every method, or a dict of numbers by method name
+    # </param>
+    # <param name="method" type="string">
+    # The method that was called
+    # </param>
+    @staticmethod
+    def setting(value, method):
+        if isinstance(value, dict):
+            return value.get(method, 0)
+        return value or 0
+
+    # <summary>
+    # Builds a document/literal WSDL of the methods in signatures, with the BAM APIEntity and APIEntityArray types
+    # </summary>
+    # <param name="location" type="string">
+    # The URL of the SOAP endpoint
+    # </param>
+    @staticmethod
+    def document(location):
+        elements = []
+        messages = []
+        operations = []
+        bindings = []
+        for method in sorted(BAMStandIn.signatures):
+            parameters, returned = BAMStandIn.signatures[method]
+            elements.append('<xsd:element name="{0}"><xsd:complexType><xsd:sequence>{1}</xsd:sequence></xsd:complexType></xsd:element>'.format(
+                method, "".join('<xsd:element name="{0}" type="{1}" minOccurs="0" nillable="true"/>'.format(
+                    name, "xsd:long" if name in BAMStandIn.id_parameters else BAMStandIn.parameter_types.get(name, "xsd:string")) for name in parameters)))
+            elements.append('<xsd:element name="{0}Response"><xsd:complexType><xsd:sequence>{1}</xsd:sequence></xsd:complexType></xsd:element>'.format(
+                method, '<xsd:element name="return" type="{}" minOccurs="0" nillable="true"/>'.format(returned) if returned else ""))
+            for name in [method, method + "Response"]:
+                messages.append('<message name="{0}"><part name="parameters" element="tns:{0}"/></message>'.format(name))
+            operations.append('<operation name="{0}"><input message="tns:{0}"/><output message="tns:{0}Response"/></operation>'.format(method))
+            bindings.append('<operation name="{}"><soap:operation soapAction=""/><input><soap:body use="literal"/></input>'
+                            '<output><soap:body use="literal"/></output></operation>'.format(method))
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<definitions xmlns="http://schemas.xmlsoap.org/wsdl/" xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/" '
+                'xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:tns="{0}" targetNamespace="{0}">'
+                '<types><xsd:schema targetNamespace="{0}" elementFormDefault="unqualified">'
+                '<xsd:complexType name="APIEntity"><xsd:sequence>'
+                '<xsd:element name="id" type="xsd:long"/><xsd:element name="name" type="xsd:string" minOccurs="0" nillable="true"/>'
+                '<xsd:element name="properties" type="xsd:string" minOccurs="0" nillable="true"/>'
+                '<xsd:element name="type" type="xsd:string" minOccurs="0" nillable="true"/>'
+                '</xsd:sequence></xsd:complexType>'
+                '<xsd:complexType name="APIEntityArray"><xsd:sequence>'
+                '<xsd:element name="item" type="tns:APIEntity" minOccurs="0" maxOccurs="unbounded" nillable="true"/>'
+                '</xsd:sequence></xsd:complexType>'
+                '{1}</xsd:schema></types>{2}'
+                '<portType name="ProteusAPI">{3}</portType>'
+                '<binding name="ProteusAPIBinding" type="tns:ProteusAPI"><soap:binding style="document" transport="http://schemas.xmlsoap.org/soap/http"/>{4}</binding>'
+                '<service name="ProteusAPI"><port name="ProteusAPIPort" binding="tns:ProteusAPIBinding"><soap:address location="{5}"/></port></service>'
+                '</definitions>').format(BAMStandIn.namespace, "".join(elements), "".join(messages), "".join(operations), "".join(bindings), escape(location))
+
+    # <summary>
+    # Returns the session ID held by a Cookie header
+    # </summary>
+    @staticmethod
+    def session(cookie):
+        for pair in (cookie or "").split(';'):
+            if pair.strip().startswith("JSESSIONID="):
+                return pair.strip()[len("JSESSIONID="):]
+        return None
+
+    # <summary>
+    # The entity the service returns when nothing was found
+    # </summary>
+    @staticmethod
+    def empty():
+        return {'id': 0, 'name': None, 'type': None, 'properties': None}
+
+    # <summary>
+    # Parses a SOAP request into [method name, dict of arguments]. ID arguments are converted to long
+    # </summary>
+    # <param name="body" type="string">
+    # The SOAP envelope of the request
+    # </param>
+    @staticmethod
+    def parseRequest(body):
+        root = ElementTree.fromstring(body)
+        for element in root.iter():
+            if element.tag.rsplit('}', 1)[-1] == "Body":
+                call = list(element)[0]
+                break
+        args = {}
+        for argument in call:
+            name = argument.tag.rsplit('}', 1)[-1]
+            args[name] = long(argument.text) if name in BAMStandIn.id_parameters and argument.text else argument.text
+        return [call.tag.rsplit('}', 1)[-1], args]
+
+    # <summary>
+    # Builds the SOAP envelope of a response
+    # </summary>
+    # <param name="method" type="string">
+    # The method that was called
+    # </param>
+    # <param name="result" type="object">
+    # None, a scalar, an entity dict or a list of entity dicts
+    # </param>
+    @staticmethod
+    def response(method, result):
+        if result is None:
+            returned = ""
+        elif isinstance(result, list):
+            returned = "<return>{}</return>".format("".join("<item>{}</item>".format(BAMStandIn.fields(entity)) for entity in result))
+        elif isinstance(result, dict):
+            returned = "<return>{}</return>".format(BAMStandIn.fields(result))
+        else:
+            returned = "<return>{}</return>".format(escape(str(result)))
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<soap:Envelope xmlns:soap="{0}" xmlns:xsi="{4}"><soap:Body>'
+                '<ns2:{1}Response xmlns:ns2="{2}">{3}</ns2:{1}Response>'
+                '</soap:Body></soap:Envelope>').format(BAMStandIn.envelope_namespace, method, BAMStandIn.namespace, returned, BAMStandIn.instance_namespace)
+
+    # <summary>
+    # Encodes the fields of an entity, empty ones as nil like the real service does
+    # </summary>
+    @staticmethod
+    def fields(entity):
+        parts = []
+        for name in ['id', 'name', 'properties', 'type']:
+            if entity.get(name) is None:
+                parts.append('<{} xsi:nil="true"/>'.format(name))
+            else:
+                parts.append("<{0}>{1}</{0}>".format(name, escape(str(entity[name]))))
+        return "".join(parts)
+
+    # <summary>
+    # Builds the SOAP envelope of a fault
+    # </summary>
+    # <param name="message" type="string">
+    # The fault string
+    # </param>
+    @staticmethod
+    def fault(message):
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<soap:Envelope xmlns:soap="{0}"><soap:Body><soap:Fault>'
+                '<faultcode>soap:Server</faultcode><faultstring>{1}</faultstring>'
+                '</soap:Fault></soap:Body></soap:Envelope>').format(BAMStandIn.envelope_namespace, escape(message))
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
@@ -0,0 +1,48 @@
+import BaseHTTPServer
+
+# <summary>
+# HTTP request handler of BAMStandIn. Serves the WSDL, passes SOAP requests to the server and writes back its responses over keep-alive connections
+# </summary>
+class BAMStandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    # Buffer the headers and body into a single write, small separate writes stall on Nagle and delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    # <summary>
+    # Handles a SOAP request
+    # </summary>
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.getheader('content-length', 0)))
+        status, response, cookie = self.server.respond(body, self.headers.getheader('cookie'))
+        self.send_response(status)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(response)))
+        if cookie:
+            self.send_header("Set-Cookie", "{}; Path=/".format(cookie))
+        self.end_headers()
+        self.wfile.write(response)
+
+    # <summary>
+    # Serves the WSDL at ?wsdl
+    # </summary>
+    def do_GET(self):
+        if not self.path.lower().endswith("?wsdl"):
+            self.send_error(404)
+            return
+        document = self.server.wsdl()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(document)))
+        self.end_headers()
+        self.wfile.write(document)
+
+    # <summary>
+    # Keeps the stand-in quiet, requests are counted by the server instead
+    # </summary>
+    def log_message(self, format, *args):
+        pass
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
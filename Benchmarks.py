@@ -0,0 +1,306 @@
+from __main__ import App
+from BAMClient import BAMClient
+from BAMStandIn import BAMStandIn
+from CSVReader import CSVReader
+from DeviceType import DeviceType
+from DeviceSubtype import DeviceSubtype
+from ImportPlanner import ImportPlanner
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+
+def ignore_callback(msg, fail):
+    return
+
+# <summary>
+# Benchmarks go here. There should be a function for each measured code path, called within this one.
+# The results are saved as JSON so that runs of different versions can be compared
+# </summary>
+# <param name="output" type="string">
+# Optional, the file to save the results to (default = benchmark-<time>.json)
+# </param>
+# <param name="baseline" type="string">
+# Optional, the results of an earlier run to compare against
+# </param>
+# <param name="backend" type="string">
+# The SOAP backend the import benchmark uploads with (default = "suds")
+# </param>
+# <param name="latency" type="float">
+# Seconds the stand-in waits before answering each call of the import benchmark (default = 0)
+# </param>
+def benchmarks(output=None, baseline=None, backend="suds", latency=0):
+    results = {
+        "version": current_version(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "benchmarks": {
+            "populateDevices": populateDevices_benchmark(),
+            "import": import_benchmark(backend=backend, latency=latency),
+        },
+    }
+    output = output or "benchmark-{}.json".format(time.strftime("%Y%m%d-%H%M%S"))
+    with open(output, "w") as output_file:
+        json.dump(results, output_file, indent=2, sort_keys=True)
+    print "[+] Results saved to {}".format(output)
+    if baseline:
+        with open(baseline) as baseline_file:
+            compare(json.load(baseline_file), results)
+    return results
+
+# <summary>
+# Writes a synthetic inventory csv with the layout the importer reads and returns its path
+# </summary>
+# <param name="rows" type="int">
+# The number of csv rows to generate
+# </param>
+# <param name="duplication" type="int">
+# The number of rows per device name, rows past the first of a device exercise the merge path of populateDevices (default = 2)
+# </param>
+# <param name="spread" type="int">
+# Optional, the number of /24 networks the addresses are spread over. By default every 256 rows fill one /24
+# </param>
+# <param name="types" type="int">
+# The number of device types (default = 4)
+# </param>
+# <param name="subtypes" type="int">
+# The number of subtypes of every device type (default = 2)
+# </param>
+def write_inventory(rows, duplication=2, spread=None, types=4, subtypes=2):
+    handle, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(handle, 'w') as csv_file:
+        csv_file.write('Name,IP,Device Type,Device Subtype\n')
+        for idx in range(rows):
+            device = idx // duplication
+            if spread:
+                network = idx % spread
+                host = (idx // spread) % 254 + 1
+            else:
+                network = idx >> 8
+                host = idx & 255
+            csv_file.write('device{0},10.{1}.{2}.{3},Type{4},Subtype{5}\n'.format(device,
+                                                                                 (network >> 8) & 255,
+                                                                                 network & 255,
+                                                                                 host,
+                                                                                 device % types,
+                                                                                 device % subtypes))
+    return path
+
+# <summary>
+# Builds the device type id list that populateDevices expects without contacting a BAM server
+# </summary>
+# <param name="types" type="int">
+# The number of device types, as given to write_inventory (default = 4)
+# </param>
+# <param name="subtypes" type="int">
+# The number of subtypes of every device type, as given to write_inventory (default = 2)
+# </param>
+def local_id_list(types=4, subtypes=2):
+    id_list = {}
+    for type_idx in range(types):
+        device_type = DeviceType('Type{}'.format(type_idx), type_idx + 1)
+        for subtype_idx in range(subtypes):
+            device_type.add(DeviceSubtype('Subtype{}'.format(subtype_idx), (type_idx + 1) * 10 + subtype_idx, type_idx + 1))
+        id_list[device_type.name()] = device_type
+    return id_list
+
+# <summary>
+# Times App.populateDevices over inventories of increasing size.
+# Aggregation is linear when the cost per row stays flat as the row count grows
+# </summary>
+# <param name="sizes" type="list">
+# The row counts to benchmark
+# </param>
+def populateDevices_benchmark(sizes=(10000, 100000, 1000000)):
+    print "+-----------------------------+"
+    print "|  populateDevices Benchmark  |"
+    print "+-----------------------------+"
+    app = App(filename=None,
+              verbose=False,
+              user_input=False,
+              address=None,
+              username=None,
+              password=None,
+              configuration=None,
+              upload=False)
+    app.errorCallback = ignore_callback
+    app.id_list = local_id_list()
+
+    results = []
+    for rows in sizes:
+        path = write_inventory(rows)
+        try:
+            csv = CSVReader(path, ignore_callback, split_columns=['IP'])
+            start = time.time()
+            devices, error = app.populateDevices(csv)
+            elapsed = time.time() - start
+        finally:
+            os.remove(path)
+        assert(len(devices) == (rows + 1) // 2)
+        assert(not error)
+        results.append([rows, elapsed])
+        print "[+] {0:>8} rows: {1:8.3f}s ({2:.2f} us/row)".format(rows, elapsed, elapsed / rows * 1e6)
+
+    # Per-row cost of the largest run relative to the smallest. Quadratic aggregation grows this ratio with the row count, linear keeps it close to 1
+    baseline = results[0][1] / results[0][0]
+    print "[+] Per-row cost ratio {0}/{1} rows: {2:.2f}".format(results[-1][0], results[0][0], (results[-1][1] / results[-1][0]) / baseline)
+    return results
+
+# <summary>
+# Runs every phase of an import of a synthetic inventory against a local BAM stand-in, the way App.start does.
+# Returns the inventory parameters and, per phase, the wall time, the API calls made and the peak memory used by the phase
+# </summary>
+# <param name="rows" type="int">
+# The number of csv rows to generate (default = 2000)
+# </param>
+# <param name="duplication" type="int">
+# The number of rows per device name (default = 2)
+# </param>
+# <param name="spread" type="int">
+# The number of /24 networks the addresses are spread over (default = 16)
+# </param>
+# <param name="types" type="int">
+# The number of device types (default = 4)
+# </param>
+# <param name="subtypes" type="int">
+# The number of subtypes of every device type (default = 2)
+# </param>
+# <param name="backend" type="string">
+# The SOAP backend to upload with (default = "suds")
+# </param>
+# <param name="latency" type="float">
+# Seconds the stand-in waits before answering each call (default = 0)
+# </param>
+def import_benchmark(rows=2000, duplication=2, spread=16, types=4, subtypes=2, backend="suds", latency=0):
+    print "+-----------------------------+"
+    print "|      Import Benchmark       |"
+    print "+-----------------------------+"
+    parameters = {"rows": rows, "duplication": duplication, "spread": spread, "types": types, "subtypes": subtypes, "backend": backend, "latency": latency}
+    print "[+] {}".format(", ".join("{0}={1}".format(name, parameters[name]) for name in sorted(parameters)))
+    path = write_inventory(rows, duplication, spread, types, subtypes)
+    stand_in = BAMStandIn(latency=latency)
+    address = stand_in.start()
+    phases = []
+    try:
+        app = App(filename=path,
+                  verbose=False,
+                  user_input=False,
+                  address=address,
+                  username="admin",
+                  password="admin",
+                  configuration=None,
+                  upload=False,
+                  backend=backend)
+        app.errorCallback = ignore_callback
+        state = {}
+
+        def connect():
+            app.bam_client = BAMClient(address, "admin", "admin", ignore_callback, backend)
+            app.bam_client.setConfiguration(BAMClient.default_configuration)
+        def parse():
+            state['csv'] = CSVReader(path, ignore_callback, split_columns=['IP'])
+        def populate_device_types():
+            state['planner'] = ImportPlanner(app.bam_client, ignore_callback, app.validator).plan(state['csv'])
+            app.id_list = state['planner'].createDeviceTypes()
+        def create_networks():
+            state['planner'].createNetworks()
+        def populate_devices():
+            state['devices'], state['error'] = app.populateDevices(state['csv'])
+        def upload():
+            app.bam_client.addDevices(state['devices'], create_networks=False)
+
+        for name, phase in [["connect", connect], ["parse", parse], ["populateDeviceTypes", populate_device_types],
+                            ["createNetworks", create_networks], ["populateDevices", populate_devices], ["upload", upload]]:
+            phases.append(measure(name, phase, stand_in))
+        assert(len(stand_in.entities("Device")) == (rows + duplication - 1) // duplication)
+        if backend == "async":
+            app.bam_client.client.close()
+    finally:
+        stand_in.stop()
+        os.remove(path)
+    return {"parameters": parameters, "phases": phases}
+
+# <summary>
+# Runs one phase of a benchmark and prints and returns its wall time, API calls and peak memory. The resident memory is sampled
+# in the background while the phase runs, and the peak is how far it rose above the resident memory at the start of the phase
+# </summary>
+# <param name="name" type="string">
+# The name of the phase
+# </param>
+# <param name="phase" type="function">
+# The function to run
+# </param>
+# <param name="stand_in" type="BAMStandIn">
+# The stand-in the phase talks to, its call counts are compared before and after
+# </param>
+def measure(name, phase, stand_in):
+    calls = dict(stand_in.calls)
+    baseline = resident_kb()
+    samples = [baseline]
+    done = threading.Event()
+    def sample():
+        while not done.wait(0.01):
+            samples.append(resident_kb())
+    sampler = threading.Thread(target=sample)
+    sampler.daemon = True
+    sampler.start()
+    start = time.time()
+    try:
+        phase()
+    finally:
+        elapsed = time.time() - start
+        done.set()
+        sampler.join()
+    samples.append(resident_kb())
+    made = dict((method, count - calls.get(method, 0)) for method, count in stand_in.calls.items() if count > calls.get(method, 0))
+    peak = max(samples) - baseline
+    print "[+] {0:<20} {1:8.3f}s {2:>6} calls {3:>8} KB peak".format(name, elapsed, sum(made.values()), peak)
+    return {"name": name, "seconds": elapsed, "calls": made, "peak_kb": peak}
+
+# <summary>
+# Returns the resident memory of the process in kilobytes, read from /proc/self/statm. Where there is no /proc (e.g. macOS),
+# falls back to ru_maxrss, the peak so far, so phases after the one using the most memory then report no growth
+# </summary>
+def resident_kb():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() // 1024
+    except (IOError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+# <summary>
+# Prints how the phases of the import benchmark changed between two saved runs
+# </summary>
+# <param name="baseline" type="dict">
+# The results of the earlier run, as saved by benchmarks
+# </param>
+# <param name="results" type="dict">
+# The results of the current run
+# </param>
+def compare(baseline, results):
+    print "+-----------------------------+"
+    print "|         Comparison          |"
+    print "+-----------------------------+"
+    print "[+] {0} -> {1}".format(baseline.get("version"), results.get("version"))
+    previous = dict((phase["name"], phase) for phase in baseline["benchmarks"].get("import", {}).get("phases", []))
+    for phase in results["benchmarks"]["import"]["phases"]:
+        if not phase["name"] in previous:
+            continue
+        before = previous[phase["name"]]
+        print "[+] {0:<20} {1:8.3f}s -> {2:8.3f}s ({3:+.0%}), {4} -> {5} calls".format(
+            phase["name"], before["seconds"], phase["seconds"], phase["seconds"] / before["seconds"] - 1 if before["seconds"] else 0,
+            sum(before["calls"].values()), sum(phase["calls"].values()))
+
+# <summary>
+# Returns the git commit being benchmarked, or None outside of a git checkout
+# </summary>
+def current_version():
+    try:
+        with open(os.devnull, "w") as devnull:
+            return subprocess.check_output(["git", "describe", "--always", "--dirty"], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -1,7 +1,11 @@
-import pandas as pd
+from CSVTable import CSVTable
+from itertools import izip
+import csv
+import os
 
 # <summary>
 # pandas DataFrame interface for easily parsing csv files
+# Small files are read with the csv module into a CSVTable instead, which spares the cost of importing pandas on short runs
 # </summary>
 # <todo priority="high">
 # Add write abilities
@@ -9,11 +13,13 @@ import pandas as pd
 # <todo priority="low">
 # Rename it to CSV_IO or something logical for read/write. Or Create a CSVWriter class
 # </todo>
-# <todo priority="moderate">
-# Migrate App.formatCell() to this class. It doesn't make sense for it to be there
-# </todo>
 class CSVReader:
 
+    # Files up to this many bytes are read with the csv backend when no backend is chosen
+    small_file = 1024 * 1024
+    # Options of pandas.read_csv: every cell is read as text, and the same cells count as missing as with the csv backend
+    pandas_options = {"dtype": str, "na_values": CSVTable.na_values, "keep_default_na": False}
+
     # <summary>
     # constructor for CSVReader class
     # </summary>
@@ -23,19 +29,214 @@ class CSVReader:
     # <param name="callback" type="function">
     # callback function for error reporting
     # </param>
-    def __init__(self, file, callback=None):
+    # <param name="chunk_size" type="int">
+    # Optional, enables streaming mode. The csv is never loaded as a whole, instead it is read chunk_size rows at a time on every pass
+    # </param>
+    # <param name="split_columns" type="list">
+    # Optional, names of columns whose cells hold comma separated values (e.g. "IP"). Their cells are normalized into lists
+    # </param>
+    # <param name="backend" type="string">
+    # Optional, "pandas" to read into DataFrames or "csv" to read into CSVTables with the csv module. Both read every cell as text
+    # and the same cells as missing (see pandas_options). By default files up to small_file bytes use "csv" and larger ones "pandas"
+    # </param>
+    def __init__(self, file, callback=None, chunk_size=None, split_columns=None, backend=None):
         self.file = file
-        self.reader = pd.read_csv(file)
+        self.chunk_size = chunk_size
+        self.split_columns = split_columns or []
+        self.backend = backend or CSVReader.chooseBackend(file)
+        # Normalized DataFrame and its columns as lists, built on first use and dropped whenever the DataFrame is modified
+        self.__frame = None
+        self.__columns = None
+        if chunk_size:
+            self.reader = None
+        elif self.backend == "csv":
+            with open(file, "rb") as csv_file:
+                self.reader = next(CSVTable.read(csv.reader(csv_file)), None) or CSVTable([], [])
+        else:
+            import pandas as pd
+            self.reader = pd.read_csv(file, **CSVReader.pandas_options)
         if callback:
             self.callback = callback
         else:
             self.callback = CSVReader.defaultCallback
 
     # <summary>
-    # returns a list of pandas.core.series.Series instances, for each row
+    # Returns the backend to read a file with when none is chosen, "csv" for files up to small_file bytes and "pandas" otherwise
+    # </summary>
+    # <param name="file" type="string">
+    # path to csv file to parse
+    # </param>
+    @staticmethod
+    def chooseBackend(file):
+        try:
+            return "csv" if os.path.getsize(file) <= CSVReader.small_file else "pandas"
+        except OSError:
+            # Let pandas report the missing file like it always has
+            return "pandas"
+
+    # <summary>
+    # Returns True if the reader is in streaming mode (see chunk_size)
+    # </summary>
+    def streaming(self):
+        return self.reader is None
+
+    # <summary>
+    # returns a list of pandas.core.series.Series instances (OrderedDicts with the csv backend), for each row
+    # In streaming mode this materializes the whole file, prefer streamRows or iterRecords
     # </summary>
     def getRows(self):
-        return [i for i in self.reader.iterrows()]
+        return [i for i in self.streamRows()]
+
+    # <summary>
+    # Fast path for row access. Generator of plain (index, value, value, ...) tuples holding the requested columns in the order given,
+    # similar to DataFrame.itertuples but without building a Series per row
+    # </summary>
+    # <param name="names" type="list">
+    # The names of the columns to include in each tuple
+    # </param>
+    def iterRecords(self, names):
+        for chunk in self.streamChunks():
+            for record in CSVReader.records(chunk, names):
+                yield record
+
+    # <summary>
+    # Generator of (index, value, value, ...) tuples for the requested columns of a single (normalized) DataFrame or chunk
+    # </summary>
+    # <param name="frame" type="pandas.DataFrame">
+    # The DataFrame (or CSVTable) to read
+    # </param>
+    # <param name="names" type="list">
+    # The names of the columns to include in each tuple
+    # </param>
+    @staticmethod
+    def records(frame, names):
+        return izip(frame.index, *[CSVReader.values(frame[name]) for name in names])
+
+    # <summary>
+    # Returns the distinct (value, value, ...) tuples of the requested columns of a single (normalized) DataFrame or chunk, in order of appearance
+    # </summary>
+    # <param name="frame" type="pandas.DataFrame">
+    # The DataFrame (or CSVTable) to read
+    # </param>
+    # <param name="names" type="list">
+    # The names of the columns to include in each tuple
+    # </param>
+    @staticmethod
+    def distinct(frame, names):
+        if isinstance(frame, CSVTable):
+            seen = set()
+            return [values for values in izip(*[frame[name] for name in names]) if not (values in seen or seen.add(values))]
+        return list(frame[names].drop_duplicates().itertuples(index=False))
+
+    # <summary>
+    # Returns a column of a DataFrame (a Series) or of a CSVTable (already a list) as a list
+    # </summary>
+    # <param name="column" type="object">
+    # The column
+    # </param>
+    @staticmethod
+    def values(column):
+        if isinstance(column, list):
+            return column
+        return column.tolist()
+
+    # <summary>
+    # Generator of normalized DataFrame chunks (see normalize).
+    # In streaming mode the file is read chunk_size rows at a time, otherwise the in memory DataFrame is yielded as a single chunk
+    # </summary>
+    def streamChunks(self):
+        if not self.streaming():
+            yield self.__normalized()
+            return
+        if self.backend == "csv":
+            with open(self.file, "rb") as csv_file:
+                for chunk in CSVTable.read(csv.reader(csv_file), self.chunk_size):
+                    if len(chunk):
+                        yield self.normalize(chunk)
+            return
+        import pandas as pd
+        for chunk in pd.read_csv(self.file, chunksize=self.chunk_size, **CSVReader.pandas_options):
+            yield self.normalize(chunk)
+
+    # <summary>
+    # Returns the number of rows of the in memory csv, normalizing it first if it was not yet (see shard)
+    # </summary>
+    def rowCount(self):
+        return len(self.__normalized())
+
+    # <summary>
+    # Returns the normalized rows at positions start to stop (excluded) of the in memory csv, as a DataFrame or CSVTable chunk
+    # that keeps the row indexes of the whole csv. Processes forked after rowCount share the rows normalized by their parent
+    # </summary>
+    # <param name="start" type="int">
+    # The position of the first row
+    # </param>
+    # <param name="stop" type="int">
+    # The position after the last row
+    # </param>
+    def shard(self, start, stop):
+        frame = self.__normalized()
+        if isinstance(frame, CSVTable):
+            return frame.slice(start, stop)
+        return frame.iloc[start:stop]
+
+    # <summary>
+    # Returns the normalized in memory DataFrame, normalizing it only the first time
+    # </summary>
+    def __normalized(self):
+        if self.__frame is None:
+            self.__frame = self.normalize(self.reader)
+        return self.__frame
+
+    # <summary>
+    # Returns a dict of every normalized column as a list, built in a single pass the first time it is needed
+    # In streaming mode nothing is cached, so memory stays bounded
+    # </summary>
+    def __columnar(self):
+        if self.__columns is None:
+            frame = self.__normalized()
+            self.__columns = dict((name, CSVReader.values(frame[name])) for name in frame.columns)
+        return self.__columns
+
+    # <summary>
+    # Drops the cached normalized DataFrame and columns. Must be called whenever self.reader is modified
+    # </summary>
+    def __invalidate(self):
+        self.__frame = None
+        self.__columns = None
+
+    # <summary>
+    # Normalizes a whole DataFrame one column at a time with pandas string operations rather than calling formatCell per cell.
+    # Missing and blank cells become 'Not Listed', text is stripped of surrounding whitespace and cells of split_columns become lists
+    # </summary>
+    # <param name="frame" type="pandas.DataFrame">
+    # The DataFrame (or chunk, or CSVTable) to normalize. It is not modified, a normalized copy is returned
+    # </param>
+    def normalize(self, frame):
+        if isinstance(frame, CSVTable):
+            return frame.normalize(self.split_columns)
+        frame = frame.copy()
+        for name in frame.columns:
+            column = frame[name]
+            if column.dtype == object:
+                column = column.fillna('Not Listed').astype(str).str.strip()
+                column = column.mask(column == '', 'Not Listed')
+            elif column.isnull().any():
+                # Numeric columns are left alone unless they have missing cells, e.g. a column that is completely empty
+                column = column.astype(object).where(column.notnull(), 'Not Listed')
+            if name in self.split_columns:
+                column = column.astype(str).str.split(r'\s*,\s*')
+            frame[name] = column
+        return frame
+
+    # <summary>
+    # Generator of normalized rows, as (index, pandas.core.series.Series) tuples like getRows.
+    # Only one chunk is held in memory at a time in streaming mode
+    # </summary>
+    def streamRows(self):
+        for chunk in self.streamChunks():
+            for row in chunk.iterrows():
+                yield row
 
     # <summary>
     # returns a list containing a pandas.core.series.Series instance, based on the name field
@@ -45,25 +246,54 @@ class CSVReader:
     # </param>
     def getColumn(self, name):
         try:
-            return [i[1][name] for i in self.getRows()]
+            if not self.streaming():
+                return list(self.__columnar()[name])
+            column = []
+            for chunk in self.streamChunks():
+                column.extend(CSVReader.values(chunk[name]))
+            return column
         except:
             self.callback('No field called %s' % name, False)
 
     # <summary>
     # Similar to getColumn, but takes a list of names and returns a dict of columns
+    # All of the columns are read in a single pass over the csv
     # </summary>
     # <param name="names" type="list">
     # The list of names to retrieve from the CSV
     # </param>
     def getColumns(self, names):
         try:
-            cols = {}
-            for name in names:
-                cols[name] = [i[1][name] for i in self.getRows()]
+            if not self.streaming():
+                # Copies, so that callers can modify the lists without corrupting the cache
+                columns = self.__columnar()
+                cols = {}
+                for name in names:
+                    cols[name] = list(columns[name])
+                return cols
+            cols = dict((name, []) for name in names)
+            for chunk in self.streamChunks():
+                for name in names:
+                    cols[name].extend(CSVReader.values(chunk[name]))
             return cols
         except:
             self.callback('No field called %s' % name, False)
 
+    # <summary>
+    # Replaces invalid values with 'Not Listed' and trims trailing whitespace. Intended to be used with csv cell values
+    # Rows read through this class are already normalized column-wise (see normalize), this is for single values only
+    # </summary>
+    # <param name="value" type="string">
+    # The cell value to format
+    # </param>
+    @staticmethod
+    def formatCell(value):
+        if not value or str(value) == 'nan':
+            value = 'Not Listed'
+        if isinstance(value, basestring):
+            return value.strip()
+        return value
+
     # <summary>
     # Allows modification of data in the DataFrame structure created by the pandas module (in memory csv basically)
     # </summary>
@@ -80,9 +310,17 @@ class CSVReader:
     # Either use this or remove it. It was from an old design choice and is currently unused.
     # </todo>
     def modifyValue(self, column_name, index, value):
+        if self.streaming():
+            self.callback("Cannot modify values of a streamed csv", False)
+            return False
         try:
+            if isinstance(self.reader, CSVTable):
+                self.reader.setValue(index, column_name, value)
+                self.__invalidate()
+                return self.reader.getValue(index, column_name) == value
             self.reader.set_value(index, column_name, value)
-            return self.getColumns(column_name)[1][index] == value
+            self.__invalidate()
+            return self.reader.get_value(index, column_name) == value
         except Exception, e:
             self.callback("%d" % self.reader.index, False)
             self.callback("Could not set value in DataFrame: %s" % e, False)
@@ -97,7 +335,11 @@ class CSVReader:
     # Either use this or remove it. It was from an old design choice and is currently unused.
     # </todo>
     def removeRows(self, indexes):
+        if self.streaming():
+            self.callback("Cannot remove rows from a streamed csv", False)
+            return
         self.reader = self.reader.drop(indexes)
+        self.__invalidate()
 
     # <summary>
     # The default callback (in case one isnt provided.)
@@ -0,0 +1,172 @@
+import collections
+import re
+
+# <summary>
+# Column oriented table of csv cells, stored as plain lists. Read with the csv module, it is the pandas-free counterpart of the
+# DataFrame CSVReader uses for small files, and supports the subset of the DataFrame interface CSVReader relies on
+# (table[name], columns, index, iterrows, copy and drop). Every cell is read as text, and cells that pandas counts as missing are read as empty
+# </summary>
+class CSVTable:
+
+    # Cells read as missing, the default NA strings of pandas.read_csv. CSVReader passes the same set to pandas, so both backends agree
+    na_values = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                 'N/A', 'NA', 'NULL', 'NaN', 'n/a', 'nan', 'null']
+
+    # <summary>
+    # Constructor for CSVTable
+    # </summary>
+    # <param name="columns" type="list">
+    # The names of the columns, in order
+    # </param>
+    # <param name="rows" type="list">
+    # The rows, as lists of cells. Rows shorter than the header are padded with empty cells
+    # </param>
+    # <param name="start" type="int">
+    # The index of the first row (default = 0)
+    # </param>
+    def __init__(self, columns, rows, start=0):
+        self.columns = list(columns)
+        self.index = range(start, start + len(rows))
+        width = len(self.columns)
+        padded = [row if len(row) >= width else row + [''] * (width - len(row)) for row in rows]
+        self.__data = dict((name, [row[position] for row in padded]) for position, name in enumerate(self.columns))
+
+    # <summary>
+    # Returns the cells of a column as a list. Raises KeyError if there is no such column
+    # </summary>
+    def __getitem__(self, name):
+        return self.__data[name]
+
+    # <summary>
+    # Replaces the cells of a column
+    # </summary>
+    def __setitem__(self, name, cells):
+        if not name in self.__data:
+            self.columns.append(name)
+        self.__data[name] = list(cells)
+
+    # <summary>
+    # Returns the number of rows
+    # </summary>
+    def __len__(self):
+        return len(self.index)
+
+    # <summary>
+    # Returns a copy of the table. The cells themselves are shared, the lists holding them are not
+    # </summary>
+    def copy(self):
+        table = CSVTable(self.columns, [])
+        table.index = list(self.index)
+        for name in self.columns:
+            table[name] = self.__data[name]
+        return table
+
+    # <summary>
+    # Returns a copy of the table without the rows of the given indexes
+    # </summary>
+    # <param name="indexes" type="list">
+    # The indexes of the rows to leave out
+    # </param>
+    def drop(self, indexes):
+        dropped = set(indexes)
+        keep = [position for position, idx in enumerate(self.index) if not idx in dropped]
+        table = CSVTable(self.columns, [])
+        table.index = [self.index[position] for position in keep]
+        for name in self.columns:
+            cells = self.__data[name]
+            table[name] = [cells[position] for position in keep]
+        return table
+
+    # <summary>
+    # Returns a copy of the rows at positions start to stop (excluded), like DataFrame.iloc[start:stop]
+    # </summary>
+    # <param name="start" type="int">
+    # The position of the first row
+    # </param>
+    # <param name="stop" type="int">
+    # The position after the last row
+    # </param>
+    def slice(self, start, stop):
+        table = CSVTable(self.columns, [])
+        table.index = self.index[start:stop]
+        for name in self.columns:
+            table[name] = self.__data[name][start:stop]
+        return table
+
+    # <summary>
+    # Returns the cell of a row and column. Raises KeyError if there is no such row or column
+    # </summary>
+    def getValue(self, index, name):
+        return self.__data[name][self.__position(index)]
+
+    # <summary>
+    # Sets the cell of a row and column. Raises KeyError if there is no such row or column
+    # </summary>
+    def setValue(self, index, name, value):
+        self.__data[name][self.__position(index)] = value
+
+    # <summary>
+    # Generator of (index, row) tuples, with each row an OrderedDict of cells by column name, like DataFrame.iterrows
+    # </summary>
+    def iterrows(self):
+        columns = [self.__data[name] for name in self.columns]
+        for position, idx in enumerate(self.index):
+            yield idx, collections.OrderedDict((name, column[position]) for name, column in zip(self.columns, columns))
+
+    # <summary>
+    # Returns a normalized copy of the table, like CSVReader.normalize does for DataFrames:
+    # blank cells become 'Not Listed', text is stripped of surrounding whitespace and cells of split_columns become lists
+    # </summary>
+    # <param name="split_columns" type="list">
+    # The names of the columns whose cells hold comma separated values
+    # </param>
+    def normalize(self, split_columns):
+        separator = re.compile(r'\s*,\s*')
+        table = self.copy()
+        for name in self.columns:
+            column = [cell.strip() or 'Not Listed' for cell in self.__data[name]]
+            if name in split_columns:
+                column = [separator.split(cell) for cell in column]
+            table[name] = column
+        return table
+
+    # <summary>
+    # Returns the position of a row index in the columns
+    # </summary>
+    def __position(self, index):
+        try:
+            return self.index.index(index)
+        except ValueError:
+            raise KeyError(index)
+
+    # <summary>
+    # Reads a table from a csv.reader, up to limit rows at a time. Empty lines are skipped and cells in na_values are read as empty,
+    # like pandas.read_csv does. Generator of tables, the first starting at index 0. A file with a header but no rows yields one empty table
+    # </summary>
+    # <param name="reader" type="csv.reader">
+    # The reader, positioned on the header row
+    # </param>
+    # <param name="limit" type="int">
+    # Optional, the most rows per table. None reads the whole file into one table
+    # </param>
+    @staticmethod
+    def read(reader, limit=None):
+        columns = next(reader, None)
+        if columns is None:
+            return
+        na_values = frozenset(CSVTable.na_values)
+        start = 0
+        rows = []
+        for row in reader:
+            if not row:
+                continue
+            rows.append(['' if cell in na_values else cell for cell in row])
+            if limit and len(rows) == limit:
+                yield CSVTable(columns, rows, start)
+                start += len(rows)
+                rows = []
+        if rows or not start:
+            yield CSVTable(columns, rows, start)
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
@@ -0,0 +1,59 @@
+import csv
+
+# <summary>
+# Writes csv files row by row, in the layout CSVReader reads. Nothing but the row being written is held in memory
+# </summary>
+class CSVWriter:
+
+    # <summary>
+    # Constructor for CSVWriter. Creates (or truncates) the file and writes the header
+    # </summary>
+    # <param name="file" type="string">
+    # path of the csv file to write
+    # </param>
+    # <param name="columns" type="list">
+    # The names of the columns, written as the header
+    # </param>
+    def __init__(self, file, columns):
+        self.file = file
+        self.columns = columns
+        self.rows = 0
+        self.__file = open(file, "wb")
+        self.__writer = csv.writer(self.__file)
+        self.__writer.writerow([CSVWriter.formatCell(column) for column in columns])
+
+    # <summary>
+    # Writes a row. Cells holding lists (e.g. the IP column) are written as comma separated values, like CSVReader splits them
+    # </summary>
+    # <param name="cells" type="list">
+    # The values of the row, in the order of columns
+    # </param>
+    def writeRow(self, cells):
+        self.__writer.writerow([CSVWriter.formatCell(cell) for cell in cells])
+        self.rows += 1
+
+    # <summary>
+    # Flushes and closes the file
+    # </summary>
+    def close(self):
+        if not self.__file.closed:
+            self.__file.close()
+
+    # <summary>
+    # Returns a cell value as a utf-8 byte string, the python 2 csv module cannot write unicode
+    # </summary>
+    # <param name="value" type="object">
+    # The cell value
+    # </param>
+    @staticmethod
+    def formatCell(value):
+        if isinstance(value, (list, tuple)):
+            value = ",".join(CSVWriter.formatCell(item) for item in value)
+        if value is None:
+            return ""
+        if isinstance(value, unicode):
+            return value.encode("utf-8")
+        return str(value)
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
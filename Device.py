@@ -3,8 +3,12 @@ from DeviceSubtype import DeviceSubtype
 from Address import Address
 # <summary>
 # Class which stores information about a device on the BAM service
+# Slotted, since imports hold one per device of the csv. The error callback is only used while constructing
 # </summary>
-class Device:
+class Device(object):
+
+	__slots__ = ("__name", "__addresses", "__device_type", "__device_subtype")
+
 	# <summary>
 	# Constructor for Device Object
 	# </summary>
@@ -24,28 +28,27 @@ class Device:
 	# The callback function to use in the event of an error
 	# </param>
 	def __init__(self, name, addresses, device_type, device_subtype, error_callback):
-		self.error_callback = error_callback
 		self.__name = name
 
 		# UNTESTED
 		for address in addresses:
 			if not isinstance(address, Address):
-				self.error_callback("Address {} associated with Device is not a valid IP".format(address), False)
+				error_callback("Address {} associated with Device is not a valid IP".format(address), False)
 				del addresses[addresses.index(address)]
 
 
 		self.__addresses = addresses
 		
 		if not isinstance(device_type, DeviceType):
-			self.error_callback("Device type must be a DeviceType instance!", True)
+			error_callback("Device type must be a DeviceType instance!", True)
 		self.__device_type = device_type
 
 		if not isinstance(device_subtype, DeviceSubtype):
 			try:
 				device_type.subtypes()[device_subtype.name()]
 			except KeyError:
-				self.error_callback("Device Subtype {0} not a child type of Device type {1}!".format(device_subtype, device_type), True)
-			self.error_callback("Device subtype must be a DeviceSubtype instance!", True)
+				error_callback("Device Subtype {0} not a child type of Device type {1}!".format(device_subtype, device_type), True)
+			error_callback("Device subtype must be a DeviceSubtype instance!", True)
 		self.__device_subtype = device_subtype
 	
 	# <summary>
@@ -1,15 +1,18 @@
 # <summary>
 # BAM device subtype instance. Contains only basic info right now, that could change down the road however
+# One instance per subtype is shared by every Device of that subtype (see App.id_list), its name is interned
 # </summary>
 # <todo priority="high">
 # Escape name to avoid potential errors with certain special chars
 # </todo>
-class DeviceSubtype:
+class DeviceSubtype(object):
+
+    __slots__ = ("__name", "__id", "__parent_id")
+
     def __init__(self, name, type_id, parent_id=None):
-        self.__name = name
+        self.__name = intern(name) if type(name) is str else name
         self.__id = type_id
-        if parent_id:
-        	self.__parent_id = parent_id
+        self.__parent_id = parent_id
 
     # <summary>
     # Accessor for device id
@@ -17,6 +20,19 @@ class DeviceSubtype:
     def id(self):
         return self.__id
 
+    # <summary>
+    # Replaces the device id, e.g. once a cached one turned out to be stale (see BAMClient)
+    # </summary>
+    # <param name="type_id" type="int">
+    # The new ID of the subtype
+    # </param>
+    # <param name="parent_id" type="int">
+    # The ID of its device type
+    # </param>
+    def setId(self, type_id, parent_id):
+        self.__id = type_id
+        self.__parent_id = parent_id
+
 	# <summary>
     # Accessor for device name
     # </summary>
@@ -2,11 +2,14 @@ from DeviceSubtype import DeviceSubtype
 
 # <summary>
 # BAM device type instance. Contains only basic info right now, that could change down the road however
+# One instance per type is shared by every Device of that type (see App.id_list), its name is interned
 # </summary>
 # <todo priority="low">
 # Rename children to subtypes maybe?
 # </todo>
-class DeviceType:
+class DeviceType(object):
+
+    __slots__ = ("__name", "__device_id", "children")
 
     # <summary>
     # Constructor for DeviceType
@@ -24,7 +27,7 @@ class DeviceType:
     # Escape name to avoid potential errors with certain special chars
     # </todo>
     def __init__(self, name, device_id, children=None):
-        self.__name = name
+        self.__name = intern(name) if type(name) is str else name
         self.__device_id = device_id
         if children:
             # Parameter validation of children. Verify that all children passed in are in fact DeviceSubtype objects
@@ -60,6 +63,15 @@ class DeviceType:
     def id(self):
         return self.__device_id
 
+    # <summary>
+    # Replaces the device id, e.g. once a cached one turned out to be stale (see BAMClient)
+    # </summary>
+    # <param name="device_id" type="int">
+    # The new ID of the device type
+    # </param>
+    def setId(self, device_id):
+        self.__device_id = device_id
+
     # <summary>
     # Accessor for device name
     # </summary>
@@ -0,0 +1,148 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# <summary>
+# SQLite backed cache of BAM entity IDs that persists across runs.
+# Entries are keyed by server, configuration, entity kind and a key (e.g. a name or a /24 CIDR) and expire after ttl seconds.
+# Cached IDs are trusted as is, BAMClient forgets them when a call using one fails because the entity no longer exists
+# </summary>
+class IDCache:
+
+    # Where the cache is kept unless another location is given
+    default_location = os.path.join(os.path.expanduser("~"), ".bluecat-csv-importer", "ids.sqlite")
+    # Default lifetime of an entry, in seconds
+    default_ttl = 24 * 60 * 60
+
+    # <summary>
+    # Constructor for IDCache. Entries are scoped to no configuration until setConfiguration is called
+    # </summary>
+    # <param name="server" type="string">
+    # Address of the BAM server the IDs belong to
+    # </param>
+    # <param name="location" type="string">
+    # Optional, path of the SQLite database (default = ~/.bluecat-csv-importer/ids.sqlite)
+    # </param>
+    # <param name="ttl" type="int">
+    # Optional, lifetime of an entry in seconds, None never expires entries (default = one day)
+    # </param>
+    def __init__(self, server, location=None, ttl=default_ttl):
+        self.server = server
+        self.location = location or IDCache.default_location
+        self.ttl = ttl
+        self.configuration = ""
+        self.logger = logging.getLogger(__name__)
+        # sqlite3 connections cannot be shared between threads, every thread (e.g. UploadPool sessions) gets its own
+        self.__local = threading.local()
+        directory = os.path.dirname(self.location)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with self.__connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS ids (server TEXT, configuration TEXT, kind TEXT, key TEXT, id INTEGER, stored REAL, "
+                               "PRIMARY KEY (server, configuration, kind, key))")
+
+    # <summary>
+    # Scopes the entries stored and read from now on to a configuration
+    # </summary>
+    # <param name="name" type="string">
+    # The name of the configuration
+    # </param>
+    def setConfiguration(self, name):
+        self.configuration = name or ""
+
+    # <summary>
+    # Returns the cached ID of an entity, or None if it is not cached or has expired
+    # </summary>
+    # <param name="kind" type="string">
+    # The kind of entity (e.g. "DeviceType")
+    # </param>
+    # <param name="key" type="string">
+    # The key of the entity within its kind
+    # </param>
+    # <param name="configuration" type="string">
+    # Optional, the configuration scope to read from instead of the current one ("" for server wide entities)
+    # </param>
+    def get(self, kind, key, configuration=None):
+        row = self.__connection().execute("SELECT id, stored FROM ids WHERE server = ? AND configuration = ? AND kind = ? AND key = ?",
+                                          (self.server, self.__scope(configuration), kind, key)).fetchone()
+        if not row:
+            return None
+        if not self.ttl is None and row[1] < time.time() - self.ttl:
+            return None
+        return row[0]
+
+    # <summary>
+    # Stores the ID of an entity
+    # </summary>
+    # <param name="kind" type="string">
+    # The kind of entity (e.g. "DeviceType")
+    # </param>
+    # <param name="key" type="string">
+    # The key of the entity within its kind
+    # </param>
+    # <param name="entity_id" type="int">
+    # The ID to store
+    # </param>
+    # <param name="configuration" type="string">
+    # Optional, the configuration scope to store in instead of the current one ("" for server wide entities)
+    # </param>
+    def put(self, kind, key, entity_id, configuration=None):
+        with self.__connection() as connection:
+            connection.execute("INSERT OR REPLACE INTO ids VALUES (?, ?, ?, ?, ?, ?)",
+                               (self.server, self.__scope(configuration), kind, key, long(entity_id), time.time()))
+
+    # <summary>
+    # Removes cached entries of a kind, either all of them or only the one with the key
+    # </summary>
+    # <param name="kind" type="string">
+    # The kind of entity (e.g. "DeviceType")
+    # </param>
+    # <param name="key" type="string">
+    # Optional, the key of the entity to remove
+    # </param>
+    # <param name="configuration" type="string">
+    # Optional, the configuration scope to remove from instead of the current one ("" for server wide entities)
+    # </param>
+    def forget(self, kind, key=None, configuration=None):
+        with self.__connection() as connection:
+            if key is None:
+                connection.execute("DELETE FROM ids WHERE server = ? AND configuration = ? AND kind = ?", (self.server, self.__scope(configuration), kind))
+            else:
+                connection.execute("DELETE FROM ids WHERE server = ? AND configuration = ? AND kind = ? AND key = ?",
+                                   (self.server, self.__scope(configuration), kind, key))
+
+    # <summary>
+    # Removes the cached entries of the server, either of every configuration or only of one
+    # </summary>
+    # <param name="configuration" type="string">
+    # Optional, only remove the entries of this configuration
+    # </param>
+    def invalidate(self, configuration=None):
+        with self.__connection() as connection:
+            if configuration is None:
+                connection.execute("DELETE FROM ids WHERE server = ?", (self.server,))
+            else:
+                connection.execute("DELETE FROM ids WHERE server = ? AND configuration = ?", (self.server, configuration))
+        self.logger.debug("Invalidated cached IDs of {0} {1}".format(self.server, configuration or ""))
+
+    # <summary>
+    # Returns the configuration scope to use
+    # </summary>
+    def __scope(self, configuration):
+        return self.configuration if configuration is None else configuration
+
+    # <summary>
+    # Returns the connection of the calling thread, opening it if needed
+    # </summary>
+    def __connection(self):
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            # Other processes may be writing at the same time, wait for their locks rather than fail
+            connection = sqlite3.connect(self.location, timeout=30)
+            self.__local.connection = connection
+        return connection
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
@@ -0,0 +1,169 @@
+import socket
+import struct
+import threading
+
+# <summary>
+# Local containment index of the IP4Block and IP4Network entities of a BAM configuration.
+# Answers the same questions as BAMClient.getBlock/getNetwork (getIPRangedByIP) without a round trip to the server.
+# Safe to share between the sessions of an UploadPool
+# </summary>
+class IPTopology:
+
+    # <summary>
+    # Constructor for IPTopology
+    # </summary>
+    def __init__(self):
+        # entity type -> {prefix length -> {network address as int -> entity}}
+        self.__ranges = {"IP4Block": {}, "IP4Network": {}}
+        self.__lock = threading.Lock()
+
+    # <summary>
+    # Adds an entity returned by the BAM service (e.g. from getEntities) to the index.
+    # Entities that are not blocks or networks, or that have no CIDR property, are ignored.
+    # Returns True if the entity was indexed
+    # </summary>
+    # <param name="entity" type="APIEntity">
+    # The block or network entity to index
+    # </param>
+    def add(self, entity):
+        entity_type = entity['type']
+        if not entity_type in self.__ranges:
+            return False
+        CIDR = IPTopology.parseProperties(entity['properties']).get('CIDR')
+        if not CIDR:
+            return False
+        return self.addCIDR(entity_type, CIDR, entity['id'], entity['name'], entity['properties'])
+
+    # <summary>
+    # Adds a block or network to the index by CIDR, e.g. one that the client has just created itself.
+    # Returns True if the range was indexed
+    # </summary>
+    # <param name="entity_type" type="string">
+    # Either "IP4Block" or "IP4Network"
+    # </param>
+    # <param name="CIDR" type="string">
+    # The CIDR of the range (e.g. 10.0.0.0/24)
+    # </param>
+    # <param name="entity_id" type="int">
+    # The ID of the entity on the BAM service
+    # </param>
+    # <param name="name" type="string">
+    # Optional, the name of the entity
+    # </param>
+    # <param name="properties" type="string">
+    # Optional, the BAM properties string of the entity
+    # </param>
+    def addCIDR(self, entity_type, CIDR, entity_id, name=None, properties=None):
+        if not entity_type in self.__ranges:
+            return False
+        network, prefix = IPTopology.parseCIDR(CIDR)
+        if not properties:
+            properties = "CIDR={}|".format(CIDR)
+        with self.__lock:
+            self.__ranges[entity_type].setdefault(prefix, {})[network] = {'id': entity_id,
+                                                                          'name': name,
+                                                                          'type': entity_type,
+                                                                          'properties': properties}
+        return True
+
+    # <summary>
+    # Returns the most specific block containing the IP, or an entity with ID 0 if there is none (same as getIPRangedByIP)
+    # </summary>
+    # <param name="IP" type="string">
+    # The IP contained within the block
+    # </param>
+    def getBlock(self, IP):
+        return self.__find("IP4Block", IP)
+
+    # <summary>
+    # Returns the network containing the IP, or an entity with ID 0 if there is none (same as getIPRangedByIP)
+    # </summary>
+    # <param name="IP" type="string">
+    # The IP contained within the network
+    # </param>
+    def getNetwork(self, IP):
+        return self.__find("IP4Network", IP)
+
+    # <summary>
+    # Returns the number of indexed entities of the provided type
+    # </summary>
+    # <param name="entity_type" type="string">
+    # Either "IP4Block" or "IP4Network"
+    # </param>
+    def count(self, entity_type):
+        with self.__lock:
+            return sum(len(ranges) for ranges in self.__ranges[entity_type].values())
+
+    # <summary>
+    # Longest prefix match of the IP against the ranges of one entity type
+    # </summary>
+    def __find(self, entity_type, IP):
+        address = IPTopology.toInteger(IP)
+        ranges = self.__ranges[entity_type]
+        with self.__lock:
+            prefixes = sorted(ranges, reverse=True)
+            for prefix in prefixes:
+                entity = ranges[prefix].get(address & IPTopology.mask(prefix))
+                if entity:
+                    return entity
+        return {'id': 0, 'name': None, 'type': None, 'properties': None}
+
+    # <summary>
+    # Converts a dotted quad IPv4 address to an int
+    # </summary>
+    # <param name="IP" type="string">
+    # The IP to convert
+    # </param>
+    @staticmethod
+    def toInteger(IP):
+        return struct.unpack("!I", socket.inet_aton(IP))[0]
+
+    # <summary>
+    # Converts an int to a dotted quad IPv4 address
+    # </summary>
+    # <param name="address" type="int">
+    # The address to convert
+    # </param>
+    @staticmethod
+    def toString(address):
+        return socket.inet_ntoa(struct.pack("!I", address))
+
+    # <summary>
+    # Returns the netmask of a prefix length as an int
+    # </summary>
+    # <param name="prefix" type="int">
+    # The prefix length (0-32)
+    # </param>
+    @staticmethod
+    def mask(prefix):
+        return (0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF
+
+    # <summary>
+    # Splits a CIDR into its network address (as an int, with host bits cleared) and prefix length
+    # </summary>
+    # <param name="CIDR" type="string">
+    # The CIDR to parse (e.g. 10.0.0.0/24)
+    # </param>
+    @staticmethod
+    def parseCIDR(CIDR):
+        network, prefix = CIDR.split('/')
+        prefix = int(prefix)
+        return [IPTopology.toInteger(network) & IPTopology.mask(prefix), prefix]
+
+    # <summary>
+    # Parses a BAM properties string (e.g. "CIDR=10.0.0.0/24|allowDuplicateHost=disable|") into a dict
+    # </summary>
+    # <param name="properties" type="string">
+    # The properties string of an entity
+    # </param>
+    @staticmethod
+    def parseProperties(properties):
+        parsed = {}
+        for pair in (properties or "").split('|'):
+            if '=' in pair:
+                key, value = pair.split('=', 1)
+                parsed[key] = value
+        return parsed
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
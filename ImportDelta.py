@@ -0,0 +1,117 @@
+import hashlib
+import logging
+import os
+
+# <summary>
+# Content hashes of the devices imported by the last successful run of a csv.
+# A device whose name, addresses, type and subtype hash the same as last time is left out of the upload, so a regenerated csv
+# that barely changed only sends its new and changed devices to the BAM service
+# </summary>
+class ImportDelta:
+
+    # <summary>
+    # Constructor for ImportDelta. Loads the hashes saved for the same server and configuration, if any
+    # </summary>
+    # <param name="path" type="string">
+    # The path of the hash file
+    # </param>
+    # <param name="server" type="string">
+    # Address of the BAM server imported to
+    # </param>
+    # <param name="configuration" type="string">
+    # Name of the configuration imported to
+    # </param>
+    def __init__(self, path, server, configuration):
+        self.path = path
+        self.header = "# ImportDelta\t{0}\t{1}\n".format(server, configuration)
+        self.logger = logging.getLogger(__name__)
+        # Device name -> hash saved by the last successful run
+        self.previous = {}
+        # Device name -> hash of every device seen by this run
+        self.current = {}
+        self.unchanged = 0
+        if os.path.isfile(path):
+            self.__load()
+
+    # <summary>
+    # Yields the devices that are new or changed since the last successful run, and records the hash of every device
+    # </summary>
+    # <param name="devices" type="iterable">
+    # The devices of the csv, as built by App.populateDevices or App.streamDevices
+    # </param>
+    def changed(self, devices):
+        for device in devices:
+            name = ImportDelta.encode(device.name())
+            digest = ImportDelta.hashOf(device)
+            self.current[name] = digest
+            if self.previous.get(name) == digest:
+                self.unchanged += 1
+                continue
+            yield device
+        self.logger.debug("{0} of {1} devices are unchanged since the last import".format(self.unchanged, len(self.current)))
+
+    # <summary>
+    # Saves the hashes of this run. New and changed devices are only saved once the journal shows them added, the others keep
+    # their previous hash so they are sent again next time. A changed device that was skipped because it already existed on the server
+    # is not added, so its changes were not applied and it keeps its previous hash. A device skipped without a previous hash is saved,
+    # so that adopting delta imports on a server an earlier import already filled does not send every device on every run.
+    # Devices no longer in the csv are dropped
+    # </summary>
+    # <param name="journal" type="ImportJournal">
+    # The journal of this run
+    # </param>
+    def save(self, journal):
+        hashes = {}
+        for name, digest in self.current.items():
+            if digest == self.previous.get(name) or (journal.get("Device", name) and (not name in self.previous or not journal.get("SkippedDevice", name))):
+                hashes[name] = digest
+            elif name in self.previous:
+                hashes[name] = self.previous[name]
+        # Write a new file and rename it over the old one, so a run killed while saving leaves the previous hashes intact
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as hash_file:
+            hash_file.write(self.header)
+            for name in sorted(hashes):
+                hash_file.write("{0}\t{1}\n".format(hashes[name], name))
+            hash_file.flush()
+            os.fsync(hash_file.fileno())
+        os.rename(temporary, self.path)
+        self.logger.debug("Saved the hashes of {0} devices to {1}".format(len(hashes), self.path))
+
+    # <summary>
+    # Loads the hashes of the last successful run. Hashes saved for another server or configuration are ignored
+    # </summary>
+    def __load(self):
+        with open(self.path) as hash_file:
+            header = hash_file.readline()
+            if not header == self.header:
+                self.logger.warning("{0} was saved for another server or configuration ({1}), every device will be uploaded".format(self.path, header.strip()))
+                return
+            for line in hash_file:
+                fields = line.rstrip("\n").split("\t", 1)
+                if len(fields) == 2:
+                    self.previous[fields[1]] = fields[0]
+
+    # <summary>
+    # Returns the content hash of a device: its name, sorted addresses, type and subtype
+    # </summary>
+    # <param name="device" type="Device">
+    # The device to hash
+    # </param>
+    @staticmethod
+    def hashOf(device):
+        fields = [device.name(), ",".join(sorted(address.IP() for address in device.addresses())),
+                  device.device_type().name(), device.device_subtype().name()]
+        return hashlib.sha1("\t".join(ImportDelta.encode(field) for field in fields)).hexdigest()
+
+    # <summary>
+    # Returns a value as a utf-8 byte string
+    # </summary>
+    @staticmethod
+    def encode(value):
+        if isinstance(value, unicode):
+            return value.encode("utf-8")
+        return str(value)
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
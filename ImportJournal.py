@@ -0,0 +1,143 @@
+import logging
+import os
+import re
+import threading
+
+# <summary>
+# Write-ahead journal of the devices, blocks and networks an import has committed to the BAM service.
+# Every entry is appended and flushed as soon as BAMClient knows the entity exists on the server, so a run that dies part way
+# can be resumed (see App --resume) and skip the committed entities without asking the server about them again
+# </summary>
+class ImportJournal:
+
+    # Number of entries between two fsyncs. Entries are flushed to the OS right away, which survives the process dying
+    fsync_interval = 1000
+
+    # <summary>
+    # Constructor for ImportJournal. Starts a new journal unless resuming one written for the same server and configuration
+    # </summary>
+    # <param name="path" type="string">
+    # The path of the journal file
+    # </param>
+    # <param name="server" type="string">
+    # Address of the BAM server imported to
+    # </param>
+    # <param name="configuration" type="string">
+    # Name of the configuration imported to
+    # </param>
+    # <param name="callback" type="function" args="string, Boolean">
+    # Callback function for error reporting
+    # </param>
+    # <param name="resume" type="boolean">
+    # Whether to load the entries of an existing journal rather than start over (default = False)
+    # </param>
+    def __init__(self, path, server, configuration, callback, resume=False):
+        self.path = path
+        self.header = "# ImportJournal\t{0}\t{1}\n".format(server, configuration)
+        self.callback = callback
+        self.logger = logging.getLogger(__name__)
+        # (kind, key) -> ID of every committed entity
+        self.entries = {}
+        self.__lock = threading.Lock()
+        self.__unsynced = 0
+
+        if resume and os.path.isfile(path):
+            self.__load()
+            self.__file = open(path, "a")
+        else:
+            if resume:
+                self.logger.warning("No journal found at {}, starting from scratch".format(path))
+            self.__file = open(path, "w")
+            self.__file.write(self.header)
+            self.__file.flush()
+
+    # <summary>
+    # Returns the ID of a committed entity, or None
+    # </summary>
+    # <param name="kind" type="string">
+    # The kind of entity ("Device", "SkippedDevice", "IP4Block" or "IP4Network")
+    # </param>
+    # <param name="key" type="string">
+    # The device name or CIDR
+    # </param>
+    def get(self, kind, key):
+        return self.entries.get((kind, key))
+
+    # <summary>
+    # Records a committed entity
+    # </summary>
+    # <param name="kind" type="string">
+    # The kind of entity ("Device", "SkippedDevice", "IP4Block" or "IP4Network")
+    # </param>
+    # <param name="key" type="string">
+    # The device name or CIDR
+    # </param>
+    # <param name="entity_id" type="int">
+    # The ID of the entity on the BAM service
+    # </param>
+    def record(self, kind, key, entity_id):
+        with self.__lock:
+            if (kind, key) in self.entries:
+                return
+            self.entries[(kind, key)] = entity_id
+            self.__file.write("{0}\t{1}\t{2}\n".format(kind, ImportJournal.escape(key), entity_id))
+            self.__file.flush()
+            self.__unsynced += 1
+            if self.__unsynced >= ImportJournal.fsync_interval:
+                os.fsync(self.__file.fileno())
+                self.__unsynced = 0
+
+    # <summary>
+    # Syncs and closes the journal
+    # </summary>
+    def close(self):
+        with self.__lock:
+            if self.__file.closed:
+                return
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+            self.__file.close()
+
+    # <summary>
+    # Loads the entries of an existing journal. A torn last line, left by a process killed mid write, is ignored
+    # </summary>
+    def __load(self):
+        with open(self.path) as journal:
+            header = journal.readline()
+            if not header == self.header:
+                self.callback("Journal {0} was written for another server or configuration ({1})".format(self.path, header.strip()), True)
+                return
+            for line in journal:
+                fields = line.rstrip("\n").split("\t")
+                if not line.endswith("\n") or not len(fields) == 3 or not fields[2].isdigit():
+                    self.logger.warning("Ignoring incomplete journal entry '{}'".format(line.strip()))
+                    continue
+                self.entries[(fields[0], ImportJournal.unescape(fields[1]))] = long(fields[2])
+        self.logger.debug("Resuming with {0} committed entities from {1}".format(len(self.entries), self.path))
+        # Terminate a torn last line so new entries start on a line of their own
+        with open(self.path, "rb+") as journal:
+            journal.seek(0, os.SEEK_END)
+            size = journal.tell()
+            if size:
+                journal.seek(size - 1)
+                if not journal.read(1) == "\n":
+                    journal.write("\n")
+
+    # <summary>
+    # Escapes the characters that delimit journal entries
+    # </summary>
+    @staticmethod
+    def escape(key):
+        if isinstance(key, unicode):
+            key = key.encode("utf-8")
+        return str(key).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+    # <summary>
+    # Reverses escape
+    # </summary>
+    @staticmethod
+    def unescape(key):
+        return re.sub(r'\\(.)', lambda match: {"n": "\n", "t": "\t"}.get(match.group(1), match.group(1)), key)
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
@@ -0,0 +1,294 @@
+from AddressValidator import AddressValidator
+from BAMClient import BAMClient
+from CSVReader import CSVReader
+from DeviceType import DeviceType
+from DeviceSubtype import DeviceSubtype
+from IPTopology import IPTopology
+import collections
+from itertools import izip
+import logging
+
+# <summary>
+# Plans the infrastructure an import needs before any device is uploaded.
+# Reads the whole csv once to collect the unique device types, subtypes and /24 networks, then creates them in dependency order
+# (types -> subtypes, blocks -> networks) so that uploading a device only has to refer to IDs that already exist.
+# Networks without a block share one supernet block per group of neighbouring networks rather than getting a /24 block each
+# </summary>
+class ImportPlanner:
+
+    # <summary>
+    # Constructor for ImportPlanner
+    # </summary>
+    # <param name="bam_client" type="BAMClient">
+    # The client to create the infrastructure with, its configuration must be set
+    # </param>
+    # <param name="callback" type="function" args="string, Boolean">
+    # Callback function for error reporting
+    # </param>
+    # <param name="validator" type="AddressValidator">
+    # Optional, the validator used for the IP column (default = AddressValidator())
+    # </param>
+    # <param name="block_prefix" type="int">
+    # The prefix length of the largest block created to hold networks, 24 creates a block per /24 network (default = 16, see supernets)
+    # </param>
+    def __init__(self, bam_client, callback, validator=None, block_prefix=16):
+        self.bam_client = bam_client
+        self.callback = callback
+        self.validator = validator or AddressValidator()
+        self.block_prefix = block_prefix
+        self.logger = logging.getLogger(__name__)
+        # Device type name -> OrderedDict of its subtype names, in order of first appearance
+        self.device_types = collections.OrderedDict()
+        # Unique /24 networks (and so blocks) holding the valid addresses, sorted
+        self.networks = []
+        # Network CIDR -> ID of the block holding it, and CIDR -> ID of the networks once created
+        self.blocks = {}
+        self.network_ids = {}
+        # The device type tree of the server, as returned by BAMClient.getDeviceTypeTree, once snapshot has been called
+        self.type_tree = None
+        # Device name -> index of its last row, for the devices whose rows are not adjacent (see App.streamDevices)
+        self.last_rows = {}
+
+    # <summary>
+    # Collects the device types, subtypes and networks needed by every row of the csv. Rows with invalid addresses add no networks.
+    # Also notes the last row of every device whose rows are not adjacent, so streaming can merge them. Returns the planner
+    # </summary>
+    # <param name="csv" type="CSVReader">
+    # The csv to plan, opened with split_columns=['IP']
+    # </param>
+    def plan(self, csv):
+        networks = set()
+        last_rows = {}
+        scattered = set()
+        previous = None
+        for chunk in csv.streamChunks():
+            for device_type, device_subtype in CSVReader.distinct(chunk, ['Device Type', 'Device Subtype']):
+                self.device_types.setdefault(device_type, collections.OrderedDict())[device_subtype] = True
+            for idx, name in izip(chunk.index, CSVReader.values(chunk['Name'])):
+                if name != previous and name in last_rows:
+                    scattered.add(name)
+                last_rows[name] = idx
+                previous = name
+            row_errors, row_subnets = self.validator.validateColumn(chunk['IP'])
+            for subnets in row_subnets:
+                if subnets:
+                    networks.update(subnets)
+        self.networks = sorted(networks, key=lambda CIDR: IPTopology.toInteger(CIDR.split('/')[0]))
+        self.last_rows = dict((name, last_rows[name]) for name in scattered)
+        self.logger.debug("Planned {0} device types, {1} device subtypes and {2} networks".format(
+            len(self.device_types), sum(len(subtypes) for subtypes in self.device_types.values()), len(self.networks)))
+        return self
+
+    # <summary>
+    # Creates the planned device types and their subtypes that are missing on the BAM service, each exactly once.
+    # The existing types and subtypes are fetched in one pass first (see BAMClient.getDeviceTypeTree), so nothing that already exists is sent again.
+    # If the ID cache of the client already holds every planned type and subtype, nothing is fetched at all
+    # Returns a dict of DeviceType objects by name, holding their DeviceSubtype objects (see App.id_list)
+    # </summary>
+    def createDeviceTypes(self):
+        existing = self.__cached_type_tree()
+        if existing is None:
+            existing = self.bam_client.getDeviceTypeTree(self.device_types.keys())
+        id_list = {}
+        for type_name, subtype_names in self.device_types.items():
+            if type_name in existing:
+                dev = [existing[type_name][0], type_name]
+                subtype_ids = existing[type_name][1]
+            else:
+                dev = self.bam_client.addDeviceType(type_name)
+                subtype_ids = {}
+            if not dev:
+                self.callback("Device type \'{0}\' failed to be added".format(type_name), True)
+                continue
+            device_type = DeviceType(dev[1], dev[0])
+            self.logger.debug("Device type \'{0}\' has ID {1}".format(dev[1], dev[0]))
+            for subtype_name in subtype_names:
+                if subtype_name in subtype_ids:
+                    subdev = [subtype_ids[subtype_name], subtype_name]
+                else:
+                    subdev = self.bam_client.addDeviceSubtype(dev[0], subtype_name)
+                if not subdev:
+                    self.callback("Device subtype \'{0}\' failed to be added to \'{1}\'".format(subtype_name, type_name), True)
+                    continue
+                device_type.add(DeviceSubtype(subdev[1], subdev[0]))
+                self.logger.debug("Device subtype \'{0}\' of \'{1}\' has ID {2}".format(subdev[1], dev[1], subdev[0]))
+            id_list[dev[1]] = device_type
+        return id_list
+
+    # <summary>
+    # Loads the blocks, networks, devices and device types of the configuration in bulk, without writing anything.
+    # Afterwards plannedDeviceTypes and diff work from the snapshot alone. Returns the planner
+    # </summary>
+    def snapshot(self):
+        self.bam_client.prefetchTopology()
+        self.bam_client.prefetchDevices()
+        self.type_tree = self.bam_client.getDeviceTypeTree(self.device_types.keys())
+        return self
+
+    # <summary>
+    # Returns the planned device types in the shape of App.id_list, without creating anything.
+    # Types and subtypes missing from the snapshot get the ID 0
+    # </summary>
+    def plannedDeviceTypes(self):
+        id_list = {}
+        for type_name, subtype_names in self.device_types.items():
+            type_id, subtype_ids = self.type_tree.get(type_name, [0, {}])
+            device_type = DeviceType(type_name, type_id)
+            for subtype_name in subtype_names:
+                device_type.add(DeviceSubtype(subtype_name, subtype_ids.get(subtype_name, 0)))
+            id_list[type_name] = device_type
+        return id_list
+
+    # <summary>
+    # Computes what an import of the devices would create and skip, from the snapshot alone.
+    # Returns a dict with a {"create": [...], "skip": [...]} entry per kind of entity, plus the invalid rows
+    # </summary>
+    # <param name="devices" type="list">
+    # The devices to import, as built by App.populateDevices
+    # </param>
+    # <param name="error" type="list">
+    # The invalid records, as returned by App.populateDevices
+    # </param>
+    def diff(self, devices, error=None):
+        diff = collections.OrderedDict()
+        for kind in ["device_types", "device_subtypes", "blocks", "networks", "devices"]:
+            diff[kind] = collections.OrderedDict([("create", []), ("skip", [])])
+        for type_name, subtype_names in self.device_types.items():
+            type_id, subtype_ids = self.type_tree.get(type_name, [0, {}])
+            diff["device_types"]["skip" if type_id else "create"].append(type_name)
+            for subtype_name in subtype_names:
+                diff["device_subtypes"]["skip" if subtype_name in subtype_ids else "create"].append("{0}/{1}".format(type_name, subtype_name))
+
+        topology = self.bam_client.topology
+        networks = {}
+        for device in devices:
+            for address in device.addresses():
+                networks.setdefault(address.IP().rsplit('.', 1)[0] + '.0/24', address.IP())
+            diff["devices"]["skip" if self.bam_client.getDevice(device.name())['id'] else "create"].append(device.name())
+        missing = []
+        for CIDR in sorted(networks, key=lambda CIDR: IPTopology.toInteger(CIDR.split('/')[0])):
+            IP = networks[CIDR]
+            block = topology.getBlock(IP)
+            if block['id']:
+                block_CIDR = IPTopology.parseProperties(block['properties']).get('CIDR', CIDR)
+                if not block_CIDR in diff["blocks"]["skip"]:
+                    diff["blocks"]["skip"].append(block_CIDR)
+            else:
+                missing.append(CIDR)
+            diff["networks"]["skip" if topology.getNetwork(IP)['id'] else "create"].append(CIDR)
+        diff["blocks"]["create"] = ImportPlanner.supernets(missing, self.block_prefix).keys()
+        diff["invalid_rows"] = sorted(int(idx) for record, idx in error or [])
+        return diff
+
+    # <summary>
+    # Groups networks under the blocks to create for them: networks in the same /prefix supernet share one block, the smallest CIDR
+    # covering all of them (e.g. 10.0.0.0/24 and 10.0.2.0/24 share 10.0.0.0/22 when prefix is 16 or less).
+    # Returns an OrderedDict of block CIDR -> list of network CIDRs, in address order
+    # </summary>
+    # <param name="networks" type="list">
+    # The CIDRs of the networks
+    # </param>
+    # <param name="prefix" type="int">
+    # The prefix length of the largest block to create
+    # </param>
+    @staticmethod
+    def supernets(networks, prefix):
+        groups = collections.OrderedDict()
+        for CIDR in sorted(networks, key=lambda CIDR: IPTopology.parseCIDR(CIDR)):
+            network, length = IPTopology.parseCIDR(CIDR)
+            groups.setdefault(network & IPTopology.mask(min(prefix, length)), []).append(CIDR)
+        blocks = collections.OrderedDict()
+        for members in groups.values():
+            ranges = [IPTopology.parseCIDR(CIDR) for CIDR in members]
+            first = min(network for network, length in ranges)
+            last = max(network + 2 ** (32 - length) - 1 for network, length in ranges)
+            # The longest prefix shared by the first and last address covers every network in between
+            length = 32 - (first ^ last).bit_length()
+            blocks["{0}/{1}".format(IPTopology.toString(first & IPTopology.mask(length)), length)] = members
+        return blocks
+
+    # <summary>
+    # Returns the lines of a human readable summary of a diff
+    # </summary>
+    # <param name="diff" type="dict">
+    # The diff, as returned by diff
+    # </param>
+    @staticmethod
+    def summary(diff):
+        lines = []
+        for kind, entities in diff.items():
+            if kind == "invalid_rows":
+                continue
+            lines.append("{0}: {1} to create, {2} already present".format(kind.replace('_', ' ').capitalize(), len(entities["create"]), len(entities["skip"])))
+        lines.append("Invalid rows: {}".format(len(diff["invalid_rows"])))
+        return lines
+
+    # <summary>
+    # Returns the planned device types and subtypes in the shape of BAMClient.getDeviceTypeTree if the client's ID cache holds all of them, otherwise None
+    # </summary>
+    def __cached_type_tree(self):
+        tree = {}
+        for type_name, subtype_names in self.device_types.items():
+            type_id = self.bam_client.cachedDeviceType(type_name)
+            if not type_id:
+                return None
+            subtypes = {}
+            for subtype_name in subtype_names:
+                subtype_id = self.bam_client.cachedDeviceSubtype(type_id, subtype_name)
+                if not subtype_id:
+                    return None
+                subtypes[subtype_name] = subtype_id
+            tree[type_name] = [type_id, subtypes]
+        return tree
+
+    # <summary>
+    # Creates the planned blocks, then the planned networks inside them. Blocks and networks that already exist are reused,
+    # the networks without a block are grouped under as few supernet blocks as block_prefix allows (see supernets).
+    # Failures are reported through the callback and leave the CIDR out of blocks/network_ids
+    # </summary>
+    def createNetworks(self):
+        missing = []
+        for CIDR in self.networks:
+            try:
+                block_id = BAMClient.entityId(self.bam_client.getBlock(CIDR.split('/')[0]))
+            except Exception, e:
+                self.callback("Block {0} failed to be added: {1}".format(CIDR, e), False)
+                continue
+            if block_id:
+                self.blocks[CIDR] = block_id
+            else:
+                missing.append(CIDR)
+        blocks = ImportPlanner.supernets(missing, self.block_prefix)
+        for block_CIDR, networks in blocks.items():
+            self.__create_block(block_CIDR, networks)
+        self.logger.debug("Created {0} blocks for {1} networks".format(len(blocks), len(missing)))
+        for CIDR in self.networks:
+            if not CIDR in self.blocks:
+                continue
+            try:
+                self.network_ids[CIDR] = BAMClient.entityId(self.bam_client.addNetwork(CIDR.split('/')[0], self.blocks[CIDR]))
+            except Exception, e:
+                self.callback("Network {0} failed to be added: {1}".format(CIDR, e), False)
+        self.logger.debug("{0} of {1} planned networks are in place".format(len(self.network_ids), len(self.networks)))
+        return self.network_ids
+
+    # <summary>
+    # Creates a block for networks and records it as their block. If a supernet block fails (e.g. because it overlaps a block
+    # created outside of the import), each network gets a block of its own instead
+    # </summary>
+    def __create_block(self, block_CIDR, networks):
+        try:
+            block_id = BAMClient.entityId(self.bam_client.addBlockByCIDR(block_CIDR, [CIDR.split('/')[0] for CIDR in networks]))
+        except Exception, e:
+            if len(networks) == 1:
+                self.callback("Block {0} failed to be added: {1}".format(block_CIDR, e), False)
+                return
+            self.logger.debug("Block {0} failed to be added ({1}), adding a block per network".format(block_CIDR, e))
+            for CIDR in networks:
+                self.__create_block(CIDR, [CIDR])
+            return
+        for CIDR in networks:
+            self.blocks[CIDR] = block_id
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
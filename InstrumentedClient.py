@@ -0,0 +1,53 @@
+from AsyncSOAPClient import AsyncSOAPClient
+import time
+
+# <summary>
+# Wraps the service proxy of a BAMClient (the suds service or an AsyncSOAPClient) and records every API call in an APIStatistics.
+# Blocking calls are timed from call to return. Requests queued on an AsyncSOAPClient are timed from request to callback,
+# so their latency includes the time spent waiting for a free connection
+# </summary>
+class InstrumentedClient:
+
+    # <summary>
+    # Constructor for InstrumentedClient
+    # </summary>
+    # <param name="client" type="object">
+    # The service proxy to wrap
+    # </param>
+    # <param name="statistics" type="APIStatistics">
+    # Where the calls are recorded
+    # </param>
+    def __init__(self, client, statistics):
+        self.client = client
+        self.statistics = statistics
+
+    # <summary>
+    # Queues a request on the wrapped AsyncSOAPClient, recording it once its callback runs (see AsyncSOAPClient.request)
+    # </summary>
+    def request(self, method, args, callback):
+        start = time.time()
+        def recorded(result, error):
+            self.statistics.record(method, time.time() - start, error, args)
+            callback(result, error)
+        self.client.request(method, args, recorded)
+
+    # <summary>
+    # Returns a timed version of the API methods, everything else is passed through to the wrapped client
+    # </summary>
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not name in AsyncSOAPClient.parameters:
+            return attribute
+        def timed(*args):
+            start = time.time()
+            try:
+                result = attribute(*args)
+            except Exception, e:
+                self.statistics.record(name, time.time() - start, e, args)
+                raise
+            self.statistics.record(name, time.time() - start, None, args)
+            return result
+        return timed
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
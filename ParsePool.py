@@ -0,0 +1,77 @@
+import logging
+import multiprocessing
+
+# <summary>
+# Runs a function over row ranges of an in memory csv in a pool of worker processes, so parsing uses more than one core.
+# The workers are forked after the function is set, so they inherit it along with everything it refers to (e.g. the normalized
+# rows of a CSVReader): only the row ranges are sent to them, and only the results they return are pickled back
+# </summary>
+class ParsePool:
+
+    # The function the workers run, set for the duration of map
+    work = None
+
+    # <summary>
+    # Constructor for ParsePool
+    # </summary>
+    # <param name="processes" type="int">
+    # The number of worker processes
+    # </param>
+    def __init__(self, processes):
+        self.processes = processes
+        self.logger = logging.getLogger(__name__)
+
+    # <summary>
+    # Calls function(start, stop) for consecutive row ranges covering rows 0 to rows, one range per process,
+    # and returns the results in the order of the ranges
+    # </summary>
+    # <param name="function" type="function" args="int, int">
+    # Processes the rows start to stop (excluded), its result must be picklable
+    # </param>
+    # <param name="rows" type="int">
+    # The number of rows
+    # </param>
+    def map(self, function, rows):
+        shards = ParsePool.shards(rows, self.processes)
+        if len(shards) < 2:
+            return [function(start, stop) for start, stop in shards]
+        # As a staticmethod, so that reading it from the class does not make it an unbound method
+        ParsePool.work = staticmethod(function)
+        pool = None
+        try:
+            pool = multiprocessing.Pool(len(shards))
+            results = pool.map(run_shard, shards, chunksize=1)
+        finally:
+            ParsePool.work = None
+            if pool:
+                pool.terminate()
+                pool.join()
+        self.logger.debug("Parsed {0} rows in {1} processes".format(rows, len(shards)))
+        return results
+
+    # <summary>
+    # Splits rows into at most count consecutive (start, stop) ranges of nearly equal size
+    # </summary>
+    # <param name="rows" type="int">
+    # The number of rows
+    # </param>
+    # <param name="count" type="int">
+    # The number of ranges
+    # </param>
+    @staticmethod
+    def shards(rows, count):
+        count = max(1, min(count, rows))
+        bounds = [rows * idx // count for idx in range(count + 1)]
+        return [(bounds[idx], bounds[idx + 1]) for idx in range(count) if bounds[idx] < bounds[idx + 1]]
+
+# <summary>
+# Entry point of the workers. Module level, so that multiprocessing can pickle it by name
+# </summary>
+# <param name="shard" type="tuple">
+# The (start, stop) range of rows to process
+# </param>
+def run_shard(shard):
+    return ParsePool.work(*shard)
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
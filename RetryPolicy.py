@@ -0,0 +1,85 @@
+import httplib
+import random
+import re
+import socket
+import urllib2
+
+# <summary>
+# Decides which failed BAM API calls are worth retrying and how long to wait before each retry.
+# Only transient failures (timeouts, dropped connections, an overloaded service) are retried, with exponential backoff and full jitter
+# so that many sessions backing off at once do not retry in lockstep
+# </summary>
+class RetryPolicy:
+
+    # Fragments of the messages of failures that are expected to go away on their own
+    transient_markers = ["timed out", "timeout", "temporarily unavailable", "service unavailable", "too many", "busy",
+                         "connection reset", "connection refused", "connection closed", "broken pipe"]
+    # HTTP status codes of a gateway or service that is overloaded or restarting
+    transient_status_codes = [502, 503, 504]
+    # A status code in a message, e.g. "HTTP Error 503" (urllib2) or "(HTTP 503)" (AsyncSOAPClient), but not digits of an ID or CIDR
+    status_pattern = re.compile(r"\b(?:http|status)\b[^0-9]{0,8}(?:1\.[01]\s+)?(\d{3})\b")
+
+    # <summary>
+    # Constructor for RetryPolicy
+    # </summary>
+    # <param name="retries" type="int">
+    # The number of times a call is retried after its first attempt, 0 disables retrying (default = 3)
+    # </param>
+    # <param name="base_delay" type="float">
+    # The longest wait before the first retry, in seconds. It doubles with every further retry (default = 0.5)
+    # </param>
+    # <param name="max_delay" type="float">
+    # The longest wait before any retry, in seconds (default = 10)
+    # </param>
+    def __init__(self, retries=3, base_delay=0.5, max_delay=10.0):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.__random = random.Random()
+
+    # <summary>
+    # Returns True if a call that failed with the error on its attempt-th try (starting at 1) should be tried again
+    # </summary>
+    # <param name="error" type="Exception">
+    # The error the call failed with
+    # </param>
+    # <param name="attempt" type="int">
+    # The number of attempts made so far
+    # </param>
+    def shouldRetry(self, error, attempt):
+        return attempt <= self.retries and RetryPolicy.isTransient(error)
+
+    # <summary>
+    # Returns the number of seconds to wait before the next attempt, drawn between 0 and the backoff of the attempt
+    # </summary>
+    # <param name="attempt" type="int">
+    # The number of attempts made so far
+    # </param>
+    def delay(self, attempt):
+        return self.__random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    # <summary>
+    # Returns True if the error is a transient failure: a network error, an overloaded gateway or service (HTTP 502, 503 or 504),
+    # or a fault saying the service is overloaded or timed out. Faults about the request itself (duplicates, missing entities, bad input) are not transient
+    # </summary>
+    # <param name="error" type="Exception">
+    # The error raised by the call
+    # </param>
+    @staticmethod
+    def isTransient(error):
+        if isinstance(error, (socket.error, urllib2.URLError, httplib.HTTPException)):
+            return True
+        # suds raises a TransportError carrying the status code as httpcode
+        if getattr(error, "httpcode", None) in RetryPolicy.transient_status_codes:
+            return True
+        message = str(error).lower()
+        for code in RetryPolicy.status_pattern.findall(message):
+            if int(code) in RetryPolicy.transient_status_codes:
+                return True
+        for marker in RetryPolicy.transient_markers:
+            if marker in message:
+                return True
+        return False
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
@@ -0,0 +1,154 @@
+from AsyncSOAPClient import AsyncSOAPClient
+import collections
+import logging
+import time
+
+# <summary>
+# Wraps the service proxy of a BAMClient (the suds service or an AsyncSOAPClient) so that API calls failing with transient errors are
+# retried after a backoff (see RetryPolicy), and so that no more calls are in progress at once than an AIMDLimiter allows.
+# Requests queued on an AsyncSOAPClient are held back while the limit is reached, and their retries wait in a timer list run by poll
+# </summary>
+class RetryingClient:
+
+    # <summary>
+    # Constructor for RetryingClient
+    # </summary>
+    # <param name="client" type="object">
+    # The service proxy to wrap
+    # </param>
+    # <param name="policy" type="RetryPolicy">
+    # Optional, decides which failures are retried and when, None never retries
+    # </param>
+    # <param name="limiter" type="AIMDLimiter">
+    # Optional, limits the calls in progress at once, None does not limit them
+    # </param>
+    def __init__(self, client, policy=None, limiter=None):
+        self.client = client
+        self.policy = policy
+        self.limiter = limiter
+        self.logger = logging.getLogger(__name__)
+        # Number of attempts that failed transiently and were retried
+        self.retried = 0
+        self.in_flight = 0
+        # Requests held back by the limiter, [method, args, callback, attempt]
+        self.__waiting = collections.deque()
+        # Requests waiting for their retry, [due time, method, args, callback, attempt]
+        self.__delayed = []
+
+    # <summary>
+    # Queues a request on the wrapped AsyncSOAPClient (see AsyncSOAPClient.request). callback only sees the outcome of the last attempt
+    # </summary>
+    def request(self, method, args, callback):
+        self.__waiting.append([method, args, callback, 1])
+        self.__dispatch()
+
+    # <summary>
+    # Returns the number of requests that are held back, waiting for a retry, queued or on the wire
+    # </summary>
+    def pending(self):
+        return len(self.__waiting) + len(self.__delayed) + self.client.pending()
+
+    # <summary>
+    # Runs the event loop of the wrapped client once, after sending the retries that are due
+    # </summary>
+    # <param name="timeout" type="float">
+    # How long to wait for network activity, in seconds
+    # </param>
+    def poll(self, timeout=0.05):
+        now = time.time()
+        due = [retry for retry in self.__delayed if retry[0] <= now]
+        if due:
+            self.__delayed = [retry for retry in self.__delayed if retry[0] > now]
+            self.__waiting.extend(retry[1:] for retry in sorted(due, key=lambda retry: retry[0]))
+            self.__dispatch()
+        if self.__delayed:
+            timeout = max(0, min(timeout, min(retry[0] for retry in self.__delayed) - now))
+        if self.client.pending():
+            self.client.poll(timeout)
+        elif self.__delayed:
+            time.sleep(timeout)
+
+    # <summary>
+    # Runs the event loop until every request has been answered
+    # </summary>
+    def run(self):
+        while self.pending():
+            self.poll()
+
+    # <summary>
+    # Closes the wrapped client. Requests held back or waiting for a retry are dropped
+    # </summary>
+    def close(self):
+        self.__waiting.clear()
+        self.__delayed = []
+        self.in_flight = 0
+        self.client.close()
+
+    # <summary>
+    # Returns a retrying version of the API methods, everything else is passed through to the wrapped client
+    # </summary>
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not name in AsyncSOAPClient.parameters:
+            return attribute
+        def retried(*args):
+            attempt = 1
+            while True:
+                if self.limiter:
+                    self.limiter.acquire()
+                start = time.time()
+                try:
+                    result = attribute(*args)
+                except Exception, e:
+                    transient = self.policy and self.policy.shouldRetry(e, attempt)
+                    if self.limiter:
+                        self.limiter.release(time.time() - start, transient, name)
+                    if not transient:
+                        raise
+                    self.__wait(name, e, attempt)
+                    attempt += 1
+                    continue
+                if self.limiter:
+                    self.limiter.release(time.time() - start, method=name)
+                return result
+        return retried
+
+    # <summary>
+    # Sends held back requests to the wrapped client while the limiter allows
+    # </summary>
+    def __dispatch(self):
+        while self.__waiting and (not self.limiter or self.in_flight < self.limiter.limit):
+            method, args, callback, attempt = self.__waiting.popleft()
+            self.in_flight += 1
+            self.client.request(method, args, self.__answered(method, args, callback, attempt, time.time()))
+
+    # <summary>
+    # Returns the callback of one attempt of a queued request. Transient failures are scheduled for a retry instead of being reported
+    # </summary>
+    def __answered(self, method, args, callback, attempt, start):
+        def answered(result, error):
+            self.in_flight -= 1
+            transient = error and self.policy and self.policy.shouldRetry(error, attempt)
+            if self.limiter:
+                self.limiter.completed(time.time() - start, bool(transient), method)
+            if transient:
+                self.retried += 1
+                delay = self.policy.delay(attempt)
+                self.logger.debug("{0} failed ({1}), retrying in {2:.2f}s".format(method, error, delay))
+                self.__delayed.append([time.time() + delay, method, args, callback, attempt + 1])
+            else:
+                callback(result, error)
+            self.__dispatch()
+        return answered
+
+    # <summary>
+    # Waits before retrying a blocking call
+    # </summary>
+    def __wait(self, method, error, attempt):
+        self.retried += 1
+        delay = self.policy.delay(attempt)
+        self.logger.debug("{0} failed ({1}), retrying in {2:.2f}s".format(method, error, delay))
+        time.sleep(delay)
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
@@ -0,0 +1,145 @@
+import asyncore
+import socket
+
+# <summary>
+# A single non-blocking keep-alive HTTP connection used by AsyncSOAPClient. Sends one SOAP request at a time and parses the
+# response (Content-Length or chunked) as it arrives, then hands it back to the client
+# </summary>
+class SOAPConnection(asyncore.dispatcher):
+
+    # <summary>
+    # Constructor for SOAPConnection. Starts connecting right away
+    # </summary>
+    # <param name="client" type="AsyncSOAPClient">
+    # The client that owns this connection and receives its responses
+    # </param>
+    # <param name="host" type="string">
+    # The host of the BAM service
+    # </param>
+    # <param name="port" type="int">
+    # The port of the BAM service
+    # </param>
+    # <param name="socket_map" type="dict">
+    # The asyncore socket map of the owning client
+    # </param>
+    def __init__(self, client, host, port, socket_map):
+        asyncore.dispatcher.__init__(self, map=socket_map)
+        self.client = client
+        self.host = host
+        self.port = port
+        self.request = None
+        self.__output = ''
+        self.__input = ''
+        self.__reset()
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.connect((host, port))
+
+    # <summary>
+    # Starts sending a request over this connection
+    # </summary>
+    # <param name="request" type="list">
+    # [method name, SOAP envelope, callback, attempts] as queued by AsyncSOAPClient
+    # </param>
+    # <param name="path" type="string">
+    # The path of the SOAP endpoint
+    # </param>
+    # <param name="cookie" type="string">
+    # The session cookie, if logged in
+    # </param>
+    def sendRequest(self, request, path, cookie):
+        self.request = request
+        body = request[1]
+        headers = ["POST {} HTTP/1.1".format(path),
+                   "Host: {0}:{1}".format(self.host, self.port),
+                   "Content-Type: text/xml; charset=utf-8",
+                   "SOAPAction: \"\"",
+                   "Content-Length: {}".format(len(body))]
+        if cookie:
+            headers.append("Cookie: {}".format(cookie))
+        self.__output = "\r\n".join(headers) + "\r\n\r\n" + body
+        self.__reset()
+
+    def writable(self):
+        return bool(self.__output) or not self.connected
+
+    def handle_connect(self):
+        pass
+
+    def handle_write(self):
+        sent = self.send(self.__output)
+        self.__output = self.__output[sent:]
+
+    def handle_read(self):
+        data = self.recv(65536)
+        if data:
+            self.__input += data
+            self.__parse()
+
+    def handle_close(self):
+        self.close()
+        if self.request and self.__length is None and self.__headers is not None and not self.__chunked:
+            # Response without a length, delimited by the server closing the connection
+            self.__complete(self.__input)
+        self.client.connectionClosed(self)
+
+    def handle_error(self):
+        error = socket.error(str(asyncore.compact_traceback()[2]))
+        self.close()
+        self.client.connectionClosed(self, error)
+
+    # <summary>
+    # Clears the parsing state for a new response
+    # </summary>
+    def __reset(self):
+        self.__input = ''
+        self.__status = None
+        self.__headers = None
+        self.__length = None
+        self.__chunked = False
+        self.__body = ''
+
+    # <summary>
+    # Parses as much of the response as has been received, completing the request once the body is whole
+    # </summary>
+    def __parse(self):
+        if self.__headers is None:
+            end = self.__input.find("\r\n\r\n")
+            if end < 0:
+                return
+            lines = self.__input[:end].split("\r\n")
+            self.__input = self.__input[end + 4:]
+            self.__status = int(lines[0].split(" ", 2)[1])
+            self.__headers = {}
+            for line in lines[1:]:
+                name, value = line.split(":", 1)
+                self.__headers.setdefault(name.strip().lower(), []).append(value.strip())
+            if "content-length" in self.__headers:
+                self.__length = int(self.__headers["content-length"][0])
+            self.__chunked = "chunked" in ",".join(self.__headers.get("transfer-encoding", [])).lower()
+
+        if self.__chunked:
+            while True:
+                end = self.__input.find("\r\n")
+                if end < 0:
+                    return
+                size = int(self.__input[:end].split(";")[0], 16)
+                if len(self.__input) < end + 2 + size + 2:
+                    return
+                self.__body += self.__input[end + 2:end + 2 + size]
+                self.__input = self.__input[end + 2 + size + 2:]
+                if size == 0:
+                    return self.__complete(self.__body)
+        elif self.__length is not None and len(self.__input) >= self.__length:
+            return self.__complete(self.__input[:self.__length])
+
+    # <summary>
+    # Hands a whole response back to the client
+    # </summary>
+    def __complete(self, body):
+        request, status, headers = self.request, self.__status, self.__headers
+        self.request = None
+        self.__reset()
+        self.client.responseReceived(self, request, status, headers, body)
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
@@ -0,0 +1,8 @@
+# <summary>
+# Raised for SOAP faults returned by the BAM service. The message is the fault string, like suds' WebFault
+# </summary>
+class SOAPFault(Exception):
+    pass
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
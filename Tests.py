@@ -1,10 +1,47 @@
 from __main__ import App
 from Address import Address
+from AddressValidator import AddressValidator
+from AIMDLimiter import AIMDLimiter
+from APIStatistics import APIStatistics
 from BAMClient import BAMClient
+from BAMStandIn import BAMStandIn
 from CSVReader import CSVReader
+from CSVWriter import CSVWriter
 from Device import Device
 from DeviceType import DeviceType
 from DeviceSubtype import DeviceSubtype
+from IDCache import IDCache
+from ImportDelta import ImportDelta
+from ImportJournal import ImportJournal
+from ImportPlanner import ImportPlanner
+from IPTopology import IPTopology
+from ParsePool import ParsePool
+from RetryPolicy import RetryPolicy
+from UploadPool import UploadPool
+from WSDLCache import WSDLCache
+import collections
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+# Smallest WSDL of the BAM API that suds accepts, only describes login
+minimal_wsdl = """<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://schemas.xmlsoap.org/wsdl/" xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/" xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:tns="http://api.proteus.bluecatnetworks.com" targetNamespace="http://api.proteus.bluecatnetworks.com">
+<types><xsd:schema targetNamespace="http://api.proteus.bluecatnetworks.com" elementFormDefault="unqualified">
+<xsd:element name="login"><xsd:complexType><xsd:sequence><xsd:element name="username" type="xsd:string"/><xsd:element name="password" type="xsd:string"/></xsd:sequence></xsd:complexType></xsd:element>
+<xsd:element name="loginResponse"><xsd:complexType><xsd:sequence/></xsd:complexType></xsd:element>
+</xsd:schema></types>
+<message name="login"><part name="parameters" element="tns:login"/></message>
+<message name="loginResponse"><part name="parameters" element="tns:loginResponse"/></message>
+<portType name="ProteusAPI"><operation name="login"><input message="tns:login"/><output message="tns:loginResponse"/></operation></portType>
+<binding name="ProteusAPIBinding" type="tns:ProteusAPI"><soap:binding style="document" transport="http://schemas.xmlsoap.org/soap/http"/>
+<operation name="login"><soap:operation soapAction=""/><input><soap:body use="literal"/></input><output><soap:body use="literal"/></output></operation></binding>
+<service name="ProteusAPI"><port name="ProteusAPIPort" binding="tns:ProteusAPIBinding"><soap:address location="http://localhost/Services/API"/></port></service>
+</definitions>"""
 
 def ignore_callback(msg, fail):
     return
@@ -29,10 +66,42 @@ def tests(address, username, password, configuration):
     print "[+] App Tests Succeeded!"
     Address_tests()
     print "[+] Address Tests Succeeded!"
+    AddressValidator_tests()
+    print "[+] AddressValidator Tests Succeeded!"
+    APIStatistics_tests()
+    print "[+] APIStatistics Tests Succeeded!"
     BAMClient_tests()
     print "[+] BAMClient Tests Succeeded!"
+    AsyncBAMClient_tests()
+    print "[+] AsyncBAMClient Tests Succeeded!"
+    BAMStandIn_tests()
+    print "[+] BAMStandIn Tests Succeeded!"
+    CSVReader_tests()
+    print "[+] CSVReader Tests Succeeded!"
+    CSVWriter_tests()
+    print "[+] CSVWriter Tests Succeeded!"
     Device_tests(BAMClient(address, username, password, ignore_callback), configuration)
     print "[+] Device Tests Succeeded!"
+    IDCache_tests()
+    print "[+] IDCache Tests Succeeded!"
+    ImportDelta_tests()
+    print "[+] ImportDelta Tests Succeeded!"
+    ImportJournal_tests()
+    print "[+] ImportJournal Tests Succeeded!"
+    ImportPlanner_tests()
+    print "[+] ImportPlanner Tests Succeeded!"
+    IPTopology_tests()
+    print "[+] IPTopology Tests Succeeded!"
+    Memory_tests()
+    print "[+] Memory Tests Succeeded!"
+    ParsePool_tests()
+    print "[+] ParsePool Tests Succeeded!"
+    RetryingClient_tests()
+    print "[+] RetryingClient Tests Succeeded!"
+    UploadPool_tests()
+    print "[+] UploadPool Tests Succeeded!"
+    WSDLCache_tests()
+    print "[+] WSDLCache Tests Succeeded!"
 
 def Address_tests():
     print "+-----------------------------+"
@@ -57,6 +126,76 @@ def Address_tests():
 
     print "Address Tests Succeeded!"
 
+def AddressValidator_tests():
+    print "+-----------------------------+"
+    print "|   AddressValidator Tests    |"
+    print "+-----------------------------+"
+    # Same cases as Address_tests, validated in bulk
+    valid_ip = ["255.255.255.255", "1.1.1.1", "30.25.255.10", "0.0.0.0"]
+    valid_subnets = ["255.255.255.0/24", "1.1.1.0/31", "30.25.255.0/28", "0.0.0.0/32"]
+    invalid_ip = ["0.0.0.256", "-1.1.1.1", "1.1.1.1.1", "1000.80.10.2", "", "1..1.1", "255.255.255.255.0"]
+    validator = AddressValidator()
+
+    IPs, networks, errors = validator.validate(valid_ip, valid_subnets)
+    assert(not errors.any())
+    assert(IPs.tolist() == [4294967295, 16843009, 505020170, 0])
+    print "[+] Successfully validated IPs and their subnets in bulk"
+    IPs, networks, errors = validator.validate(invalid_ip)
+    assert(errors.all())
+    print "[+] Successfully caught invalid IPs in bulk"
+    IPs, networks, errors = validator.validate(["1.1.1.1", "1.1.1.1"], ["1.1.2.0/24", "1.1.1.0/33"])
+    assert(errors.all())
+    print "[+] Successfully caught IPs outside of their subnet"
+
+    row_errors, row_subnets = validator.validateColumn([["10.0.0.1", "10.0.1.1"], ["10.0.0.1", "300.0.0.1"], []])
+    assert(row_errors.tolist() == [False, True, True])
+    assert(row_subnets == [["10.0.0.0/24", "10.0.1.0/24"], None, None])
+    print "[+] Successfully built per row error vector and subnets"
+
+def APIStatistics_tests():
+    print "+-----------------------------+"
+    print "|     APIStatistics Tests     |"
+    print "+-----------------------------+"
+    statistics = APIStatistics()
+    for seconds in [0.0005] * 90 + [0.03] * 9 + [3]:
+        statistics.record("getEntityByName", seconds)
+    statistics.setPhase("upload")
+    statistics.record("addDevice", 0.004, Exception("Duplicate of another item"))
+    report = statistics.report()
+    summary = report["methods"]["getEntityByName"]
+    assert(summary["calls"] == 100 and summary["errors"] == 0 and summary["max_ms"] == 3000)
+    assert(summary["p50_ms"] == 1 and summary["p95_ms"] == 50 and summary["p99_ms"] == 50)
+    assert(summary["histogram"] == {"<=1ms": 90, "<=50ms": 9, "<=5000ms": 1})
+    print "[+] Percentiles are estimated from the histogram"
+    assert(report["phases"]["start"].keys() == ["getEntityByName"] and report["phases"]["upload"]["addDevice"]["errors"] == 1)
+    assert(statistics.lines()[0].startswith("getEntityByName"))
+    print "[+] Calls are attributed to their phase"
+
+    stand_in = BAMStandIn(latency={"getSystemInfo": 0.05})
+    address = stand_in.start()
+    try:
+        statistics = APIStatistics(slow_call=0.05)
+        slow = []
+        statistics.logger.warning = slow.append
+        client = BAMClient(address, "admin", "admin", ignore_callback, backend="async", statistics=statistics)
+        client.setConfiguration("Test")
+        client.getInfo()
+        device_type = client.addDeviceType("Statistics_type")
+        device_subtype = client.addDeviceSubtype(device_type[0], "Statistics_subtype")
+        statistics.setPhase("upload")
+        client.addDevices([Device("Statistics_device{}".format(idx), [Address("10.6.0.{}".format(idx + 1), "10.6.0.0/24", ignore_callback)],
+                                  DeviceType("Statistics_type", device_type[0]), DeviceSubtype("Statistics_subtype", device_subtype[0], device_type[0]), ignore_callback) for idx in range(3)])
+        client.client.close()
+        report = statistics.report()
+        for method, count in stand_in.calls.items():
+            assert(report["methods"][method]["calls"] == count)
+        assert(report["phases"]["upload"]["addDevice"]["calls"] == 3)
+        print "[+] Blocking and pipelined calls are all recorded"
+        assert(len(slow) == 1 and slow[0].startswith("Slow call: getSystemInfo()"))
+        print "[+] Slow calls are logged"
+    finally:
+        stand_in.stop()
+
 def App_tests(address, username, password, configuration):
     print "+-----------------------------+"
     print "|          App Tests          |"
@@ -72,7 +211,7 @@ def App_tests(address, username, password, configuration):
               configuration=configuration,
               upload=False)
     app.bam_client = BAMClient(app.address, app.username, app.password, app.errorCallback)
-    csv = CSVReader(csv_path, app.errorCallback)
+    csv = CSVReader(csv_path, app.errorCallback, split_columns=['IP'])
 
     # Completely pointless test....
     assert(isinstance(app, App))
@@ -104,36 +243,248 @@ def BAMClient_tests():
     print "|       BAMClient Tests       |"
     print "+-----------------------------+"
 
+    assert(BAMClient.isDuplicateFault(Exception("Server raised fault: 'Duplicate of another item'")))
+    assert(not BAMClient.isDuplicateFault(Exception("Server raised fault: '10.0.0.0/24 overlaps with an existing block'")))
+    print "[+] Successfully recognized duplicate faults"
+    assert(BAMClient.isOverlapFault(Exception("Server raised fault: '10.0.0.0/24 overlaps with an existing block'")))
+    assert(not BAMClient.isOverlapFault(Exception("Server raised fault: 'Duplicate of another item'")))
+    print "[+] Successfully told overlap faults from duplicate faults"
+    assert(not BAMClient.isDuplicateFault(Exception("Server raised fault: 'Invalid parent'")))
+    print "[+] Successfully ignored other faults"
+
+def AsyncBAMClient_tests():
+    print "+-----------------------------+"
+    print "|    Async BAMClient Tests    |"
+    print "+-----------------------------+"
+    stand_in = BAMStandIn()
+    address = stand_in.start()
+    try:
+        client = BAMClient(address, "admin", "admin", ignore_callback, backend="async", concurrency=4)
+        assert(client.setConfiguration("Test"))
+        print "[+] Logged in and set configuration over the async backend"
+        device_type = client.addDeviceType("Async_test_type")
+        device_subtype = client.addDeviceSubtype(device_type[0], "Async_test_subtype")
+        assert(device_type[0] and device_subtype[0])
+        print "[+] Blocking calls work like the suds service"
+        devices = []
+        for idx in range(50):
+            # Two addresses per device, spread over 10 /24 networks
+            addresses = [Address("10.0.{0}.{1}".format(idx % 10, idx + 1), "10.0.{}.0/24".format(idx % 10), ignore_callback),
+                         Address("10.0.{0}.{1}".format(idx % 10, idx + 101), "10.0.{}.0/24".format(idx % 10), ignore_callback)]
+            devices.append(Device("Async_test_device{}".format(idx), addresses,
+                                  DeviceType("Async_test_type", device_type[0]),
+                                  DeviceSubtype("Async_test_subtype", device_subtype[0], device_type[0]), ignore_callback))
+        client.addDevices(devices)
+        assert(len(stand_in.entities("Device")) == 50)
+        print "[+] Pipelined device uploads"
+        assert(len(stand_in.entities("IP4Network")) == 10)
+        assert(len(stand_in.entities("IP4Block")) == 10)
+        assert(stand_in.calls["addIP4Network"] == 10)
+        print "[+] Each network and block was created once"
+        client.addDevices(devices[:5])
+        assert(stand_in.calls["addDevice"] == 50)
+        print "[+] Existing devices are skipped"
+        client.client.close()
+
+        client = BAMClient(address, "admin", "admin", ignore_callback, backend="async", concurrency=4)
+        client.setConfiguration("Test")
+        lookups = stand_in.calls["getEntityByName"]
+        assert(len(client.prefetchDevices()) == 50)
+        assert(client.getDevice("Async_test_device7")['id'])
+        assert(client.getDevice("Async_test_device50")['id'] == 0)
+        client.addDevices(devices[:5] + [Device("Async_test_device50", devices[0].addresses(), devices[0].device_type(), devices[0].device_subtype(), ignore_callback)])
+        assert(stand_in.calls["getEntityByName"] == lookups)
+        assert(stand_in.calls["addDevice"] == 51)
+        assert(client.getDevice("Async_test_device50")['id'])
+        print "[+] Prefetched devices are checked locally"
+        client.client.close()
+    finally:
+        stand_in.stop()
+
+def BAMStandIn_tests():
+    print "+-----------------------------+"
+    print "|      BAMStandIn Tests       |"
+    print "+-----------------------------+"
+    location = tempfile.mkdtemp()
+    stand_in = BAMStandIn(latency={"getSystemInfo": 0.2}, error_rate={"addDeviceType": 1})
+    address = stand_in.start()
+    try:
+        client = WSDLCache(location).client(address)
+        client.service.login("admin", "admin")
+        assert(client.service.getEntityByName(0, "Test", "Configuration")['id'])
+        assert(client.service.getEntityByName(0, "Missing", "Configuration")['name'] is None)
+        print "[+] suds talks to the stand-in through its WSDL"
+        start = time.time()
+        client.service.getSystemInfo()
+        assert(time.time() - start >= 0.2)
+        print "[+] Calls are delayed by the configured latency"
+        try:
+            client.service.addDeviceType("Injected", None)
+            assert(False)
+        except Exception, e:
+            assert(BAMStandIn.injected_fault in str(e))
+        assert(stand_in.injected == {"addDeviceType": 1} and not stand_in.entities("DeviceType"))
+        print "[+] Injected errors fail the call without running it"
+
+        client = BAMClient(address, "admin", "admin", ignore_callback)
+        client.setConfiguration("Test")
+        stand_in.error_rate = 0
+        device_type = client.addDeviceType("StandIn_type")
+        device_subtype = client.addDeviceSubtype(device_type[0], "StandIn_subtype")
+        device = Device("StandIn_device", [Address("10.9.0.1", "10.9.0.0/24", ignore_callback)],
+                        DeviceType("StandIn_type", device_type[0]), DeviceSubtype("StandIn_subtype", device_subtype[0], device_type[0]), ignore_callback)
+        assert(client.addDevice(device))
+        assert(client.getDevice("StandIn_device")['id'] and client.getNetwork("10.9.0.1")['id'])
+        assert(client.getDeviceTypeTree() == {"StandIn_type": [device_type[0], {"StandIn_subtype": device_subtype[0]}]})
+        print "[+] The suds backend imports into the stand-in"
+    finally:
+        stand_in.stop()
+        shutil.rmtree(location, ignore_errors=True)
+
 # <summary>
 # Unit tests for CSVReader
 # </summary>
 # <todo priority="low">
 # Not using them for anything right now, but unit tests still need to be written for removeRows and modifyValue
 def CSVReader_tests():
+    import pandas as pd
     def callback(msg, fail):
         return
     print "+-----------------------------+"
     print "|       CSVReader Tests       |"
     print "+-----------------------------+"
-    csv = CSVReader('testdevice.csv', callback)
-
-    assert(csv.getColumn('Not existing') == None)
-    print "[+] Successfully handled unexisting column name for getColumn"
-    assert(csv.getColumn('Name'))
-    print "[+] Successfully fetches column"
-    assert(type(csv.getColumn('Name')) == list)
-    print "[+] Correct return type for getColumn"
-    assert(csv.getColumns(['Not existing']) == None)
-    print "[+] Successfully handled unexisting column for getColumns"
-    assert(csv.getColumns(['Name', 'IP']))
-    print "[+] Successfully fetches columns"
-    assert(type(csv.getColumns(['Name', 'IP'])) == dict)
-    print "[+] Correct return type for getColumns"
-    assert(type(csv.getRows()) == list)
-    print "[+] Correct return type for getRows"
-    for row in csv.getRows():
-        assert(type(row[1]) == pd.core.series.Series)
-        print "[+] Successfully found Series object in row"
+    directory = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(directory, "testdevice.csv")
+        with open(csv_path, "w") as csv_file:
+            csv_file.write("Name,IP,Device Type,Device Subtype\n")
+            csv_file.write(" dev1 ,\"10.0.0.1, 10.0.0.2\",Router,Core\n")
+            csv_file.write("dev2,10.0.1.1,Switch,\n")
+            csv_file.write("dev1,10.0.0.3,Router,Core\n")
+            csv_file.write("dev3,300.1.1.1,Router,Core\n")
+            csv_file.write(",10.0.2.1,,\n")
+        csv = CSVReader(csv_path, callback, backend="pandas")
+
+        assert(csv.getColumn('Not existing') == None)
+        print "[+] Successfully handled unexisting column name for getColumn"
+        assert(csv.getColumn('Name'))
+        print "[+] Successfully fetches column"
+        assert(type(csv.getColumn('Name')) == list)
+        print "[+] Correct return type for getColumn"
+        assert(csv.getColumns(['Not existing']) == None)
+        print "[+] Successfully handled unexisting column for getColumns"
+        assert(csv.getColumns(['Name', 'IP']))
+        print "[+] Successfully fetches columns"
+        assert(type(csv.getColumns(['Name', 'IP'])) == dict)
+        print "[+] Correct return type for getColumns"
+        assert(type(csv.getRows()) == list)
+        print "[+] Correct return type for getRows"
+        for row in csv.getRows():
+            assert(type(row[1]) == pd.core.series.Series)
+            print "[+] Successfully found Series object in row"
+
+        streamed = CSVReader(csv_path, callback, chunk_size=2, backend="pandas")
+        assert(streamed.streaming())
+        assert(streamed.getColumns(['Name', 'IP']) == csv.getColumns(['Name', 'IP']))
+        print "[+] Streaming mode returns the same columns as in memory mode"
+        assert([row[0] for row in streamed.streamRows()] == [row[0] for row in csv.getRows()])
+        print "[+] Streaming mode keeps row indexes across chunks"
+        assert(streamed.getColumn('Not existing') == None)
+        print "[+] Successfully handled unexisting column name in streaming mode"
+
+        records = [record for record in csv.iterRecords(['Name', 'IP'])]
+        assert(records == [(row[0], row[1]['Name'], row[1]['IP']) for row in csv.getRows()])
+        print "[+] iterRecords matches getRows"
+        names = csv.getColumn('Name')
+        names[0] = 'Changed'
+        assert(csv.getColumn('Name')[0] != 'Changed')
+        print "[+] Cached columns are not modified through returned lists"
+        csv.modifyValue('Name', csv.getRows()[0][0], 'Modified')
+        assert(csv.getColumn('Name')[0] == 'Modified')
+        print "[+] modifyValue invalidates cached columns"
+        csv.removeRows([csv.getRows()[0][0]])
+        assert(len(csv.getColumn('Name')) == len(records) - 1)
+        print "[+] removeRows invalidates cached columns"
+
+        csv.split_columns = ['IP']
+        frame = csv.normalize(pd.DataFrame({'Name': [' a ', None, ''], 'IP': ['1.1.1.1, 1.1.1.2', '1.1.1.3', None], 'Empty': [None, None, None]}))
+        assert(frame['Name'].tolist() == ['a', 'Not Listed', 'Not Listed'])
+        print "[+] Successfully normalized text column"
+        assert(frame['IP'].tolist() == [['1.1.1.1', '1.1.1.2'], ['1.1.1.3'], ['Not Listed']])
+        print "[+] Successfully split multi-IP cells"
+        assert(frame['Empty'].tolist() == ['Not Listed'] * 3)
+        print "[+] Successfully normalized empty column"
+
+        assert(CSVReader.chooseBackend(csv_path) == "csv")
+        assert(CSVReader(csv_path, callback).backend == "csv")
+        print "[+] Small files are read with the csv backend"
+        table = CSVReader(csv_path, callback, split_columns=['IP'], backend="csv")
+        frame = CSVReader(csv_path, callback, split_columns=['IP'], backend="pandas")
+        assert(list(table.iterRecords(App.device_columns)) == list(frame.iterRecords(App.device_columns)))
+        assert(table.getColumns(App.device_columns) == frame.getColumns(App.device_columns))
+        assert([(row[0], dict(row[1])) for row in table.getRows()] == [(row[0], row[1].to_dict()) for row in frame.getRows()])
+        print "[+] The csv backend reads the same rows as pandas"
+        mixed_path = os.path.join(directory, "mixed.csv")
+        with open(mixed_path, "w") as csv_file:
+            csv_file.write("Name,IP,Device Type,Device Subtype\n")
+            csv_file.write("r1,10.0.0.1,NA,007\n")
+            csv_file.write("r2,10.0.0.2,null,1.50\n")
+            csv_file.write("NULL,10.0.0.3,Router,n/a\n")
+        readers = [CSVReader(mixed_path, callback, chunk_size=chunk_size, split_columns=['IP'], backend=backend) for backend in ["csv", "pandas"] for chunk_size in [None, 2]]
+        columns = readers[0].getColumns(App.device_columns)
+        assert(columns['Name'] == ['r1', 'r2', 'Not Listed'] and columns['Device Type'] == ['Not Listed', 'Not Listed', 'Router'])
+        assert(columns['Device Subtype'] == ['007', '1.50', 'Not Listed'])
+        assert([reader.getColumns(App.device_columns) for reader in readers[1:]] == [columns] * 3)
+        print "[+] Both backends read missing and numeric looking cells the same way"
+        streamed = CSVReader(csv_path, callback, chunk_size=2, split_columns=['IP'], backend="csv")
+        assert(list(streamed.iterRecords(App.device_columns)) == list(table.iterRecords(App.device_columns)))
+        assert(streamed.getColumn('Not existing') == None and table.getColumn('Not existing') == None)
+        print "[+] The csv backend streams chunks and handles unexisting columns"
+        assert(table.modifyValue('Name', 2, 'Modified') and table.getColumn('Name')[2] == 'Modified')
+        table.removeRows([0])
+        assert([record[0] for record in table.iterRecords(['Name'])] == range(1, len(records)))
+        print "[+] modifyValue and removeRows work with the csv backend"
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def CSVWriter_tests():
+    print "+-----------------------------+"
+    print "|       CSVWriter Tests       |"
+    print "+-----------------------------+"
+    directory = tempfile.mkdtemp()
+    stand_in = BAMStandIn()
+    address = stand_in.start()
+    page_size = BAMClient.page_size
+    try:
+        path = os.path.join(directory, "written.csv")
+        writer = CSVWriter(path, App.device_columns)
+        writer.writeRow([u"r\xe9", ["10.0.0.1", "10.0.0.2"], "Router", None])
+        writer.close()
+        csv = CSVReader(path, ignore_callback, split_columns=['IP'])
+        assert(list(csv.iterRecords(App.device_columns)) == [(0, "r\xc3\xa9", ["10.0.0.1", "10.0.0.2"], "Router", "Not Listed")])
+        print "[+] Written rows are read back by CSVReader"
+
+        client = BAMClient(address, "admin", "admin", ignore_callback, backend="async")
+        client.setConfiguration("Test")
+        device_type = DeviceType("Export_type", client.addDeviceType("Export_type")[0])
+        device_type.add(DeviceSubtype("Export_subtype", client.addDeviceSubtype(device_type.id(), "Export_subtype")[0], device_type.id()))
+        devices = [Device("Export_device{}".format(idx), [Address("10.8.0.{}".format(idx + 1), "10.8.0.0/24", ignore_callback)],
+                          device_type, device_type.subtypes()["Export_subtype"], ignore_callback) for idx in range(5)]
+        client.addDevices(devices)
+        client.client.close()
+        BAMClient.page_size = 2
+        export_path = os.path.join(directory, "exported.csv")
+        app = App(export_path, False, False, address, "admin", "admin", "Test", False, backend="async", cache=False)
+        app.start(True)
+        app.bam_client.client.close()
+        assert(stand_in.calls["getEntities"] >= 3)
+        exported = list(CSVReader(export_path, ignore_callback, split_columns=['IP']).iterRecords(App.device_columns))
+        assert(sorted(record[1:] for record in exported) == [(device.name(), [device.addresses()[0].IP()], "Export_type", "Export_subtype") for device in devices])
+        print "[+] Exported every page of devices in the import layout"
+    finally:
+        BAMClient.page_size = page_size
+        stand_in.stop()
+        shutil.rmtree(directory, ignore_errors=True)
 
 
 def Device_tests(BAM, config):
@@ -161,4 +512,626 @@ def DeviceType_tests():
 def DeviceSubtype_tests():
     print "+-----------------------------+"
     print "|     Device Subtype Tests    |"
-    print "+-----------------------------+"
\ No newline at end of file
+    print "+-----------------------------+"
+
+def IDCache_tests():
+    print "+-----------------------------+"
+    print "|        IDCache Tests        |"
+    print "+-----------------------------+"
+    directory = tempfile.mkdtemp()
+    stand_in = BAMStandIn()
+    address = stand_in.start()
+    try:
+        location = os.path.join(directory, "ids.sqlite")
+        cache = IDCache("10.0.0.1", location)
+        cache.put("DeviceType", "Router", 5, "")
+        cache.setConfiguration("Test")
+        cache.put("IP4Network", "10.0.0.0/24", 7)
+        assert(cache.get("DeviceType", "Router", "") == 5 and cache.get("IP4Network", "10.0.0.0/24") == 7)
+        assert(IDCache("10.0.0.1", location).get("DeviceType", "Router", "") == 5)
+        print "[+] IDs persist across instances"
+        cache.setConfiguration("Other")
+        assert(cache.get("IP4Network", "10.0.0.0/24") is None)
+        assert(IDCache("10.0.0.2", location).get("DeviceType", "Router", "") is None)
+        print "[+] IDs are scoped to their server and configuration"
+        assert(IDCache("10.0.0.1", location, ttl=-1).get("DeviceType", "Router", "") is None)
+        print "[+] Expired IDs are ignored"
+        cache.forget("DeviceType", "Router", "")
+        assert(cache.get("DeviceType", "Router", "") is None)
+        cache.invalidate()
+        assert(cache.get("IP4Network", "10.0.0.0/24", "Test") is None)
+        print "[+] IDs are forgotten and invalidated"
+
+        client = BAMClient(address, "admin", "admin", ignore_callback, backend="async", id_cache=IDCache(address, location))
+        client.setConfiguration("Test")
+        device_type = client.addDeviceType("Cached_type")
+        device_subtype = client.addDeviceSubtype(device_type[0], "Cached_subtype")
+        network_id = client.addNetwork("10.5.5.1")
+        client.client.close()
+        calls = dict(stand_in.calls)
+        client = BAMClient(address, "admin", "admin", ignore_callback, backend="async", id_cache=IDCache(address, location))
+        assert(client.setConfiguration("Test") and client.addDeviceType("Cached_type") == device_type)
+        assert(client.addDeviceSubtype(device_type[0], "Cached_subtype") == device_subtype)
+        assert(client.getNetwork("10.5.5.20")['id'] == network_id and client.getBlock("10.5.5.20")['id'])
+        calls["login"] += 1
+        calls["getEntityById"] = calls.get("getEntityById", 0) + 1
+        assert(stand_in.calls == calls)
+        print "[+] Cached IDs are used without calling the server, after checking the configuration ID once"
+
+        client.id_cache.put("IP4Network", "10.6.6.0/24", 9999)
+        device = Device("Cached_device", [Address("10.6.6.1", "10.6.6.0/24", ignore_callback)],
+                        DeviceType("Cached_type", device_type[0]), DeviceSubtype("Cached_subtype", device_subtype[0], device_type[0]), ignore_callback)
+        assert(client.addDevice(device, create_networks=False))
+        assert(len(stand_in.entities("Device")) == 1)
+        assert(client.id_cache.get("IP4Network", "10.6.6.0/24") == client.getNetwork("10.6.6.1")['id'])
+        print "[+] Stale IDs are dropped and the call retried"
+        client.client.close()
+
+        for backend in ["suds", "async"]:
+            # The cache outlived the device types of the server, e.g. they were deleted and created again
+            stale_cache = IDCache(address, location)
+            stale_cache.put("DeviceType", "Cached_type", 999998, "")
+            stale_cache.put("DeviceSubtype", BAMClient.subtypeKey(999998, "Cached_subtype"), 999999, "")
+            client = BAMClient(address, "admin", "admin", ignore_callback, backend=backend, id_cache=stale_cache)
+            client.setConfiguration("Test")
+            stale_type = DeviceType("Cached_type", client.addDeviceType("Cached_type")[0])
+            stale_type.add(DeviceSubtype("Cached_subtype", client.addDeviceSubtype(stale_type.id(), "Cached_subtype")[0], stale_type.id()))
+            assert(stale_type.id() == 999998)
+            devices = [Device("Stale_{0}_device{1}".format(backend, idx), [Address("10.6.6.{}".format(idx + 2), "10.6.6.0/24", ignore_callback)],
+                              stale_type, stale_type.subtypes()["Cached_subtype"], ignore_callback) for idx in range(5)]
+            messages = []
+            client.callback = lambda msg, fail: messages.append(msg)
+            client.addDevices(devices, create_networks=False)
+            assert(not messages and len([entity for entity in stand_in.entities("Device") if entity['name'].startswith("Stale_" + backend)]) == 5)
+            assert(stale_type.id() == device_type[0] and stale_type.subtypes()["Cached_subtype"].id() == device_subtype[0])
+            if backend == "async":
+                client.client.close()
+        print "[+] Stale device type IDs are looked up again for every device sharing them"
+
+        for backend in ["suds", "async"]:
+            # The cache outlived the configuration, e.g. it was created again or the server was restored
+            stale_cache = IDCache(address, location)
+            stale_cache.put("Configuration", "Test", 424242, "")
+            client = BAMClient(address, "admin", "admin", ignore_callback, backend=backend, id_cache=stale_cache)
+            assert(client.setConfiguration("Test") == stand_in.entities("Configuration")[0]['id'])
+            assert(stale_cache.get("Configuration", "Test", "") == client.configuration_id)
+            devices = [Device("Stale_config_{0}_device{1}".format(backend, idx), [Address("10.6.7.{}".format(idx + 1), "10.6.7.0/24", ignore_callback)],
+                              DeviceType("Cached_type", device_type[0]), DeviceSubtype("Cached_subtype", device_subtype[0], device_type[0]), ignore_callback) for idx in range(3)]
+            client.addDevices(devices)
+            assert(len([entity for entity in stand_in.entities("Device") if entity['name'].startswith("Stale_config_" + backend)]) == 3)
+            if backend == "async":
+                client.client.close()
+        print "[+] A stale configuration ID is looked up again before any device is added"
+    finally:
+        stand_in.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+def ImportDelta_tests():
+    print "+-----------------------------+"
+    print "|      ImportDelta Tests      |"
+    print "+-----------------------------+"
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "import.csv.hashes")
+        device_type = DeviceType("Delta_type", 1)
+        device_type.add(DeviceSubtype("Delta_subtype", 2, 1))
+        def device(name, *IPs):
+            return Device(name, [Address(IP, IP.rsplit('.', 1)[0] + ".0/24", ignore_callback) for IP in IPs], device_type, device_type.subtypes()["Delta_subtype"], ignore_callback)
+        assert(ImportDelta.hashOf(device("d1", "10.0.0.1", "10.0.0.2")) == ImportDelta.hashOf(device("d1", "10.0.0.2", "10.0.0.1")))
+        assert(not ImportDelta.hashOf(device("d1", "10.0.0.1")) == ImportDelta.hashOf(device("d1", "10.0.0.2")))
+        print "[+] Hashes cover the addresses but not their order"
+
+        journal = ImportJournal(os.path.join(directory, "import.csv.journal"), "10.0.0.1", "Test", ignore_callback)
+        delta = ImportDelta(path, "10.0.0.1", "Test")
+        assert([entry.name() for entry in delta.changed([device("d1", "10.0.0.1"), device("d2", "10.0.0.2")])] == ["d1", "d2"])
+        journal.record("Device", "d1", 1)
+        delta.save(journal)
+        delta = ImportDelta(path, "10.0.0.1", "Test")
+        assert([entry.name() for entry in delta.changed([device("d1", "10.0.0.1"), device("d2", "10.0.0.2"), device("d3", "10.0.0.3")])] == ["d2", "d3"])
+        print "[+] Only uncommitted, new and changed devices are sent again"
+        journal.record("Device", "d2", 2)
+        delta.save(journal)
+        delta = ImportDelta(path, "10.0.0.1", "Test")
+        assert([entry.name() for entry in delta.changed([device("d1", "10.0.0.9"), device("d2", "10.0.0.2"), device("d3", "10.0.0.3")])] == ["d1", "d3"])
+        assert(delta.unchanged == 1)
+        print "[+] Changed devices are sent again"
+        # d1 already exists on the server, so addDevice skips it without applying its new address
+        journal.record("Device", "d1", 1)
+        journal.record("SkippedDevice", "d1", 1)
+        journal.record("Device", "d3", 3)
+        delta.save(journal)
+        delta = ImportDelta(path, "10.0.0.1", "Test")
+        assert([entry.name() for entry in delta.changed([device("d1", "10.0.0.9"), device("d2", "10.0.0.2"), device("d3", "10.0.0.3")])] == ["d1"])
+        print "[+] Changed devices that were skipped keep their previous hash"
+        # The server was filled by an earlier import without hashes, so every device is skipped
+        adopted_path = os.path.join(directory, "adopted.csv.hashes")
+        delta = ImportDelta(adopted_path, "10.0.0.1", "Test")
+        assert([entry.name() for entry in delta.changed([device("d4", "10.0.0.4"), device("d5", "10.0.0.5")])] == ["d4", "d5"])
+        for idx, name in [(4, "d4"), (5, "d5")]:
+            journal.record("Device", name, idx)
+            journal.record("SkippedDevice", name, idx)
+        delta.save(journal)
+        delta = ImportDelta(adopted_path, "10.0.0.1", "Test")
+        assert(list(delta.changed([device("d4", "10.0.0.4"), device("d5", "10.0.0.5")])) == [] and delta.unchanged == 2)
+        journal.close()
+        print "[+] Skipped devices without a previous hash are saved"
+
+        stand_in = BAMStandIn()
+        address = stand_in.start()
+        try:
+            journal = ImportJournal(os.path.join(directory, "skipped.csv.journal"), address, "Test", ignore_callback)
+            client = BAMClient(address, "admin", "admin", ignore_callback, journal=journal)
+            client.setConfiguration("Test")
+            type_id = client.addDeviceType("Delta_type")[0]
+            subtype_id = client.addDeviceSubtype(type_id, "Delta_subtype")[0]
+            existing = Device("d1", [Address("10.0.0.1", "10.0.0.0/24", ignore_callback)], DeviceType("Delta_type", type_id), DeviceSubtype("Delta_subtype", subtype_id, type_id), ignore_callback)
+            assert(client.addDevice(existing))
+            assert(journal.get("Device", "d1") and not journal.get("SkippedDevice", "d1"))
+            journal = ImportJournal(os.path.join(directory, "skipped.csv.journal"), address, "Test", ignore_callback)
+            client.journal = journal
+            assert(client.addDevice(existing))
+            assert(journal.get("Device", "d1") and journal.get("SkippedDevice", "d1"))
+            journal.close()
+            print "[+] Devices that already existed are journaled as skipped"
+        finally:
+            stand_in.stop()
+        assert(not ImportDelta(path, "10.0.0.2", "Test").previous)
+        print "[+] Hashes of another server are ignored"
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def ImportJournal_tests():
+    print "+-----------------------------+"
+    print "|     ImportJournal Tests     |"
+    print "+-----------------------------+"
+    directory = tempfile.mkdtemp()
+    stand_in = BAMStandIn()
+    address = stand_in.start()
+    try:
+        path = os.path.join(directory, "import.csv.journal")
+        journal = ImportJournal(path, "10.0.0.1", "Test", ignore_callback)
+        journal.record("Device", "dev\t1", 12)
+        journal.record("IP4Network", "10.0.0.0/24", 13)
+        journal.close()
+        with open(path, "a") as journal_file:
+            journal_file.write("Device\tdev2\t1")
+        journal = ImportJournal(path, "10.0.0.1", "Test", ignore_callback, resume=True)
+        assert(journal.get("Device", "dev\t1") == 12 and journal.get("IP4Network", "10.0.0.0/24") == 13)
+        assert(journal.get("Device", "dev2") is None)
+        print "[+] Resumed journal holds the committed entities, without the torn entry"
+        journal.record("Device", "dev2", 14)
+        journal.close()
+        assert(ImportJournal(path, "10.0.0.1", "Test", ignore_callback, resume=True).get("Device", "dev2") == 14)
+        assert(ImportJournal(path, "10.0.0.1", "Test", ignore_callback).get("Device", "dev2") is None)
+        print "[+] Entries are appended after a torn line and new runs start over"
+        failures = []
+        ImportJournal(path, "10.0.0.2", "Test", lambda msg, fail: failures.append(fail)).close()
+        ImportJournal(path, "10.0.0.1", "Test", lambda msg, fail: failures.append(fail), resume=True)
+        assert(failures == [True])
+        print "[+] Journals of another server are not resumed"
+
+        journal = ImportJournal(path, address, "Test", ignore_callback)
+        client = BAMClient(address, "admin", "admin", ignore_callback, backend="async", journal=journal)
+        client.setConfiguration("Test")
+        device_type = client.addDeviceType("Journal_type")
+        device_subtype = client.addDeviceSubtype(device_type[0], "Journal_subtype")
+        devices = [Device("Journal_device{}".format(idx), [Address("10.7.{}.1".format(idx), "10.7.{}.0/24".format(idx), ignore_callback)],
+                          DeviceType("Journal_type", device_type[0]), DeviceSubtype("Journal_subtype", device_subtype[0], device_type[0]), ignore_callback) for idx in range(4)]
+        client.addDevices(devices[:2])
+        client.addDevice(devices[2])
+        client.client.close()
+        journal.close()
+        calls = dict(stand_in.calls)
+        journal = ImportJournal(path, address, "Test", ignore_callback, resume=True)
+        client = BAMClient(address, "admin", "admin", ignore_callback, backend="async", journal=journal)
+        client.setConfiguration("Test")
+        client.addDevices(devices)
+        calls["login"] += 1
+        calls["getEntities"] += 1
+        assert(stand_in.calls["addDevice"] == calls["addDevice"] + 1)
+        assert(stand_in.calls["getEntityByName"] == calls["getEntityByName"] + 1)
+        assert(stand_in.calls["getIPRangedByIP"] == calls["getIPRangedByIP"] + 2)
+        assert(len(stand_in.entities("Device")) == 4)
+        print "[+] Resumed imports only send the remaining work"
+        client.client.close()
+        journal.close()
+    finally:
+        stand_in.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+def ImportPlanner_tests():
+    print "+-----------------------------+"
+    print "|     ImportPlanner Tests     |"
+    print "+-----------------------------+"
+    directory = tempfile.mkdtemp()
+    stand_in = BAMStandIn()
+    address = stand_in.start()
+    try:
+        csv_path = os.path.join(directory, "planner.csv")
+        with open(csv_path, "w") as csv_file:
+            csv_file.write("Name,IP,Device Type,Device Subtype\n")
+            csv_file.write("r1,\"10.0.0.1, 10.0.1.1\",Router,Edge\n")
+            csv_file.write("r2,10.0.0.2,Router,Core\n")
+            csv_file.write("r1,10.0.2.1,Router,Edge\n")
+            csv_file.write("s1,10.0.0.3,Switch,\n")
+            csv_file.write("bad,10.0.9.300,Switch,Access\n")
+        client = BAMClient(address, "admin", "admin", ignore_callback, backend="async")
+        client.setConfiguration("Test")
+        planner = ImportPlanner(client, ignore_callback).plan(CSVReader(csv_path, ignore_callback, split_columns=['IP']))
+        assert(planner.networks == ["10.0.0.0/24", "10.0.1.0/24", "10.0.2.0/24"])
+        print "[+] Planned each network once, without the invalid row's"
+        assert(planner.device_types.keys() == ["Router", "Switch"])
+        assert(planner.device_types["Router"].keys() == ["Edge", "Core"])
+        assert(planner.device_types["Switch"].keys() == ["Not Listed", "Access"])
+        print "[+] Planned each device type and subtype once"
+
+        id_list = planner.createDeviceTypes()
+        assert(sorted(id_list["Router"].subtypes().keys()) == ["Core", "Edge"])
+        assert(stand_in.calls["addDeviceType"] == 2 and stand_in.calls["addDeviceSubtype"] == 4)
+        print "[+] Created device types and subtypes"
+        planner.device_types["Switch"]["Core"] = True
+        id_list = planner.createDeviceTypes()
+        assert(id_list["Router"].subtypes()["Edge"].id() and id_list["Switch"].subtypes()["Core"].id())
+        assert(stand_in.calls["addDeviceType"] == 2 and stand_in.calls["addDeviceSubtype"] == 5)
+        print "[+] Only missing device types and subtypes are created"
+        assert(ImportPlanner.supernets(planner.networks + ["10.1.0.0/24"], 16).items() == [("10.0.0.0/22", planner.networks), ("10.1.0.0/24", ["10.1.0.0/24"])])
+        assert(ImportPlanner.supernets(planner.networks, 24).keys() == planner.networks)
+        assert(ImportPlanner.supernets(["10.0.1.0/24", "10.0.0.0/24"], 16).keys() == ["10.0.0.0/23"])
+        print "[+] Grouped the networks under the smallest supernets within the block prefix"
+        planner.createNetworks()
+        assert(len(planner.network_ids) == 3)
+        assert(stand_in.calls["addIP4BlockByCIDR"] == 1 and stand_in.calls["addIP4Network"] == 3)
+        assert(len(set(planner.blocks.values())) == 1 and len(stand_in.entities("IP4Block")) == 1)
+        print "[+] Created one supernet block, then the networks inside it"
+        client.addDevices([Device("r2", [Address("10.0.0.2", "10.0.0.0/24", ignore_callback)], id_list["Router"], id_list["Router"].subtypes()["Core"], ignore_callback)], create_networks=False)
+        assert(len(stand_in.entities("Device")) == 1 and stand_in.calls.get("getIPRangedByIP", 0) == 6)
+        print "[+] Devices were added without looking up their networks again"
+
+        writes = dict((method, count) for method, count in stand_in.calls.items() if method.startswith("add"))
+        planner = ImportPlanner(client, ignore_callback).plan(CSVReader(csv_path, ignore_callback, split_columns=['IP'])).snapshot()
+        planner.device_types["Hub"] = collections.OrderedDict([("Edge", True)])
+        id_list = planner.plannedDeviceTypes()
+        assert(id_list["Router"].id() and id_list["Hub"].id() == 0 and id_list["Hub"].subtypes()["Edge"].id() == 0)
+        print "[+] Planned device types use the snapshot IDs"
+        devices = [Device("r2", [Address("10.0.0.2", "10.0.0.0/24", ignore_callback)], id_list["Router"], id_list["Router"].subtypes()["Core"], ignore_callback),
+                   Device("h1", [Address("10.0.5.1", "10.0.5.0/24", ignore_callback)], id_list["Hub"], id_list["Hub"].subtypes()["Edge"], ignore_callback)]
+        diff = planner.diff(devices, [[None, 4]])
+        assert(diff["device_types"] == {"create": ["Hub"], "skip": ["Router", "Switch"]})
+        assert(diff["device_subtypes"]["create"] == ["Hub/Edge"] and len(diff["device_subtypes"]["skip"]) == 4)
+        assert(diff["blocks"] == {"create": ["10.0.5.0/24"], "skip": ["10.0.0.0/22"]})
+        assert(diff["networks"] == {"create": ["10.0.5.0/24"], "skip": ["10.0.0.0/24"]})
+        assert(diff["devices"] == {"create": ["h1"], "skip": ["r2"]})
+        assert(diff["invalid_rows"] == [4])
+        assert(ImportPlanner.summary(diff)[0] == "Device types: 1 to create, 2 already present")
+        print "[+] Diffed the devices against the snapshot"
+        assert(dict((method, count) for method, count in stand_in.calls.items() if method.startswith("add")) == writes)
+        print "[+] Planning wrote nothing to the BAM service"
+
+        errors = []
+        overlap_path = os.path.join(directory, "overlap.csv")
+        with open(overlap_path, "w") as csv_file:
+            csv_file.write("Name,IP,Device Type,Device Subtype\n")
+            csv_file.write("o1,10.2.0.1,Router,Edge\n")
+            csv_file.write("o2,10.2.2.1,Router,Edge\n")
+        client.addBlockByCIDR("10.2.1.0/24", ["10.2.1.0"])
+        planner = ImportPlanner(client, lambda message, success: errors.append(message)).plan(CSVReader(overlap_path, ignore_callback, split_columns=['IP']))
+        assert(ImportPlanner.supernets(planner.networks, 16).keys() == ["10.2.0.0/22"])
+        planner.createNetworks()
+        assert(errors == [] and len(planner.network_ids) == 2)
+        assert(len(set(planner.blocks.values())) == 2 and len(stand_in.entities("IP4Block")) == 4)
+        print "[+] A supernet overlapping an existing block fell back to a block per network"
+        client.client.close()
+    finally:
+        stand_in.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+def IPTopology_tests():
+    print "+-----------------------------+"
+    print "|      IPTopology Tests       |"
+    print "+-----------------------------+"
+    topology = IPTopology()
+    assert(topology.getBlock("10.0.0.1")['id'] == 0)
+    print "[+] Empty topology has no block"
+    assert(topology.add({'id': 1, 'name': None, 'type': "IP4Block", 'properties': "CIDR=10.0.0.0/8|"}))
+    assert(topology.addCIDR("IP4Block", "10.1.0.0/16", 2))
+    assert(topology.addCIDR("IP4Network", "10.1.2.0/24", 3))
+    assert(not topology.add({'id': 4, 'name': None, 'type': "Device", 'properties': ""}))
+    print "[+] Indexed blocks and networks"
+    assert(topology.getBlock("10.1.2.3")['id'] == 2)
+    assert(topology.getBlock("10.2.0.1")['id'] == 1)
+    print "[+] Most specific block is returned"
+    assert(topology.getNetwork("10.1.2.255")['id'] == 3)
+    assert(topology.getNetwork("10.1.3.0")['id'] == 0)
+    print "[+] Network lookups respect the network boundaries"
+
+# <summary>
+# Returns the bytes allocated for the objects returned by build. Measured with tracemalloc where it is available,
+# otherwise (python 2) estimated with sys.getsizeof as the size of every object, its __dict__ or slots, and the values they hold
+# </summary>
+# <param name="build" type="function">
+# Creates and returns a list of objects
+# </param>
+def allocated(build):
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+    gc.collect()
+    if tracemalloc:
+        tracemalloc.start()
+        objects = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return size
+    size = 0
+    for obj in build():
+        size += sys.getsizeof(obj)
+        for referent in gc.get_referents(obj):
+            if isinstance(referent, dict):
+                size += sys.getsizeof(referent) + sum(sys.getsizeof(value) for value in referent.values())
+            elif not type(referent).__name__ in ("type", "classobj"):
+                size += sys.getsizeof(referent)
+    return size
+
+def Memory_tests():
+    print "+-----------------------------+"
+    print "|        Memory Tests         |"
+    print "+-----------------------------+"
+    # Layout of Address and Device before they were slotted: a __dict__ holding the strings and a bound error callback
+    class LegacyAddress:
+        def __init__(self, IP, subnet, error_callback):
+            self.error_callback = error_callback
+            self.subnet = subnet
+            self.IP = IP
+            self.FQDN = None
+    class LegacyDevice:
+        def __init__(self, name, addresses, device_type, device_subtype, error_callback):
+            self.error_callback = error_callback
+            self.name = name
+            self.addresses = addresses
+            self.device_type = device_type
+            self.device_subtype = device_subtype
+
+    class Owner:
+        def errorCallback(self, msg, fail):
+            return
+    owner = Owner()
+    device_type = DeviceType("Memory_type", 1)
+    device_subtype = DeviceSubtype("Memory_subtype", 2, 1)
+    device_type.add(device_subtype)
+    subnets = ["10.{0}.{1}.0/24".format(idx // 256, idx % 256) for idx in range(20)]
+    def build(address_class, device_class):
+        objects = []
+        for idx in range(5000):
+            # Like App, every address gets the subnet string shared by its network and a fresh bound method
+            address = address_class("10.{0}.{1}.{2}".format(idx // 5120, idx // 256 % 20, idx % 256), subnets[idx // 256 % 20], owner.errorCallback)
+            objects.append(address)
+            objects.append(device_class("Memory_device{}".format(idx), [address], device_type, device_subtype, owner.errorCallback))
+        return objects
+    legacy = allocated(lambda: build(LegacyAddress, LegacyDevice))
+    slotted = allocated(lambda: build(lambda IP, subnet, error_callback: Address(IP, subnet, error_callback, validated=True), Device))
+    print "[+] 5000 devices take {0} bytes, {1} before slotting".format(slotted, legacy)
+    assert(slotted * 2 < legacy)
+    print "[+] Slotted devices and addresses take less than half the memory"
+
+    address = Address("10.1.2.3", "10.1.2.0/24", ignore_callback)
+    assert(not hasattr(address, "__dict__") and not hasattr(device_type, "__dict__") and not hasattr(device_subtype, "__dict__"))
+    assert(address.IP() == "10.1.2.3" and address.subnet() == "10.1.2.0/24" and address.integer() == 167838211 and address.prefix() == 24)
+    print "[+] Addresses keep their accessors"
+    device = Device("Memory_device", [address], device_type, device_subtype, ignore_callback)
+    assert(not hasattr(device, "__dict__"))
+    assert(device.name() == "Memory_device" and device.addresses() == [address] and device.device_subtype() is device_subtype)
+    assert(DeviceType("".join(["Memory", "_type"]), 3).name() is device_type.name())
+    print "[+] Devices keep their accessors and type names are interned"
+
+def ParsePool_tests():
+    print "+-----------------------------+"
+    print "|       ParsePool Tests       |"
+    print "+-----------------------------+"
+    assert(ParsePool.shards(10, 3) == [(0, 3), (3, 6), (6, 10)])
+    assert(ParsePool.shards(2, 4) == [(0, 1), (1, 2)] and ParsePool.shards(0, 4) == [])
+    print "[+] Rows are split into nearly equal ranges"
+
+    id_list = {}
+    for type_idx in range(2):
+        device_type = DeviceType("Type{}".format(type_idx), type_idx + 1)
+        for subtype_idx in range(3):
+            device_type.add(DeviceSubtype("Subtype{}".format(subtype_idx), (type_idx + 1) * 10 + subtype_idx, type_idx + 1))
+        id_list[device_type.name()] = device_type
+    directory = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(directory, "inventory.csv")
+        with open(csv_path, "w") as csv_file:
+            csv_file.write("Name,IP,Device Type,Device Subtype\n")
+            for idx in range(400):
+                # The rows of a device are far apart, so its addresses are merged across ranges. Every 37th row is invalid
+                IP = "300.0.0.1" if idx % 37 == 0 else "10.{0}.{1}.{2}".format(idx // 256, idx % 256 // 4, idx % 254 + 1)
+                csv_file.write("Shard_device{0},{1},Type{2},Subtype{3}\n".format(idx % 150, IP, idx % 150 % 2, idx % 150 % 3))
+        for backend in ["pandas", "csv"]:
+            results = []
+            for processes in [1, 4]:
+                app = App(filename=csv_path, verbose=False, user_input=False, address=None, username=None, password=None, configuration=None, upload=False, processes=processes)
+                messages = []
+                app.errorCallback = lambda msg, fail: messages.append(msg)
+                app.id_list = id_list
+                devices, error = app.populateDevices(CSVReader(csv_path, ignore_callback, split_columns=['IP'], backend=backend))
+                results.append([[(device.name(), [(address.IP(), address.subnet()) for address in device.addresses()], device.device_type(), device.device_subtype())
+                                 for device in devices], error, messages])
+            assert(len(results[0][0]) == 150 and len(results[0][1]) == 11 and len(results[0][2]) == 11)
+            assert(results[0] == results[1])
+            print "[+] Process pool parses exactly like the serial path with the {} backend".format(backend)
+            planner = ImportPlanner(None, ignore_callback).plan(CSVReader(csv_path, ignore_callback, chunk_size=64, split_columns=['IP'], backend=backend))
+            assert(len(planner.last_rows) == 150 and planner.last_rows["Shard_device0"] == 300)
+            messages = []
+            app.errorCallback = lambda msg, fail: messages.append(msg)
+            devices = app.streamDevices(CSVReader(csv_path, ignore_callback, chunk_size=64, split_columns=['IP'], backend=backend), planner.last_rows)
+            streamed = [(device.name(), [(address.IP(), address.subnet()) for address in device.addresses()], device.device_type(), device.device_subtype())
+                        for device in devices]
+            assert(sorted(streamed) == sorted(results[0][0]) and len(messages) == 11)
+            print "[+] Streaming merges the rows of a device across chunks with the {} backend".format(backend)
+    finally:
+        shutil.rmtree(directory)
+
+def RetryingClient_tests():
+    print "+-----------------------------+"
+    print "|    RetryingClient Tests     |"
+    print "+-----------------------------+"
+    assert(RetryPolicy.isTransient(Exception(BAMStandIn.injected_fault)))
+    assert(RetryPolicy.isTransient(IOError(104, "Connection reset by peer")))
+    assert(not RetryPolicy.isTransient(Exception("Duplicate of another item")))
+    assert(RetryPolicy.isTransient(Exception("Invalid response to addDevice (HTTP 503): not well-formed")))
+    assert(RetryPolicy.isTransient(Exception("HTTP Error 504: Gateway Time-out")))
+    assert(not RetryPolicy.isTransient(Exception("Server raised fault: 'Object with ID 15023 was not found'")))
+    assert(not RetryPolicy.isTransient(Exception("Server raised fault: 'Duplicate of another item: 10.50.2.0/24'")))
+    assert(not RetryPolicy.isTransient(Exception("Invalid response to addDevice (HTTP 500): not well-formed")))
+    assert(not RetryPolicy(0).shouldRetry(Exception("timed out"), 1))
+    assert(all(0 <= RetryPolicy(3, 0.5, 1.0).delay(attempt) <= 1.0 for attempt in range(1, 10)))
+    print "[+] Only transient failures are retried, with bounded backoff"
+
+    limiter = AIMDLimiter(8, latency_target=0.1)
+    limiter.completed(0.01, True)
+    limiter.completed(0.01, True)
+    assert(limiter.limit == 4)
+    print "[+] A burst of failures halves the limit once"
+    for _ in range(100):
+        limiter.completed(0.01)
+    assert(limiter.limit == 8)
+    limiter.completed(0.5)
+    assert(limiter.limit == 4)
+    print "[+] The limit recovers after successes and backs off on slow calls"
+    limiter = AIMDLimiter(8)
+    for _ in range(50):
+        limiter.completed(0.005, method="getEntityByName")
+        limiter.completed(0.3, method="addDevice")
+    assert(limiter.limit == 8)
+    limiter.completed(1.0, method="addDevice")
+    assert(limiter.limit == 4)
+    print "[+] Without a latency target, each method is judged against its own fastest call"
+
+    stand_in = BAMStandIn(error_rate={"addDeviceType": 0.5, "addDevice": 0.3}, seed=21)
+    address = stand_in.start()
+    try:
+        client = BAMClient(address, "admin", "admin", ignore_callback, retry_policy=RetryPolicy(10, 0.001), limiter=AIMDLimiter(1))
+        client.setConfiguration("Test")
+        device_types = [client.addDeviceType("Retry_type{}".format(idx)) for idx in range(10)]
+        assert(all(device_type and device_type[0] for device_type in device_types))
+        assert(client.client.retried == stand_in.injected["addDeviceType"] > 0)
+        print "[+] Blocking calls are retried until they succeed"
+        try:
+            client.client.addDeviceSubtype(999999, "Retry_subtype", None)
+            assert(False)
+        except Exception, e:
+            assert("not found" in str(e))
+        assert(client.client.retried == stand_in.injected["addDeviceType"])
+        print "[+] Faults about the request are not retried"
+
+        device_subtype = client.addDeviceSubtype(device_types[0][0], "Retry_subtype")
+        client = BAMClient(address, "admin", "admin", ignore_callback, backend="async", retry_policy=RetryPolicy(10, 0.001), limiter=AIMDLimiter(8))
+        client.setConfiguration("Test")
+        client.addDevices([Device("Retry_device{}".format(idx), [Address("10.7.0.{}".format(idx + 1), "10.7.0.0/24", ignore_callback)],
+                                  DeviceType("Retry_type0", device_types[0][0]), DeviceSubtype("Retry_subtype", device_subtype[0], device_types[0][0]), ignore_callback) for idx in range(20)])
+        assert(client.client.retried > 0 and stand_in.injected["addDevice"] > 0)
+        assert(client.client.limiter.limit < 8)
+        assert(all(client.getDevice("Retry_device{}".format(idx))['id'] for idx in range(20)))
+        client.client.close()
+        print "[+] Pipelined requests are retried and back off"
+    finally:
+        stand_in.stop()
+
+    stand_in = BAMStandIn(latency={"getEntityByName": 0.005, "addDevice": 0.1})
+    address = stand_in.start()
+    try:
+        client = BAMClient(address, "admin", "admin", ignore_callback, backend="async", retry_policy=RetryPolicy(), limiter=AIMDLimiter(8))
+        client.setConfiguration("Test")
+        device_type = client.addDeviceType("Latency_type")
+        device_subtype = client.addDeviceSubtype(device_type[0], "Latency_subtype")
+        client.addDevices([Device("Latency_device{}".format(idx), [Address("10.8.0.{}".format(idx + 1), "10.8.0.0/24", ignore_callback)],
+                                  DeviceType("Latency_type", device_type[0]), DeviceSubtype("Latency_subtype", device_subtype[0], device_type[0]), ignore_callback) for idx in range(40)])
+        assert(len(stand_in.entities("Device")) == 40)
+        assert(client.client.limiter.limit == 8)
+        client.client.close()
+        print "[+] Slow writes among fast reads do not make a healthy server look overloaded"
+    finally:
+        stand_in.stop()
+
+def UploadPool_tests():
+    print "+-----------------------------+"
+    print "|      UploadPool Tests       |"
+    print "+-----------------------------+"
+    stand_in = BAMStandIn()
+    address = stand_in.start()
+    try:
+        client = BAMClient(address, "admin", "admin", ignore_callback)
+        configuration_id = client.setConfiguration("Test")
+        device_type = DeviceType("Pool_type", client.addDeviceType("Pool_type")[0])
+        device_subtype = DeviceSubtype("Pool_subtype", client.addDeviceSubtype(device_type.id(), "Pool_subtype")[0], device_type.id())
+        # Neighbouring devices share a /24, so the sessions race to create the same blocks and networks
+        devices = [Device("Pool_device{}".format(idx), [Address("10.7.{0}.{1}".format(idx // 100, idx % 100 + 1), "10.7.{}.0/24".format(idx // 100), ignore_callback)],
+                          device_type, device_subtype, ignore_callback) for idx in range(400)]
+        messages = []
+        pool = UploadPool(address, "admin", "admin", configuration_id, 4, lambda msg, fail: messages.append(msg))
+        stats = pool.upload(devices)
+        assert(not messages and len(stand_in.entities("Device")) == 400)
+        assert(len(stand_in.entities("IP4Network")) == 4 and len(stats) == 4 and sum(stat[0] for stat in stats) == 400)
+        print "[+] Every device was uploaded over 4 sessions"
+        failing = Device("Pool_failing", [Address("10.7.9.1", "10.7.9.0/24", ignore_callback)], DeviceType("Missing_type", 999999), device_subtype, ignore_callback)
+        stats = pool.upload(devices[:10] + [failing])
+        assert(len(messages) == 1 and sum(stat[0] for stat in stats) == 10)
+        print "[+] Failed devices are not counted as uploaded"
+    finally:
+        stand_in.stop()
+
+def WSDLCache_tests():
+    print "+-----------------------------+"
+    print "|       WSDLCache Tests       |"
+    print "+-----------------------------+"
+    location = tempfile.mkdtemp()
+    try:
+        cache = WSDLCache(location)
+        assert(cache.directory("10.0.0.1", "a") == cache.directory("10.0.0.1", "a"))
+        assert(not cache.directory("10.0.0.1", "a") == cache.directory("10.0.0.1", "b"))
+        assert(not cache.directory("10.0.0.1", "a") == cache.directory("10.0.0.2", "a"))
+        assert(WSDLCache.serverKey("127.0.0.1:8080") == "127.0.0.1_8080")
+        print "[+] Cache directories are keyed by server and WSDL"
+
+        wsdl = os.path.join(location, "API.wsdl")
+        with open(wsdl, "w") as wsdl_file:
+            wsdl_file.write(minimal_wsdl)
+        stand_in = BAMStandIn()
+        address = stand_in.start()
+        try:
+            client = cache.client(address, wsdl)
+            assert(os.listdir(cache.directory(address, minimal_wsdl)))
+            print "[+] Parsed WSDL was cached on disk"
+            other = cache.client(address, wsdl)
+            assert(not other is client and not other.wsdl is client.wsdl)
+            print "[+] Later clients get their own copy of the parsed WSDL"
+            client.service.login("admin", "admin")
+            assert(stand_in.calls["login"] == 1)
+            print "[+] Local WSDL calls the server's endpoint"
+
+            # Sessions in threads of their own, like UploadPool's, must not corrupt each other's replies
+            failures = []
+            def session(idx):
+                try:
+                    service = cache.client(address).service
+                    service.login("admin", "admin")
+                    configuration_id = service.getEntityByName(0, "Test", "Configuration")['id']
+                    for call in range(25):
+                        name = "Session{0}_type{1}".format(idx, call)
+                        type_id = service.addDeviceType(name, None)
+                        assert(service.getEntityById(type_id)['name'] == name)
+                        assert(service.getEntityByName(0, "Test", "Configuration")['id'] == configuration_id)
+                except Exception, e:
+                    failures.append(e)
+            threads = [threading.Thread(target=session, args=(idx,)) for idx in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert(not failures and len(stand_in.entities("DeviceType")) == 100)
+            print "[+] Concurrent sessions parse their own replies"
+        finally:
+            stand_in.stop()
+    finally:
+        shutil.rmtree(location, ignore_errors=True)
@@ -0,0 +1,175 @@
+from BAMClient import BAMClient
+import logging
+import Queue
+import threading
+import time
+
+# <summary>
+# Uploads devices concurrently over a pool of independently logged in BAMClient sessions, one worker thread per session.
+# Blocks and networks created by two sessions at once are handled by BAMClient (a duplicate fault counts as success)
+# </summary>
+class UploadPool:
+
+    # <summary>
+    # Constructor for UploadPool
+    # </summary>
+    # <param name="address" type="string">
+    # Address of BAM server
+    # </param>
+    # <param name="user" type="string">
+    # Username for authentication with BAM service
+    # </param>
+    # <param name="password" type="string">
+    # Password for authentication with BAM service
+    # </param>
+    # <param name="configuration_id" type="int">
+    # ID of the active configuration, as returned by BAMClient.setConfiguration
+    # </param>
+    # <param name="sessions" type="int">
+    # The number of sessions (and worker threads) to upload with
+    # </param>
+    # <param name="callback" type="function" args="string, Boolean">
+    # Callback function for error reporting
+    # </param>
+    # <param name="topology" type="IPTopology">
+    # Optional, prefetched topology shared by every session (see BAMClient.prefetchTopology)
+    # </param>
+    # <param name="wsdl" type="string">
+    # Optional, path of a local copy of the API WSDL (see BAMClient)
+    # </param>
+    # <param name="create_networks" type="boolean">
+    # Whether the sessions create the networks of the devices' addresses. False once ImportPlanner has created them
+    # </param>
+    # <param name="device_index" type="dict">
+    # Optional, prefetched device index shared by every session (see BAMClient.prefetchDevices)
+    # </param>
+    # <param name="id_cache" type="IDCache">
+    # Optional, persistent ID cache shared by every session (see BAMClient)
+    # </param>
+    # <param name="journal" type="ImportJournal">
+    # Optional, journal shared by every session (see BAMClient)
+    # </param>
+    # <param name="statistics" type="APIStatistics">
+    # Optional, API call statistics shared by every session (see BAMClient)
+    # </param>
+    # <param name="retry_policy" type="RetryPolicy">
+    # Optional, retries the calls of every session that fail with transient errors (see BAMClient)
+    # </param>
+    # <param name="limiter" type="AIMDLimiter">
+    # Optional, limits the calls in progress at once across all sessions (see BAMClient)
+    # </param>
+    def __init__(self, address, user, password, configuration_id, sessions, callback, topology=None, wsdl=None, create_networks=True, device_index=None, id_cache=None, journal=None, statistics=None, retry_policy=None, limiter=None):
+        self.address = address
+        self.user = user
+        self.password = password
+        self.configuration_id = configuration_id
+        self.sessions = sessions
+        self.callback = callback
+        self.topology = topology
+        self.device_index = device_index
+        self.id_cache = id_cache
+        self.journal = journal
+        self.statistics = statistics
+        self.retry_policy = retry_policy
+        self.limiter = limiter
+        self.wsdl = wsdl
+        self.create_networks = create_networks
+        self.logger = logging.getLogger(__name__)
+        # One [devices uploaded or found, seconds spent uploading] entry per worker, devices that failed are not counted
+        self.stats = []
+        self.elapsed = 0.0
+        self.__failure = None
+
+    # <summary>
+    # Uploads every device and returns once all of them have been processed.
+    # The queue between the caller and the workers is bounded, so devices can be a generator (e.g. App.streamDevices)
+    # Returns the per worker statistics (see report)
+    # </summary>
+    # <param name="devices" type="iterable">
+    # The Device objects to upload
+    # </param>
+    def upload(self, devices):
+        start = time.time()
+        queue = Queue.Queue(maxsize=self.sessions * 4)
+        self.stats = [[0, 0.0] for i in range(self.sessions)]
+        workers = [threading.Thread(target=self.__work, args=(idx, queue)) for idx in range(self.sessions)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        for device in devices:
+            if self.__failure:
+                break
+            self.__put(queue, device, workers)
+        for worker in workers:
+            self.__put(queue, None, workers)
+        for worker in workers:
+            worker.join()
+        self.elapsed = time.time() - start
+
+        if self.__failure:
+            self.callback("Upload aborted: {}".format(self.__failure), True)
+        return self.stats
+
+    # <summary>
+    # Returns one line per worker describing its throughput, plus a total
+    # </summary>
+    def report(self):
+        lines = []
+        total_devices = 0
+        for idx, stat in enumerate(self.stats):
+            devices, seconds = stat
+            total_devices += devices
+            lines.append("Session {0}: {1} devices in {2:.2f}s ({3:.1f} devices/s)".format(idx, devices, seconds, devices / seconds if seconds else 0.0))
+        lines.append("Total: {0} devices in {1:.2f}s ({2:.1f} devices/s)".format(total_devices, self.elapsed, total_devices / self.elapsed if self.elapsed else 0.0))
+        return lines
+
+    # <summary>
+    # Puts an item on the queue, giving up if every worker has died so the caller never blocks forever
+    # </summary>
+    def __put(self, queue, item, workers):
+        while True:
+            try:
+                queue.put(item, timeout=1)
+                return
+            except Queue.Full:
+                if not [worker for worker in workers if worker.is_alive()]:
+                    return
+
+    # <summary>
+    # Worker loop. Logs in its own session, then uploads devices from the queue until it receives None
+    # </summary>
+    # <param name="idx" type="int">
+    # The index of the worker, used for its statistics
+    # </param>
+    # <param name="queue" type="Queue.Queue">
+    # The queue of devices to upload
+    # </param>
+    def __work(self, idx, queue):
+        try:
+            client = BAMClient(self.address, self.user, self.password, self.callback, wsdl=self.wsdl, id_cache=self.id_cache, journal=self.journal, statistics=self.statistics,
+                               retry_policy=self.retry_policy, limiter=self.limiter)
+            client.configuration_id = self.configuration_id
+            client.topology = self.topology
+            client.device_index = self.device_index
+            while True:
+                device = queue.get()
+                if device is None:
+                    return
+                if self.__failure:
+                    continue
+                start = time.time()
+                if client.addDevice(device, self.create_networks):
+                    self.stats[idx][0] += 1
+                self.stats[idx][1] += time.time() - start
+        except SystemExit:
+            # A critical error callback exits, which only ends this thread. Stop the others and report it from the calling thread
+            self.__failure = "critical error in session {}".format(idx)
+        except Exception, e:
+            self.__failure = "session {0} failed: {1}".format(idx, e)
+        # Keep draining so the caller is never blocked on a full queue
+        while queue.get() is not None:
+            pass
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
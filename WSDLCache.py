@@ -0,0 +1,116 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+import urllib
+import urllib2
+
+# <summary>
+# Builds suds clients for the BAM API without parsing the WSDL on every run.
+# The parsed service definition is pickled to disk in a directory keyed by server and WSDL hash, so a changed WSDL is parsed again.
+# Every client gets its own copy of the definition, unpickled from disk: suds clients sharing one (e.g. clones) are not thread-safe
+# </summary>
+class WSDLCache:
+
+    # Where the parsed definitions are kept unless another location is given
+    default_location = os.path.join(os.path.expanduser("~"), ".bluecat-csv-importer", "wsdl")
+    # Path of the SOAP endpoint on the BAM server
+    path = "/Services/API"
+
+    # (location, address, local WSDL file) -> [WSDL url, cache directory], so the WSDL is only fetched and hashed once per process
+    __definitions = {}
+    __lock = threading.Lock()
+
+    # <summary>
+    # Constructor for WSDLCache
+    # </summary>
+    # <param name="location" type="string">
+    # Optional, the directory to keep parsed definitions in (default = ~/.bluecat-csv-importer/wsdl)
+    # </param>
+    def __init__(self, location=None):
+        self.location = location or WSDLCache.default_location
+        self.logger = logging.getLogger(__name__)
+
+    # <summary>
+    # Returns a new suds client for the BAM server, with a parsed definition of its own. Only the first call per server in a process
+    # reads the WSDL, later calls load the definition straight from the disk cache
+    # </summary>
+    # <param name="address" type="string">
+    # Address of BAM server
+    # </param>
+    # <param name="wsdl" type="string">
+    # Optional, path of a local copy of the WSDL to use instead of downloading it from the server
+    # </param>
+    def client(self, address, wsdl=None):
+        key = (self.location, address, wsdl and os.path.abspath(wsdl))
+        with WSDLCache.__lock:
+            if key not in WSDLCache.__definitions:
+                WSDLCache.__definitions[key] = self.__locate(address, wsdl)
+            url, directory = WSDLCache.__definitions[key]
+            return self.__load(address, url, directory)
+
+    # <summary>
+    # Reads the WSDL of a server and returns [WSDL url, cache directory]. Definitions cached for older WSDLs of the server are removed
+    # </summary>
+    def __locate(self, address, wsdl):
+        if wsdl:
+            url = "file:" + urllib.pathname2url(os.path.abspath(wsdl))
+            with open(wsdl, "rb") as wsdl_file:
+                document = wsdl_file.read()
+        else:
+            url = "http://" + address + WSDLCache.path + "?wsdl"
+            document = urllib2.urlopen(url).read()
+
+        directory = self.directory(address, document)
+        if not os.path.isdir(directory):
+            self.logger.debug("No parsed WSDL cached for {}, parsing it".format(address))
+            self.__prune(address)
+        return [url, directory]
+
+    # <summary>
+    # Builds a client, reading the parsed definition from the cache directory if it is there
+    # </summary>
+    def __load(self, address, url, directory):
+        # suds is only imported once a client is needed, so runs that never talk to the suds backend do not pay for it
+        from suds.cache import ObjectCache
+        from suds.client import Client
+        endpoint = "http://" + address + WSDLCache.path
+        # days=0 never expires the entries, the directory name changes with the WSDL instead
+        cache = ObjectCache(location=directory, days=0)
+        # cachingpolicy=1 caches the whole parsed definition rather than the raw XML documents
+        return Client(url, cache=cache, cachingpolicy=1, faults=True, location=endpoint)
+
+    # <summary>
+    # Removes the definitions cached for older WSDLs of a server
+    # </summary>
+    def __prune(self, address):
+        if not os.path.isdir(self.location):
+            return
+        prefix = WSDLCache.serverKey(address) + "-"
+        for name in os.listdir(self.location):
+            if name.startswith(prefix):
+                shutil.rmtree(os.path.join(self.location, name), ignore_errors=True)
+
+    # <summary>
+    # Returns the cache directory for a server and WSDL document
+    # </summary>
+    # <param name="address" type="string">
+    # Address of BAM server
+    # </param>
+    # <param name="document" type="string">
+    # The WSDL document
+    # </param>
+    def directory(self, address, document):
+        return os.path.join(self.location, "{0}-{1}".format(WSDLCache.serverKey(address), hashlib.sha1(document).hexdigest()))
+
+    # <summary>
+    # Returns the server address in a form usable in a directory name
+    # </summary>
+    @staticmethod
+    def serverKey(address):
+        return re.sub(r'[^\w.-]', '_', address)
+
+if __name__ == "__main__":
+    print "This module cannot be run as a standalone program. Please run __main__.py"
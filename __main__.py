@@ -1,14 +1,29 @@
 #!/usr/bin/python
 from Address import Address
+from APIStatistics import APIStatistics
+from AddressValidator import AddressValidator
+from AIMDLimiter import AIMDLimiter
 from argparse import ArgumentParser
 from BAMClient import BAMClient
 #from ColoredLogger import ColoredLogger
 from CSVReader import CSVReader
+from CSVWriter import CSVWriter
+import array
 import coloredlogs
 from DeviceType import DeviceType
 from DeviceSubtype import DeviceSubtype
 from Device import Device
+from IDCache import IDCache
+from ImportDelta import ImportDelta
+from ImportJournal import ImportJournal
+from ImportPlanner import ImportPlanner
+from IPTopology import IPTopology
+from ParsePool import ParsePool
+from RetryPolicy import RetryPolicy
+from UploadPool import UploadPool
 import getpass
+import json
+from itertools import izip
 import logging
 
 logging.basicConfig()
@@ -18,6 +33,9 @@ logging.basicConfig()
 # </summary>
 class App:
 
+    # The csv columns a device is built from, in the order CSVReader.records hands them to __merge_record
+    device_columns = ['Name', 'IP', 'Device Type', 'Device Subtype']
+
     # <summary>
     # Constructor for App class
     # </summary>
@@ -27,7 +45,62 @@ class App:
     # <param name="debug" type="boolean">
     # Controls how much information is given during errors or general runtime
     # </param>
-    def __init__(self, filename, user_input, verbose, address, username, password, configuration, upload):
+    # <param name="chunk_size" type="int">
+    # Optional, streams the csv chunk_size rows at a time and uploads devices while the rest of the file is still being read
+    # </param>
+    # <param name="prefetch" type="boolean">
+    # Loads every block and network of the configuration up front, so that the per address lookups are answered locally
+    # </param>
+    # <param name="prefetch_devices" type="boolean">
+    # Loads the names of every device of the configuration up front, so that existing devices are skipped without a lookup per device
+    # </param>
+    # <param name="sessions" type="int">
+    # The number of concurrently logged in BAM sessions to upload devices with (default = 1)
+    # </param>
+    # <param name="backend" type="string">
+    # The SOAP backend of the BAM client, "suds" or "async" (see BAMClient)
+    # </param>
+    # <param name="concurrency" type="int">
+    # The maximum number of requests on the wire at once with the async backend (default = 16)
+    # </param>
+    # <param name="wsdl" type="string">
+    # Optional, path of a local copy of the API WSDL to use instead of downloading it from the server
+    # </param>
+    # <param name="cache" type="boolean">
+    # Whether to read and store entity IDs in the persistent ID cache (default = True)
+    # </param>
+    # <param name="cache_ttl" type="int">
+    # Lifetime of the entries of the ID cache, in seconds
+    # </param>
+    # <param name="resume" type="boolean">
+    # Whether to resume the import journaled by an earlier run of the same csv, skipping what it committed (default = False)
+    # </param>
+    # <param name="delta" type="boolean">
+    # Whether to only upload the devices that are new or changed since the last successful import of the csv (default = False)
+    # </param>
+    # <param name="plan" type="string">
+    # Optional, only print what the import would do (see dryRun) and write the diff to this file, "-" prints it instead
+    # </param>
+    # <param name="stats" type="string">
+    # Optional, write the count and latency of the API calls per method and phase to this JSON file when the run ends (see APIStatistics)
+    # </param>
+    # <param name="slow_call" type="float">
+    # Optional, log every API call taking at least this many seconds
+    # </param>
+    # <param name="retries" type="int">
+    # The number of times an API call failing with a transient error is retried, 0 disables retrying (default = 3, see RetryPolicy)
+    # </param>
+    # <param name="latency_target" type="float">
+    # Optional, API calls taking longer than this many seconds make the import back off. By default it adapts to the fastest call of each API method (see AIMDLimiter)
+    # </param>
+    # <param name="processes" type="int">
+    # The number of worker processes to validate the csv and build its devices in (default = 1, see ParsePool).
+    # Only used when the csv is read whole, not in streaming mode
+    # </param>
+    # <param name="block_prefix" type="int">
+    # The prefix length of the largest block created to hold the networks of the csv, 24 creates a block per network (default = 16, see ImportPlanner)
+    # </param>
+    def __init__(self, filename, user_input, verbose, address, username, password, configuration, upload, chunk_size=None, prefetch=False, prefetch_devices=False, sessions=1, backend="suds", concurrency=16, wsdl=None, cache=True, cache_ttl=IDCache.default_ttl, resume=False, delta=False, plan=None, stats=None, slow_call=None, retries=3, latency_target=None, processes=1, block_prefix=16):
         self.user_input = user_input
         self.verbose = verbose
         self.bam_client = None
@@ -39,6 +112,30 @@ class App:
         self.configuration = configuration
         self.filename = filename
         self.upload = upload
+        self.chunk_size = chunk_size
+        self.prefetch = prefetch
+        self.prefetch_devices = prefetch_devices
+        self.sessions = sessions
+        self.backend = backend
+        self.concurrency = concurrency
+        self.wsdl = wsdl
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        self.id_cache = None
+        self.resume = resume
+        self.plan = plan
+        self.journal = None
+        self.delta = delta
+        self.stats = stats
+        self.slow_call = slow_call
+        self.statistics = None
+        self.retries = retries
+        self.latency_target = latency_target
+        self.processes = processes
+        self.block_prefix = block_prefix
+        self.retry_policy = None
+        self.limiter = None
+        self.validator = AddressValidator()
         
         if self.verbose:
             coloredlogs.install(logger=self.logger, level='DEBUG', format="%(levelname)s:%(msg)s")
@@ -63,7 +160,17 @@ class App:
             self.username = raw_input("Username: ")
             self.password = getpass.getpass("Password: ")
 
-        self.bam_client = BAMClient(self.address, self.username, self.password, self.errorCallback)
+        if self.cache:
+            self.id_cache = IDCache(self.address, ttl=self.cache_ttl)
+        if self.stats or not self.slow_call is None:
+            self.statistics = APIStatistics(self.slow_call)
+        if self.retries > 0:
+            self.retry_policy = RetryPolicy(self.retries)
+        # Shared by the client and the upload sessions, so the calls in progress stay within what the server sustains
+        self.limiter = AIMDLimiter(self.concurrency if self.backend == "async" else self.sessions, latency_target=self.latency_target)
+        self.__phase("connect")
+        self.bam_client = BAMClient(self.address, self.username, self.password, self.errorCallback, self.backend, self.concurrency, self.wsdl, self.id_cache,
+                                    statistics=self.statistics, retry_policy=self.retry_policy, limiter=self.limiter)
 
         if self.user_input and not self.configuration:
                 user_config = raw_input("Active configuration to use on BAMClient server: ")
@@ -73,15 +180,126 @@ class App:
             self.configuration = BAMClient.default_configuration
 
         self.bam_client.setConfiguration(self.configuration)
+        if export:
+            self.__phase("export")
+            self.exportDevices()
+            self.reportStatistics()
+            return
 
         # TODO: This section is ridiculously messy. Clean this up ASAP
-        self.csv = CSVReader(self.filename, self.errorCallback)
-        self.id_list = self.populateDeviceTypes(self.csv)
-        self.devices, error = self.populateDevices(self.csv)
-        for i in self.devices:
-            self.bam_client.addDevice(i)
+        self.csv = CSVReader(self.filename, self.errorCallback, self.chunk_size, split_columns=['IP'])
+        self.planner = ImportPlanner(self.bam_client, self.errorCallback, self.validator, self.block_prefix).plan(self.csv)
+        if self.plan:
+            self.__phase("snapshot")
+            self.dryRun()
+            self.reportStatistics()
+            return
+
+        # Every device, block and network committed from here on is journaled, so that a failed run can be resumed
+        self.journal = ImportJournal(self.filename + ".journal", self.address, self.configuration, self.errorCallback, self.resume)
+        self.bam_client.journal = self.journal
+        self.__phase("prefetch")
+        if self.prefetch:
+            self.bam_client.prefetchTopology()
+        if self.prefetch_devices:
+            self.bam_client.prefetchDevices()
+
+        # Create every type, subtype, block and network the csv needs once, before any device
+        self.__phase("deviceTypes")
+        self.id_list = self.planner.createDeviceTypes()
+        self.__phase("networks")
+        self.planner.createNetworks()
+        self.__phase("parse")
+        if self.csv.streaming():
+            # Streamed devices are parsed as the upload consumes them, so their parsing falls in the upload phase
+            devices = self.streamDevices(self.csv, self.planner.last_rows)
+        else:
+            self.devices, error = self.populateDevices(self.csv)
+            devices = self.devices
+        self.__phase("upload")
+        if self.delta:
+            # Hashes of the devices imported by the last successful run, unchanged devices are not sent again
+            self.delta = ImportDelta(self.filename + ".hashes", self.address, self.configuration)
+            devices = self.delta.changed(devices)
+        if self.sessions > 1:
+            pool = UploadPool(self.address, self.username, self.password, self.bam_client.configuration_id, self.sessions, self.errorCallback, self.bam_client.topology, self.wsdl, create_networks=False, device_index=self.bam_client.device_index, id_cache=self.id_cache, journal=self.journal, statistics=self.statistics,
+                              retry_policy=self.retry_policy, limiter=self.limiter)
+            pool.upload(devices)
+            for line in pool.report():
+                print line
+        else:
+            self.bam_client.addDevices(devices, create_networks=False)
+        if self.delta:
+            self.delta.save(self.journal)
+        self.journal.close()
+        self.reportStatistics()
         self.dumpMemory()
 
+    # <summary>
+    # Writes the API call statistics of the run to the stats file, if one was given
+    # </summary>
+    def reportStatistics(self):
+        if not self.statistics or not self.stats:
+            return
+        self.statistics.save(self.stats)
+        for line in self.statistics.lines():
+            self.logger.debug(line)
+        print "API call statistics written to {}".format(self.stats)
+
+    # <summary>
+    # Attributes the API calls made from now on to a phase of the run, if they are recorded
+    # </summary>
+    def __phase(self, name):
+        if self.statistics:
+            self.statistics.setPhase(name)
+
+    # <summary>
+    # Writes every device of the configuration to the csv, in the layout the import reads (see device_columns).
+    # Devices are fetched a page at a time, the next page while the current one is written (see BAMClient.streamPages),
+    # so memory use does not grow with the size of the configuration
+    # </summary>
+    def exportDevices(self):
+        type_names = {}
+        subtype_names = {}
+        for type_name, (type_id, subtypes) in self.bam_client.getDeviceTypeTree().items():
+            type_names[type_id] = type_name
+            for subtype_name, subtype_id in subtypes.items():
+                subtype_names[subtype_id] = subtype_name
+        writer = CSVWriter(self.filename, App.device_columns)
+        try:
+            for page in self.bam_client.streamPages(self.bam_client.configuration_id, "Device"):
+                for entity in page:
+                    properties = IPTopology.parseProperties(entity['properties'])
+                    writer.writeRow([entity['name'],
+                                     [IP for IP in properties.get('ip4Addresses', '').split(',') if IP],
+                                     type_names.get(long(properties.get('deviceTypeId') or 0), 'Not Listed'),
+                                     subtype_names.get(long(properties.get('deviceSubtypeId') or 0), 'Not Listed')])
+        except Exception, e:
+            self.errorCallback("Export failed after {0} devices: {1}".format(writer.rows, e), True)
+        finally:
+            writer.close()
+        print "Exported {0} devices to {1}".format(writer.rows, self.filename)
+
+    # <summary>
+    # Prints what an import of the csv would create without writing anything to the BAM service.
+    # The configuration is snapshot in bulk (see ImportPlanner.snapshot) and the devices are diffed against it locally.
+    # The diff is written as JSON to the plan file, or printed if the plan file is "-"
+    # </summary>
+    def dryRun(self):
+        self.planner.snapshot()
+        self.id_list = self.planner.plannedDeviceTypes()
+        self.devices, error = self.populateDevices(self.csv)
+        diff = self.planner.diff(self.devices, error)
+        for line in ImportPlanner.summary(diff):
+            print line
+        if self.plan == "-":
+            print json.dumps(diff, indent=2)
+        else:
+            with open(self.plan, "w") as plan_file:
+                json.dump(diff, plan_file, indent=2)
+            print "Plan written to {}".format(self.plan)
+        return diff
+
     # <summary>
     # Replaces invalid values with 'Not Listed' and trims trailing whitespace. Intended to be used with csv cell values
     # </summary>
@@ -89,96 +307,198 @@ class App:
     # The string to format
     # </param>
     def formatCell(self, str_val):
-        if not str_val or str(str_val) == 'nan':   
-            str_val = 'Not Listed'
-        return str_val.strip()
+        return CSVReader.formatCell(str_val)
 
     # <summary>
     # Populates the devices table from the csv
+    # Expects the csv to be opened with split_columns=['IP'], so that the IP cells are already lists
     # </summary>
     # <param name="csv" type="CSVReader">
     # The csv reader instance to read from
     # </param>
     def populateDevices(self, csv):
+        if self.processes > 1 and not csv.streaming():
+            return self.__populate_sharded(csv)
         devices = []
         error = []
-        rows = csv.getRows()
-        for idx in range(len(rows)):
-            row = rows[idx][1] # We need the Series object, row itself is actually a Tuple containing an index and a Series
-
-            row['IP'] = self.formatCell(row['IP'])
-            row['Name'] = self.formatCell(row['Name'])
-            row['Device Type'] = self.formatCell(row['Device Type'])
-            row['Device Subtype'] = self.formatCell(row['Device Subtype'])
-
-            present = False
-            # TODO: There's definetly a better way to do this. Revisit this at some point
-            for device in devices:
-                if self.formatCell(row['Name']) == device.name():
-                    device.mergeAddresses(Address(row['IP'], row['IP'].rsplit('.', 1)[0] + '.0/24', self.errorCallback))
-                    present = True
-                    break
-            if not present:
-                try:
-                    devices.append(Device(name=self.formatCell(row['Name']), 
-                                          addresses=[Address(i, i.rsplit('.', 1)[0] + '.0/24', self.errorCallback) for i in row['IP'].split(',')], 
-                                          device_type=self.id_list[row['Device Type']], 
-                                          device_subtype=self.id_list[row['Device Type']].subtypes()[row['Device Subtype']],
-                                          error_callback=self.errorCallback))
-                except ValueError:
-                    error.append([row, idx])
+        # Maps device name -> Device so that repeated names are merged in constant time rather than by scanning every device built so far
+        device_index = {}
+        for chunk in csv.streamChunks():
+            for record, subnets in self.__validated_records(chunk, error):
+                device = self.__merge_record(record, subnets, device_index, error)
+                if device:
+                    devices.append(device)
         return [devices, error]
 
+    # <summary>
+    # Process pool counterpart of populateDevices. Every worker validates a range of rows and builds the devices of that range,
+    # then the parent merges the devices of the ranges by name in row order. Devices, their addresses, errors and error messages
+    # come out exactly as populateDevices makes them.
+    # Workers return their devices as columns (names, type and subtype names, and arrays of address counts, IPs and prefixes)
+    # rather than as objects, which would take longer to pickle and unpickle than to build again in the parent
+    # </summary>
+    # <param name="csv" type="CSVReader">
+    # The csv reader instance to read from, not in streaming mode
+    # </param>
+    def __populate_sharded(self, csv):
+        # Normalizes the csv once in the parent, the workers forked afterwards share the normalized rows
+        rows = csv.rowCount()
+        def parse(start, stop):
+            devices = []
+            error = []
+            messages = []
+            device_index = {}
+            # Error messages are reported by the parent, in row order
+            callback = lambda msg, fail: messages.append([msg, fail])
+            for record, subnets in self.__validated_records(csv.shard(start, stop), error, callback):
+                device = self.__merge_record(record, subnets, device_index, error)
+                if device:
+                    devices.append(device)
+            counts = array.array('I', (len(device.addresses()) for device in devices))
+            IPs = array.array('I', (address.integer() for device in devices for address in device.addresses()))
+            prefixes = array.array('B', (address.prefix() for device in devices for address in device.addresses()))
+            columns = [[device.name() for device in devices], [device.device_type().name() for device in devices],
+                       [device.device_subtype().name() for device in devices], counts, IPs, prefixes]
+            return [columns, error, messages]
+
+        devices = []
+        error = []
+        device_index = {}
+        for columns, shard_error, messages in ParsePool(self.processes).map(parse, rows):
+            for msg, fail in messages:
+                self.errorCallback(msg, fail)
+            error.extend(shard_error)
+            names, type_names, subtype_names, counts, IPs, prefixes = columns
+            shard_addresses = map(Address.fromInteger, IPs, prefixes)
+            offset = 0
+            for name, type_name, subtype_name, count in izip(names, type_names, subtype_names, counts):
+                addresses = shard_addresses[offset:offset + count]
+                offset += count
+                device = device_index.get(name)
+                if device:
+                    # The device continues a device of an earlier range
+                    for address in addresses:
+                        device.mergeAddresses(address)
+                    continue
+                device_type = self.id_list[type_name]
+                device = Device(name, addresses, device_type, device_type.subtypes()[subtype_name], self.errorCallback)
+                device_index[name] = device
+                devices.append(device)
+        return [devices, error]
+
+    # <summary>
+    # Streaming counterpart of populateDevices. Yields devices as soon as the chunk holding them has been read, so they can be
+    # uploaded while the rest of the file is still being parsed.
+    # The last device of a chunk is held back until the next chunk, since its rows may continue there, and so is every device
+    # with rows further down the file (see ImportPlanner.last_rows). Rows for a device that was already yielded cannot be merged
+    # anymore and are reported through errorCallback
+    # </summary>
+    # <param name="csv" type="CSVReader">
+    # The csv reader instance to read from
+    # </param>
+    # <param name="last_rows" type="dict">
+    # Optional, the index of the last row of each device whose rows are not adjacent, as planned by ImportPlanner
+    # </param>
+    def streamDevices(self, csv, last_rows=None):
+        last_rows = last_rows or {}
+        error = []
+        yielded = set()
+        device_index = {}
+        pending = []
+        for chunk in csv.streamChunks():
+            if not len(chunk.index):
+                continue
+            last_index = chunk.index[-1]
+            last_name = None
+            for record, subnets in self.__validated_records(chunk, error):
+                last_name = record[1]
+                if last_name in yielded:
+                    self.errorCallback("Device '{0}' on row {1} was already uploaded, addresses {2} were not merged".format(last_name, record[0], record[2]), False)
+                    continue
+                device = self.__merge_record(record, subnets, device_index, error)
+                if device:
+                    pending.append(device)
+            held = []
+            for device in pending:
+                if device.name() == last_name or last_rows.get(device.name(), last_index) > last_index:
+                    held.append(device)
+                    continue
+                yielded.add(device.name())
+                del device_index[device.name()]
+                yield device
+            pending = held
+        for device in pending:
+            yield device
+
+    # <summary>
+    # Validates the IP column of a normalized chunk in bulk and yields [record, subnets] for every row whose addresses are all valid.
+    # Invalid rows are reported through errorCallback and appended to error, no Address objects are built for them
+    # </summary>
+    # <param name="chunk" type="pandas.DataFrame">
+    # The normalized chunk, read with split_columns=['IP']
+    # </param>
+    # <param name="error" type="list">
+    # Invalid records are appended here along with their index
+    # </param>
+    # <param name="callback" type="function" args="string, Boolean">
+    # Optional, reports invalid rows instead of errorCallback
+    # </param>
+    def __validated_records(self, chunk, error, callback=None):
+        callback = callback or self.errorCallback
+        row_errors, row_subnets = self.validator.validateColumn(chunk['IP'])
+        for record, invalid, subnets in izip(CSVReader.records(chunk, App.device_columns), row_errors, row_subnets):
+            if invalid:
+                callback("IP '{0}' on row {1} is not valid! Could not create Address object.".format(','.join(record[2]), record[0]), False)
+                error.append([record, record[0]])
+                continue
+            yield [record, subnets]
+
+    # <summary>
+    # Builds a Device from a validated csv record, or merges the record's addresses into the existing Device of the same name.
+    # Returns the Device if a new one was created, otherwise None
+    # </summary>
+    # <param name="record" type="tuple">
+    # (index, name, IP list, device type, device subtype) as produced by CSVReader.records(chunk, App.device_columns)
+    # </param>
+    # <param name="subnets" type="list">
+    # The subnet of each IP of the record, as returned by AddressValidator.validateColumn
+    # </param>
+    # <param name="device_index" type="dict">
+    # Maps device names to the Device objects built so far
+    # </param>
+    # <param name="error" type="list">
+    # Records that could not be turned into a Device are appended here along with their index
+    # </param>
+    def __merge_record(self, record, subnets, device_index, error):
+        idx, name, addresses, device_type, device_subtype = record
+        device = device_index.get(name)
+        try:
+            addresses = [Address(IP, subnet, self.errorCallback, validated=True) for IP, subnet in izip(addresses, subnets)]
+            if device:
+                for address in addresses:
+                    device.mergeAddresses(address)
+                return None
+            device = Device(name=name,
+                            addresses=addresses,
+                            device_type=self.id_list[device_type],
+                            device_subtype=self.id_list[device_type].subtypes()[device_subtype],
+                            error_callback=self.errorCallback)
+            device_index[name] = device
+            return device
+        except ValueError:
+            error.append([record, idx])
+        return None
+
     # <summary>
     # Adds devices to the BAM Service from the csv
     # Populates id_list with Device objects, along with their child subtypes
+    # Only the types and subtypes missing on the BAM service are created, each once (see ImportPlanner)
     # </summary>
     # <param name="csv" type="CSVReader">
     # CSVReader instance with open csv containing values to add to the BAM Service
     # </param>
     def populateDeviceTypes(self, csv):
-        cols = csv.getColumns(['Device Type', 'Device Subtype'])
-        device_column = cols['Device Type']
-        subdevice_column = cols['Device Subtype']
-        id_list = {}
-        # Loop through the amount of device types found in csv (note: can't have subtype without parent type)
-        for idx in range(len(device_column)):
-
-            device_column[idx] = self.formatCell(device_column[idx])
-            self.logger.debug("Checking device \'{0}\'".format(device_column[idx]))
-
-            try:
-                # attempt to access the dict key for the current device type
-                dev_obj = id_list[device_column[idx]]
-                dev = [dev_obj.id(), dev_obj.name()]
-                self.logger.debug("Device type \'{0}\' already present in id list with ID {1}".format(dev[1], dev[0]))
-            except KeyError: # Device type doesn't exist yet!
-                dev = self.bam_client.addDeviceType(device_column[idx])
-                id_list[dev[1]] = DeviceType(dev[1], dev[0])
-                self.logger.debug("Device type \'{0}\' has been added with ID {1}".format(dev[1], dev[0]))
-            except Exception,e: # Something bad happened...
-                self.errorCallback("Device type \'{0}\' failed to be added: {1}".format(device_column[idx], e), True)
-
-            subdevice_column[idx] = self.formatCell(subdevice_column[idx])
-            self.logger.debug("Checking device subtype \'{0}\'".format(subdevice_column[idx]))
-
-            try:
-                # attempt to access the dict key for the current device subtype
-                # Accessing this looks kinda messy so lets break it down.
-                # dev[1] is the name of the current device, which we got just above
-                # id_list[dev[1]] gets you the current device type in the dict
-                # With that in mind calling subtypes() on a DeviceType instance provides the list of subtypes of that device type currently available
-                # [subdevice[idx]] is the current index in the table/csv, so we're trying to access a dict key with that name. If it fails we know its not there yet
-                subdev_obj = id_list[dev[1]].subtypes()[subdevice_column[idx]]
-                subdev = [subdev_obj.id(), subdev_obj.name()]
-                self.logger.debug("Device subtype \'{0}\' already present in id list with ID {1}".format(subdev[1], subdev[0]))
-            except KeyError:
-                subdev = self.bam_client.addDeviceSubtype(dev[0], subdevice_column[idx])
-                id_list[dev[1]].add(DeviceSubtype(subdev[1], subdev[0]))
-                self.logger.debug("Device subtype \'{0}\' has been added to \'{1}\' with ID {2}".format(subdev[1], id_list[dev[1]], subdev[0]))
-            except Exception,e:
-                self.errorCallback("Device subtype \'{0}\' failed to be added to \'{1}\': {2}".format(subdevice_column[idx], id_list[dev[1]], e), True)
-        return id_list
+        return ImportPlanner(self.bam_client, self.errorCallback, self.validator).plan(csv).createDeviceTypes()
 
     # <summary>
     # Handles error messages sent by other classes like the BAMClient class
@@ -232,15 +552,11 @@ class App:
                 # List all items in the device type id list
                 for i in self.id_list:
                     self.logger.debug('\t' + i + ':')
-                    # List all subkeys of the current device type object
-                    for k,v in vars(self.id_list[i]).items():
-                        if not k == '_Device_Type__children':
-                            # List all subkeys of the sub device type objects associated with the current device type
-                            self.logger.debug('\t\t' + str([k,v]))
-                        else:
-                            import code
-                            code.InteractiveConsole(locals=locals()).interact()
-                            print [v[j] for j in v]
+                    # Device types are slotted and have no vars(), list them through their accessors
+                    self.logger.debug('\t\t' + str(['id', self.id_list[i].id()]))
+                    # List the sub device type objects associated with the current device type
+                    for subtype in self.id_list[i].subtypes().values():
+                        self.logger.debug('\t\t' + str([subtype.name(), subtype.id()]))
             else:                
                 self.logger.error("\tNo ID list was generated!")
         except Exception, e:
@@ -285,11 +601,42 @@ if __name__ == "__main__":
     parser.add_argument("-u", "--username", default=None, action="store", dest="username", help="The username to use for authentication")
     parser.add_argument("-p", "--password", default=None, action="store", dest="password", help="The password to use for authentication")
     parser.add_argument("-c", "--configuration", default=None, action="store", dest="configuration", help="The BAMClient configuration to use")
-    parser.add_argument("--export", default=False, action="store_true", dest="export", help="Export data from the server rather than import")
+    parser.add_argument("-s", "--chunk-size", default=None, type=int, action="store", dest="chunk_size", help="Stream the CSV CHUNK_SIZE rows at a time instead of loading it whole")
+    parser.add_argument("-P", "--prefetch", default=False, action="store_true", dest="prefetch", help="Load all blocks and networks of the configuration up front and resolve addresses locally")
+    parser.add_argument("-D", "--prefetch-devices", default=False, action="store_true", dest="prefetch_devices", help="Load the names of all devices of the configuration up front and skip existing devices locally")
+    parser.add_argument("-n", "--sessions", default=1, type=int, action="store", dest="sessions", help="Upload devices over SESSIONS concurrently logged in BAM sessions")
+    parser.add_argument("--backend", default="suds", choices=["suds", "async"], action="store", dest="backend", help="The SOAP backend to talk to BAM with, async pipelines device uploads over non-blocking connections")
+    parser.add_argument("--concurrency", default=16, type=int, action="store", dest="concurrency", help="The maximum number of requests on the wire at once with the async backend")
+    parser.add_argument("-w", "--wsdl", default=None, action="store", dest="wsdl", help="Load the API WSDL from the local file WSDL instead of the server")
+    parser.add_argument("--no-cache", default=True, action="store_false", dest="cache", help="Do not read or store entity IDs in the persistent ID cache")
+    parser.add_argument("--cache-ttl", default=IDCache.default_ttl, type=int, action="store", dest="cache_ttl", help="Seconds before an entry of the ID cache expires")
+    parser.add_argument("--invalidate-cache", default=False, action="store_true", dest="invalidate_cache", help="Remove the cached entity IDs of the server and exit")
+    parser.add_argument("-r", "--resume", default=False, action="store_true", dest="resume", help="Resume an import that did not finish, skipping the devices, blocks and networks it journaled")
+    parser.add_argument("-d", "--delta", default=False, action="store_true", dest="delta", help="Only upload the devices that are new or changed since the last successful import of the csv")
+    parser.add_argument("--plan", default=None, nargs="?", const="-", action="store", dest="plan", help="Dry run: print what the import would create without writing anything, and save the JSON diff to PLAN (printed if omitted)")
+    parser.add_argument("--export", default=False, action="store_true", dest="export", help="Export the devices of the configuration to FILE rather than import it")
+    parser.add_argument("--stats", default=None, action="store", dest="stats", help="Write the count and latency of the API calls per method and phase to the JSON file STATS")
+    parser.add_argument("--slow-call", default=None, type=float, action="store", dest="slow_call", help="Log every API call taking at least SLOW_CALL seconds")
+    parser.add_argument("--retries", default=3, type=int, action="store", dest="retries", help="Retry API calls failing with a transient error up to RETRIES times with backoff, 0 disables retrying")
+    parser.add_argument("--latency-target", default=None, type=float, action="store", dest="latency_target", help="Back off when API calls take longer than LATENCY_TARGET seconds, adapts to the server by default")
+    parser.add_argument("-j", "--processes", default=1, type=int, action="store", dest="processes", help="Validate the csv and build its devices in PROCESSES worker processes")
+    parser.add_argument("--block-prefix", default=16, type=int, choices=range(8, 25), metavar="{8..24}", action="store", dest="block_prefix", help="Group the networks that need a block under supernet blocks no larger than /BLOCK_PREFIX, 24 creates a block per network")
+    parser.add_argument("--stand-in", default=False, action="store_true", dest="stand_in", help="Run against a local in-memory BAM stand-in instead of a BAM server")
+    parser.add_argument("--latency", default=0, type=float, action="store", dest="latency", help="Seconds the stand-in waits before answering each call")
+    parser.add_argument("--error-rate", default=0, type=float, action="store", dest="error_rate", help="Chance between 0 and 1 that a call to the stand-in fails")
     parser.add_argument("-t", "--testing", default=False, action="store_true", dest="test", help="Enables unit testing mode")
+    parser.add_argument("-b", "--benchmark", default=False, action="store_true", dest="benchmark", help="Runs the performance benchmarks")
+    parser.add_argument("--benchmark-output", default=None, action="store", dest="benchmark_output", help="Save the benchmark results to BENCHMARK_OUTPUT")
+    parser.add_argument("--benchmark-baseline", default=None, action="store", dest="benchmark_baseline", help="Compare the benchmark results to those saved in BENCHMARK_BASELINE")
     #parser.add_argument("-n", "--network", default=False, action="store_true", dest="network_mode", help="Controls whether the program will use network mode to import and tag whole networks")
     args = parser.parse_args()
 
+    if args.stand_in == True:
+        from BAMStandIn import BAMStandIn
+        stand_in = BAMStandIn(latency=args.latency, error_rate=args.error_rate)
+        args.address = stand_in.start()
+        print "Serving a BAM stand-in on {}".format(args.address)
+
     if args.test == True:
         import Tests
         # Suppress logging
@@ -299,6 +646,19 @@ if __name__ == "__main__":
         Tests.tests(args.address, args.username, args.password, args.configuration)
         exit(0)
 
+    if args.invalidate_cache == True:
+        IDCache(args.address or BAMClient.default_address).invalidate()
+        print "Cached IDs of {} removed".format(args.address or BAMClient.default_address)
+        exit(0)
+
+    if args.benchmark == True:
+        import Benchmarks
+        coloredlogs.set_level('CRITICAL')
+        logger = logging.getLogger('__main__')
+        logger.propagate = False
+        Benchmarks.benchmarks(args.benchmark_output, args.benchmark_baseline, args.backend, args.latency)
+        exit(0)
+
     app = App(filename=args.filename, 
               verbose=args.verbose,
               user_input=args.user_input, 
@@ -306,6 +666,24 @@ if __name__ == "__main__":
               username=args.username, 
               password=args.password, 
               configuration=args.configuration, 
-              upload=args.export)
+              upload=args.export,
+              chunk_size=args.chunk_size,
+              prefetch=args.prefetch,
+              prefetch_devices=args.prefetch_devices,
+              sessions=args.sessions,
+              backend=args.backend,
+              concurrency=args.concurrency,
+              wsdl=args.wsdl,
+              cache=args.cache,
+              cache_ttl=args.cache_ttl,
+              resume=args.resume,
+              delta=args.delta,
+              plan=args.plan,
+              stats=args.stats,
+              slow_call=args.slow_call,
+              retries=args.retries,
+              latency_target=args.latency_target,
+              processes=args.processes,
+              block_prefix=args.block_prefix)
     app.start(args.export)
     logging.shutdown()
\ No newline at end of file